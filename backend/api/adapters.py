@@ -0,0 +1,283 @@
+"""
+LoRA Adapter Residency - Keeps several adapters loaded on one base model
+Routes each inference call to its adapter, swapping from storage/models/ on a miss
+"""
+
+import os
+import time
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional
+
+from api.models import MODELS_DIR, get_model
+
+ADAPTER_CACHE_BYTES = int(os.getenv("VIENEU_ADAPTER_CACHE_BYTES", str(1024 * 1024 * 1024)))
+ADAPTER_CACHE_SLOTS = int(os.getenv("VIENEU_ADAPTER_CACHE_SLOTS", "4"))
+
+# Used for adapters that are not on local disk yet (fetched by the SDK from the hub)
+UNKNOWN_ADAPTER_BYTES = 64 * 1024 * 1024
+
+
+def _adapter_api(tts):
+    """
+    Find how the engine exposes LoRA adapters.
+
+    "multi": PEFT-style load_adapter/set_adapter/delete_adapter on the engine
+    or its backbone, so several adapters stay resident at once.
+    "single": VieNeu SDK load_lora_adapter/unload_lora_adapter, one at a time.
+    """
+    for target in (tts, getattr(tts, "backbone", None)):
+        if target is not None and hasattr(target, "load_adapter") and hasattr(target, "set_adapter"):
+            return "multi", target
+    if hasattr(tts, "load_lora_adapter"):
+        return "single", tts
+    return None, None
+
+
+def _call_optional(target, name: str):
+    """Call a PEFT toggle that may live on the model or its inner base_model"""
+    for obj in (target, getattr(target, "base_model", None)):
+        method = getattr(obj, name, None) if obj is not None else None
+        if method is not None:
+            method()
+            return
+
+
+def _dir_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+class AdapterManager:
+    """
+    LRU set of resident adapters bounded by slot count and bytes.
+
+    The active adapter is global engine state, so `use()` lets any number of
+    calls share the current adapter and only switches once they have drained.
+    A waiting switch holds back new calls on the current adapter so it is not
+    starved. Loads run outside the lock, so `stats()` never waits for one.
+    Calls are blocking and made from inference worker threads.
+    """
+
+    def __init__(self, max_bytes: int = ADAPTER_CACHE_BYTES, max_slots: int = ADAPTER_CACHE_SLOTS):
+        self.max_bytes = max_bytes
+        self.max_slots = max(1, max_slots)
+        self._resident: "OrderedDict[str, int]" = OrderedDict()
+        self._last_used: dict = {}
+        self._active: Optional[str] = None
+        self._inflight = 0
+        # Set while one thread changes engine adapter state; everyone else waits
+        self._activating = False
+        # Calls waiting for a different adapter than the active one, by adapter
+        self._switches: dict = {}
+        # Adapters held by open streaming sessions; never evicted while pinned
+        self._pinned: dict = {}
+        self._cond = threading.Condition()
+        self._stats = {"hits": 0, "swaps": 0, "loads": 0, "evictions": 0, "swap_seconds_total": 0.0, "swap_seconds_max": 0.0}
+        self._unsupported_logged = False
+
+    def _source(self, adapter_id: str) -> str:
+        local = MODELS_DIR / adapter_id
+        if local.exists():
+            return str(local)
+        model = get_model(adapter_id)
+        if model is not None and model.repo_id:
+            return model.repo_id
+        raise ValueError(f"Adapter '{adapter_id}' not found in {MODELS_DIR}")
+
+    def _size(self, adapter_id: str) -> int:
+        local = MODELS_DIR / adapter_id
+        return _dir_size(local) if local.exists() else UNKNOWN_ADAPTER_BYTES
+
+    def _evict_for(self, target, incoming: int):
+        """Unload least recently used adapters until `incoming` bytes fit"""
+        while True:
+            with self._cond:
+                candidates = [a for a in self._resident if a != self._active and a not in self._pinned]
+                fits = (
+                    len(self._resident) < self.max_slots
+                    and sum(self._resident.values()) + incoming <= self.max_bytes
+                )
+                if fits or not candidates:
+                    return
+                victim = candidates[0]
+                del self._resident[victim]
+                self._stats["evictions"] += 1
+            if hasattr(target, "delete_adapter"):
+                target.delete_adapter(victim)
+            print(f"[VieNeu] Evicted adapter {victim}")
+
+    def _activate(self, tts, adapter_id: Optional[str]):
+        """Switch the engine to adapter_id; called without the lock while `_activating` is set"""
+        mode, target = _adapter_api(tts)
+        if mode is None:
+            if adapter_id is not None and not self._unsupported_logged:
+                print("[VieNeu] Engine has no LoRA adapter API; using the base model")
+                self._unsupported_logged = True
+            with self._cond:
+                self._active = adapter_id
+            return
+
+        started = time.monotonic()
+        if adapter_id is None:
+            if mode == "multi":
+                _call_optional(target, "disable_adapter_layers")
+            else:
+                tts.unload_lora_adapter()
+                with self._cond:
+                    self._resident.clear()
+        elif mode == "multi":
+            with self._cond:
+                resident = adapter_id in self._resident
+                if resident:
+                    self._stats["hits"] += 1
+            if not resident:
+                size = self._size(adapter_id)
+                self._evict_for(target, size)
+                target.load_adapter(self._source(adapter_id), adapter_name=adapter_id)
+                with self._cond:
+                    self._resident[adapter_id] = size
+                    self._stats["loads"] += 1
+            _call_optional(target, "enable_adapter_layers")
+            target.set_adapter(adapter_id)
+        else:
+            # One slot only: base weights stay, the previous LoRA is replaced
+            if self._active is not None:
+                tts.unload_lora_adapter()
+                with self._cond:
+                    self._active = None
+                    self._resident.clear()
+            tts.load_lora_adapter(self._source(adapter_id))
+            size = self._size(adapter_id)
+            with self._cond:
+                self._resident[adapter_id] = size
+                self._stats["loads"] += 1
+
+        elapsed = time.monotonic() - started
+        with self._cond:
+            self._active = adapter_id
+            self._stats["swaps"] += 1
+            self._stats["swap_seconds_total"] += elapsed
+            self._stats["swap_seconds_max"] = max(self._stats["swap_seconds_max"], elapsed)
+        print(f"[VieNeu] Switched to adapter {adapter_id or 'base'} in {elapsed * 1000:.0f} ms")
+
+    def _switch_waiting(self) -> bool:
+        return any(count for a, count in self._switches.items() if a != self._active)
+
+    def _enter(self, adapter_id: Optional[str]):
+        with self._cond:
+            self._inflight += 1
+            if adapter_id is not None:
+                self._last_used[adapter_id] = time.time()
+
+    @contextmanager
+    def use(self, tts, adapter_id: Optional[str]):
+        """Bind adapter_id (None = base model) for the duration of an engine call"""
+        if tts is None:
+            yield
+            return
+
+        with self._cond:
+            switching = activate = False
+            while True:
+                if not self._activating:
+                    if self._active == adapter_id:
+                        # Calls that waited for this switch go in; new ones queue behind a waiting switch
+                        if switching or not self._switch_waiting():
+                            break
+                    elif self._inflight == 0:
+                        self._activating = activate = True
+                        break
+                if self._active != adapter_id and not switching:
+                    switching = True
+                    self._switches[adapter_id] = self._switches.get(adapter_id, 0) + 1
+                self._cond.wait()
+            if switching:
+                self._switches[adapter_id] -= 1
+                if not self._switches[adapter_id]:
+                    del self._switches[adapter_id]
+            if not activate:
+                if adapter_id in self._resident:
+                    self._resident.move_to_end(adapter_id)
+                    self._stats["hits"] += 1
+                self._enter(adapter_id)
+
+        if activate:
+            try:
+                self._activate(tts, adapter_id)
+            except BaseException:
+                with self._cond:
+                    self._activating = False
+                    self._cond.notify_all()
+                raise
+            # Entered in the same step, before another switch can claim the engine
+            with self._cond:
+                self._activating = False
+                self._enter(adapter_id)
+                self._cond.notify_all()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._inflight -= 1
+                self._cond.notify_all()
+    def pin(self, tts, adapter_id: str):
+        """Load adapter_id and keep it resident until unpin() (counted, for concurrent sessions)"""
+        with self.use(tts, adapter_id):
+            pass
+        with self._cond:
+            self._pinned[adapter_id] = self._pinned.get(adapter_id, 0) + 1
+
+    def unpin(self, adapter_id: str):
+        with self._cond:
+            count = self._pinned.get(adapter_id, 0) - 1
+            if count > 0:
+                self._pinned[adapter_id] = count
+            else:
+                self._pinned.pop(adapter_id, None)
+
+    def evict(self, tts, adapter_id: str):
+        """Drop an adapter (e.g. after the model is deleted); waits for in-flight calls"""
+        with self._cond:
+            while self._inflight > 0 or self._activating:
+                self._cond.wait()
+            if adapter_id not in self._resident:
+                return
+            self._activating = True
+        try:
+            mode, target = _adapter_api(tts)
+            if self._active == adapter_id:
+                self._activate(tts, None)
+            with self._cond:
+                self._resident.pop(adapter_id, None)
+                if mode == "single":
+                    self._resident.clear()
+            if mode == "multi" and hasattr(target, "delete_adapter"):
+                target.delete_adapter(adapter_id)
+        finally:
+            with self._cond:
+                self._activating = False
+                self._cond.notify_all()
+
+    def stats(self) -> dict:
+        # Only bookkeeping happens under the lock, so this never waits for a load
+        with self._cond:
+            swaps = self._stats["swaps"]
+            return {
+                "active": self._active,
+                "resident": [
+                    {"id": a, "bytes": size, "last_used": self._last_used.get(a)}
+                    for a, size in self._resident.items()
+                ],
+                "resident_bytes": sum(self._resident.values()),
+                "max_bytes": self.max_bytes,
+                "max_slots": self.max_slots,
+                "pinned": dict(self._pinned),
+                "avg_swap_ms": round(self._stats["swap_seconds_total"] / swaps * 1000, 1) if swaps else 0.0,
+                "max_swap_ms": round(self._stats["swap_seconds_max"] * 1000, 1),
+                **{k: v for k, v in self._stats.items() if not k.startswith("swap_seconds")},
+            }
+
+
+adapter_manager = AdapterManager()
@@ -0,0 +1,105 @@
+"""
+Audio helpers - PCM conversion and WAV writing shared by the TTS routes
+"""
+
+import struct
+import wave
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+
+DEFAULT_SAMPLE_RATE = 24000
+
+# RIFF/data size used while the final length is still unknown
+STREAMING_WAV_SIZE = 0xFFFFFFFF
+
+
+def engine_sample_rate(tts) -> int:
+    """Output sample rate of a TTS engine"""
+    return int(getattr(tts, "sample_rate", DEFAULT_SAMPLE_RATE))
+
+
+def audio_seconds(audio, sample_rate: int) -> float:
+    """Duration of an engine waveform (numpy array or tensor, samples on the last axis)"""
+    shape = getattr(audio, "shape", None)
+    samples = shape[-1] if shape else len(audio)
+    return samples / sample_rate if sample_rate else 0.0
+
+
+def to_pcm16(audio) -> bytes:
+    """Convert a float waveform in [-1, 1] to little-endian 16-bit PCM"""
+    samples = np.asarray(audio, dtype=np.float32).reshape(-1)
+    return (np.clip(samples, -1.0, 1.0) * 32767.0).astype("<i2").tobytes()
+
+
+def wav_header(sample_rate: int, data_size: int = STREAMING_WAV_SIZE, channels: int = 1) -> bytes:
+    """44-byte PCM16 WAV header; the default size marks a stream of unknown length"""
+    byte_rate = sample_rate * channels * 2
+    riff_size = STREAMING_WAV_SIZE if data_size == STREAMING_WAV_SIZE else 36 + data_size
+    return (
+        b"RIFF"
+        + struct.pack("<I", riff_size)
+        + b"WAVEfmt "
+        + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, byte_rate, channels * 2, 16)
+        + b"data"
+        + struct.pack("<I", data_size)
+    )
+
+
+def write_wav(path: Path, pcm_chunks: Iterable[bytes], sample_rate: int):
+    """Write PCM16 mono chunks to a WAV file"""
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        for chunk in pcm_chunks:
+            f.writeframes(chunk)
+
+
+def read_wav(path: Path):
+    """Read a PCM16 mono WAV as (float32 waveform, sample rate)"""
+    with wave.open(str(path), "rb") as f:
+        sample_rate = f.getframerate()
+        frames = f.readframes(f.getnframes())
+    samples = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32767.0
+    return samples, sample_rate
+
+
+def trim_silence(audio: np.ndarray, sample_rate: int, threshold: float = 0.01, keep: float = 0.02) -> np.ndarray:
+    """Strip leading/trailing near-silence, keeping a few ms of padding"""
+    loud = np.flatnonzero(np.abs(audio) > threshold)
+    if loud.size == 0:
+        return audio[:0]
+    pad = int(keep * sample_rate)
+    return audio[max(0, loud[0] - pad):loud[-1] + 1 + pad]
+
+
+def stitch(segments: list, pauses: list, sample_rate: int, crossfade: float = 0.015) -> np.ndarray:
+    """
+    Join waveforms in order with a pause (seconds) after each one.
+
+    Segments separated by a pause get short fade-out/fade-in ramps so the
+    cut into silence does not click; segments with no pause are crossfaded.
+    """
+    fade = max(1, int(crossfade * sample_rate))
+    ramp = np.linspace(0.0, 1.0, fade, dtype=np.float32)
+    parts = []
+
+    for i, audio in enumerate(segments):
+        audio = np.array(audio, dtype=np.float32).reshape(-1)
+        joined = i > 0 and pauses[i - 1] <= 0
+        if joined and parts and len(parts[-1]) >= fade and len(audio) >= fade:
+            parts[-1][-fade:] = parts[-1][-fade:] * ramp[::-1] + audio[:fade] * ramp
+            audio = audio[fade:]
+        elif len(audio) >= fade:
+            audio[:fade] *= ramp
+        parts.append(audio)
+
+        pause = pauses[i] if i < len(pauses) else 0.0
+        if pause > 0 and i < len(segments) - 1:
+            if len(audio) >= fade:
+                audio[-fade:] *= ramp[::-1]
+            parts.append(np.zeros(int(pause * sample_rate), dtype=np.float32))
+
+    return np.concatenate(parts) if parts else np.zeros(0, dtype=np.float32)
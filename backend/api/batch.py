@@ -0,0 +1,555 @@
+"""
+Batch API Router - Bulk synthesis of CSV/JSONL scripts (IVR menus, e-learning lines)
+Rows are grouped by voice and length into engine batches; results stream into a resumable manifest
+"""
+
+import os
+import re
+import csv
+import io
+import json
+import time
+import wave
+import shutil
+import asyncio
+import hashlib
+import threading
+import zipfile
+from enum import Enum
+from pathlib import Path
+from typing import Dict, List, Optional
+from datetime import datetime
+
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Request
+from pydantic import BaseModel
+
+from api.inference import PoolSaturated
+from api.batching import MAX_BATCH_SIZE, MAX_BATCH_CHARS
+from api.synthesis_cache import cache_key
+from api.models import resolve_adapter_async
+from api.http_cache import cached_file_response
+from api.transcode import audio_response, negotiate_format
+from api.tts import OUTPUT_DIR, inference_pool, synthesis_cache, synthesize_batch_to_files
+
+router = APIRouter()
+
+BATCH_DIR = OUTPUT_DIR / "batch"
+BATCH_DIR.mkdir(parents=True, exist_ok=True)
+
+MAX_UPLOAD_BYTES = int(os.getenv("VIENEU_BATCH_MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+MAX_ROWS = int(os.getenv("VIENEU_BATCH_MAX_ROWS", "100000"))
+MAX_ROW_CHARS = int(os.getenv("VIENEU_BATCH_MAX_ROW_CHARS", "2000"))
+
+ROW_ID_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9._-]{0,99}")
+
+
+class BatchStatus(str, Enum):
+    QUEUED = "queued"
+    RENDERING = "rendering"
+    COMPLETED = "completed"
+    CANCELLED = "cancelled"
+    ERROR = "error"
+
+
+class BatchRow(BaseModel):
+    id: str
+    text: str
+    voice_id: str
+
+
+class BatchJob(BaseModel):
+    id: str
+    filename: str
+    voice_id: str
+    status: BatchStatus
+    total: int
+    done: int = 0
+    failed: int = 0
+    cached: int = 0
+    created_at: str
+    started_at: Optional[str] = None
+    completed_at: Optional[str] = None
+    error: Optional[str] = None
+
+
+_jobs: Dict[str, BatchJob] = {}
+_tasks: Dict[str, asyncio.Task] = {}
+# (monotonic start, rows finished) of the current run, for rate and ETA
+_runs: Dict[str, tuple] = {}
+_file_lock = threading.Lock()
+_shutting_down = False
+
+# Batches from all jobs share one limit: one in flight per worker leaves room for interactive requests
+_inflight = asyncio.Semaphore(inference_pool.workers)
+
+
+def parse_rows(content: bytes, filename: str, default_voice: str) -> List[BatchRow]:
+    """Rows from a CSV (header with `text`, optional `id`/`voice_id`) or JSONL upload"""
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Script must be UTF-8")
+
+    if Path(filename).suffix.lower() in (".jsonl", ".ndjson"):
+        records = []
+        for line_no, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Line {line_no}: invalid JSON")
+            if not isinstance(record, dict):
+                raise HTTPException(status_code=400, detail=f"Line {line_no}: expected an object")
+            records.append((line_no, record))
+    else:
+        reader = csv.DictReader(io.StringIO(text))
+        if not reader.fieldnames or "text" not in [f.strip() for f in reader.fieldnames]:
+            raise HTTPException(status_code=400, detail="CSV needs a header row with a `text` column")
+        records = [
+            (line_no, {(k or "").strip(): v for k, v in record.items()})
+            for line_no, record in enumerate(reader, start=2)
+        ]
+
+    if len(records) > MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"Too many rows (max {MAX_ROWS})")
+
+    rows, seen = [], set()
+    for line_no, record in records:
+        row_text = str(record.get("text") or "").strip()
+        if not row_text:
+            raise HTTPException(status_code=400, detail=f"Line {line_no}: empty text")
+        if len(row_text) > MAX_ROW_CHARS:
+            raise HTTPException(status_code=400, detail=f"Line {line_no}: text too long (max {MAX_ROW_CHARS} chars)")
+        row_id = str(record.get("id") or f"{len(rows) + 1:06d}").strip()
+        if not ROW_ID_PATTERN.fullmatch(row_id):
+            raise HTTPException(status_code=400, detail=f"Line {line_no}: id may only use letters, digits, '.', '_' and '-'")
+        if row_id in seen:
+            raise HTTPException(status_code=400, detail=f"Line {line_no}: duplicate id {row_id}")
+        seen.add(row_id)
+        voice = str(record.get("voice_id") or record.get("voice") or default_voice).strip()
+        rows.append(BatchRow(id=row_id, text=row_text, voice_id=voice))
+
+    if not rows:
+        raise HTTPException(status_code=400, detail="Script has no rows")
+    return rows
+
+
+def plan_batches(rows: List[BatchRow]) -> List[List[BatchRow]]:
+    """
+    Group rows by voice and sort by length, then cut into engine batches.
+
+    Similar lengths in one batch waste little padding, and one voice per
+    batch means no adapter swaps inside it.
+    """
+    batches = []
+    ordered = sorted(rows, key=lambda r: (r.voice_id, len(r.text)))
+    current: List[BatchRow] = []
+    chars = 0
+    for row in ordered:
+        if current and (
+            row.voice_id != current[0].voice_id
+            or len(current) >= MAX_BATCH_SIZE
+            or chars + len(row.text) > MAX_BATCH_CHARS
+        ):
+            batches.append(current)
+            current, chars = [], 0
+        current.append(row)
+        chars += len(row.text)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _job_dir(job_id: str) -> Path:
+    return BATCH_DIR / job_id
+
+
+def _row_path(job_id: str, row_id: str) -> Path:
+    return _job_dir(job_id) / "audio" / f"{row_id}.wav"
+
+
+def _write_job(job_id: str, data: str):
+    path = _job_dir(job_id) / "job.json"
+    with _file_lock:
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(data, encoding="utf-8")
+        tmp.replace(path)
+
+
+async def _save_job(job: BatchJob):
+    await asyncio.to_thread(_write_job, job.id, job.model_dump_json(indent=2))
+
+
+def _load_job(job_id: str) -> Optional[BatchJob]:
+    path = _job_dir(job_id) / "job.json"
+    if not path.exists():
+        return None
+    return BatchJob(**json.loads(path.read_text(encoding="utf-8")))
+
+
+def _find(job_id: str) -> Optional[BatchJob]:
+    if not re.fullmatch(r"[0-9a-f]{16}", job_id):
+        return None
+    return _jobs.get(job_id) or _load_job(job_id)
+
+
+def _load_rows(job_id: str) -> List[BatchRow]:
+    with open(_job_dir(job_id) / "rows.jsonl", encoding="utf-8") as f:
+        return [BatchRow(**json.loads(line)) for line in f if line.strip()]
+
+
+def _load_results(job_id: str) -> Dict[str, dict]:
+    """Latest manifest entry per row (a resumed row may have an earlier error entry)"""
+    path = _job_dir(job_id) / "manifest.jsonl"
+    results: Dict[str, dict] = {}
+    if path.exists():
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn last line from a crash
+                results[entry["id"]] = entry
+    return results
+
+
+def _append_results(job_id: str, entries: List[dict]):
+    with _file_lock, open(_job_dir(job_id) / "manifest.jsonl", "a", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def _wav_duration(path: Path) -> float:
+    with wave.open(str(path), "rb") as f:
+        return round(f.getnframes() / f.getframerate(), 3)
+
+
+def render_rows(tts, voice_id: str, jobs: list) -> list:
+    """Render one batch to temporary files and move finished ones into place (blocking)"""
+    parts = [(text, path.with_suffix(".part.wav")) for text, path in jobs]
+    results = synthesize_batch_to_files(tts, voice_id, parts)
+    for ok, (_, part), (_, path) in zip(results, parts, jobs):
+        if ok:
+            part.replace(path)
+    return results
+
+
+def _copy_cached(source: Path, target: Path):
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+async def _submit_batch(voice_id: str, jobs: list) -> list:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + inference_pool.timeout
+    while True:
+        try:
+            return await inference_pool.submit(render_rows, voice_id, jobs)
+        except PoolSaturated as e:
+            # Interactive traffic has priority; wait for room instead of failing rows
+            if loop.time() >= deadline:
+                raise
+            await asyncio.sleep(min(e.retry_after, 1.0))
+
+
+async def _render_batch(job: BatchJob, batch: List[BatchRow]):
+    entries = []
+    todo = []
+    adapters = {}
+    for row in batch:
+        target = _row_path(job.id, row.id)
+        if row.voice_id not in adapters:
+            adapters[row.voice_id] = await resolve_adapter_async(row.voice_id)
+        cached_path = synthesis_cache.lookup(cache_key(row.text, row.voice_id, adapters[row.voice_id]))
+        if cached_path is not None:
+            try:
+                await asyncio.to_thread(_copy_cached, cached_path, target)
+                entries.append({"id": row.id, "status": "done", "cached": True})
+                continue
+            except OSError:
+                pass
+        todo.append(row)
+
+    if todo:
+        async with _inflight:
+            try:
+                rendered = await _submit_batch(todo[0].voice_id, [(r.text, _row_path(job.id, r.id)) for r in todo])
+                errors = [None if ok else "VieNeu engine not available" for ok in rendered]
+            except Exception as e:
+                if len(todo) == 1:
+                    errors = [str(e) or type(e).__name__]
+                else:
+                    # Retry one by one so a single bad row does not fail its whole batch
+                    errors = []
+                    for row in todo:
+                        try:
+                            ok = (await _submit_batch(row.voice_id, [(row.text, _row_path(job.id, row.id))]))[0]
+                            errors.append(None if ok else "VieNeu engine not available")
+                        except Exception as row_error:
+                            errors.append(str(row_error) or type(row_error).__name__)
+        for row, error in zip(todo, errors):
+            entries.append({"id": row.id, "status": "done"} if error is None else {"id": row.id, "status": "error", "error": error})
+
+    by_id = {row.id: row for row in batch}
+    for entry in entries:
+        row = by_id[entry["id"]]
+        entry.update(voice_id=row.voice_id, chars=len(row.text))
+        if entry["status"] == "done":
+            entry["file"] = f"audio/{row.id}.wav"
+            entry["duration"] = await asyncio.to_thread(_wav_duration, _row_path(job.id, row.id))
+            job.done += 1
+            job.cached += 1 if entry.get("cached") else 0
+        else:
+            job.failed += 1
+
+    await asyncio.to_thread(_append_results, job.id, entries)
+    started, finished = _runs[job.id]
+    _runs[job.id] = (started, finished + len(entries))
+    await _save_job(job)
+
+
+async def render_job(job: BatchJob):
+    """Render every row that has no audio yet; earlier results are kept"""
+    try:
+        rows = await asyncio.to_thread(_load_rows, job.id)
+        results = await asyncio.to_thread(_load_results, job.id)
+        finished = {
+            row_id for row_id, entry in results.items()
+            if entry["status"] == "done" and _row_path(job.id, row_id).exists()
+        }
+        pending = [row for row in rows if row.id not in finished]
+
+        job.status = BatchStatus.RENDERING
+        job.started_at = job.started_at or datetime.now().isoformat()
+        job.done = len(finished)
+        job.failed = 0
+        job.cached = sum(1 for row_id in finished if results[row_id].get("cached"))
+        job.error = None
+        _runs[job.id] = (time.monotonic(), 0)
+        await _save_job(job)
+
+        (_job_dir(job.id) / "audio").mkdir(exist_ok=True)
+        await asyncio.gather(*(_render_batch(job, batch) for batch in plan_batches(pending)))
+
+        job.status = BatchStatus.COMPLETED if job.failed == 0 else BatchStatus.ERROR
+        if job.failed:
+            job.error = f"{job.failed} row(s) failed; resume to retry them"
+        job.completed_at = datetime.now().isoformat()
+        print(f"[VieNeu] Batch {job.id} finished: {job.done} rendered, {job.failed} failed ({job.cached} from cache)")
+
+    except asyncio.CancelledError:
+        # On server shutdown the job stays `rendering` and is resumed on the next start
+        if not _shutting_down:
+            job.status = BatchStatus.CANCELLED
+            job.completed_at = datetime.now().isoformat()
+        raise
+
+    except Exception as e:
+        job.status = BatchStatus.ERROR
+        job.error = str(e)
+        print(f"[VieNeu] Batch {job.id} failed: {e}")
+
+    finally:
+        _tasks.pop(job.id, None)
+        _runs.pop(job.id, None)
+        await _save_job(job)
+
+
+def _start(job: BatchJob):
+    job.status = BatchStatus.QUEUED
+    _jobs[job.id] = job
+    _tasks[job.id] = asyncio.ensure_future(render_job(job))
+
+
+def resume_unfinished():
+    """Restart jobs that were queued or rendering when the server stopped (called from the app lifespan)"""
+    for path in BATCH_DIR.glob("*/job.json"):
+        try:
+            job = _load_job(path.parent.name)
+        except (OSError, ValueError):
+            continue
+        if job is not None and job.status in (BatchStatus.QUEUED, BatchStatus.RENDERING) and job.id not in _tasks:
+            print(f"[VieNeu] Resuming batch {job.id} ({job.total - job.done} rows left)")
+            _start(job)
+
+
+async def shutdown():
+    """Stop running jobs without marking them cancelled (called from the app lifespan)"""
+    global _shutting_down
+    _shutting_down = True
+    tasks = list(_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _progress(job: BatchJob) -> dict:
+    finished = job.done + job.failed
+    progress = {
+        **job.model_dump(),
+        "progress": int(finished / job.total * 100) if job.total else 100,
+        "rows_per_second": None,
+        "eta_seconds": None,
+    }
+    run = _runs.get(job.id)
+    if run is not None:
+        elapsed = time.monotonic() - run[0]
+        if run[1] and elapsed > 0:
+            rate = run[1] / elapsed
+            progress["rows_per_second"] = round(rate, 2)
+            progress["eta_seconds"] = round((job.total - finished) / rate, 1)
+    return progress
+
+
+def _build_zip(job_id: str, target: Path):
+    """Zip of rendered rows plus the manifest (WAV does not compress, so entries are stored)"""
+    results = _load_results(job_id)
+    tmp = target.with_suffix(".tmp")
+    with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        manifest = []
+        for row_id, entry in results.items():
+            path = _row_path(job_id, row_id)
+            if entry["status"] == "done" and path.exists():
+                archive.write(path, f"{row_id}.wav")
+            manifest.append(json.dumps(entry, ensure_ascii=False))
+        archive.writestr("manifest.jsonl", "\n".join(manifest) + "\n")
+    tmp.replace(target)
+
+
+@router.post("/")
+async def create_batch(
+    file: UploadFile = File(...),
+    voice_id: str = Form("ngoc-huyen"),
+):
+    """
+    Queue a CSV/JSONL script of `id,text,voice_id` rows.
+
+    Uploading the same script again returns the existing job; unfinished
+    rows are rendered, finished ones are kept.
+    """
+    content = await file.read(MAX_UPLOAD_BYTES + 1)
+    if len(content) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Script too large (max {MAX_UPLOAD_BYTES // (1024 * 1024)} MB)")
+
+    job_id = hashlib.sha256(voice_id.encode("utf-8") + b"\n" + content).hexdigest()[:16]
+    if job_id in _tasks:
+        return _progress(_jobs[job_id])
+
+    job = _find(job_id)
+    if job is None:
+        rows = parse_rows(content, file.filename or "", voice_id)
+        job = BatchJob(
+            id=job_id,
+            filename=file.filename or "script",
+            voice_id=voice_id,
+            status=BatchStatus.QUEUED,
+            total=len(rows),
+            created_at=datetime.now().isoformat(),
+        )
+        _job_dir(job_id).mkdir(parents=True, exist_ok=True)
+        with open(_job_dir(job_id) / "rows.jsonl", "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(row.model_dump_json() + "\n")
+        await _save_job(job)
+    elif job.status == BatchStatus.COMPLETED:
+        _jobs[job_id] = job
+        return _progress(job)
+
+    _start(job)
+    return _progress(job)
+
+
+@router.get("/")
+async def list_batches(limit: int = 50):
+    """Batch jobs, newest first"""
+    jobs = []
+    for path in BATCH_DIR.glob("*/job.json"):
+        job = _jobs.get(path.parent.name) or _load_job(path.parent.name)
+        if job is not None:
+            jobs.append(job)
+    jobs.sort(key=lambda j: j.created_at, reverse=True)
+    return {"jobs": [_progress(j) for j in jobs[:max(1, min(limit, 200))]]}
+
+
+@router.get("/{job_id}")
+async def get_batch(job_id: str):
+    """Job status with progress, throughput and ETA"""
+    job = _find(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return _progress(job)
+
+
+@router.get("/{job_id}/results")
+async def get_results(job_id: str, offset: int = 0, limit: int = 500, status: Optional[str] = None):
+    """Per-row manifest entries (`status` filters on done/error)"""
+    if _find(job_id) is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    results = list((await asyncio.to_thread(_load_results, job_id)).values())
+    if status:
+        results = [r for r in results if r["status"] == status]
+    offset = max(0, offset)
+    limit = max(1, min(limit, 5000))
+    return {"results": results[offset:offset + limit], "total": len(results), "offset": offset}
+
+
+@router.post("/{job_id}/resume")
+async def resume_batch(job_id: str):
+    """Render rows that failed or never ran"""
+    if job_id in _tasks:
+        return _progress(_jobs[job_id])
+    job = _find(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    _start(job)
+    return _progress(job)
+
+
+@router.post("/{job_id}/cancel")
+async def cancel_batch(job_id: str):
+    """Stop a running batch; rows already rendered are kept"""
+    task = _tasks.get(job_id)
+    if task is None:
+        raise HTTPException(status_code=400, detail="Batch is not running")
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    return _progress(_jobs[job_id])
+
+
+@router.api_route("/{job_id}/rows/{row_id}/audio", methods=["GET", "HEAD"])
+async def get_row_audio(
+    job_id: str,
+    row_id: str,
+    request: Request,
+    format: Optional[str] = None,
+    bitrate: Optional[int] = None,
+    sample_rate: Optional[int] = None,
+):
+    """Audio for one row (same format options as /api/tts/audio)"""
+    if _find(job_id) is None or not ROW_ID_PATTERN.fullmatch(row_id):
+        raise HTTPException(status_code=404, detail="Audio file not found")
+    path = _row_path(job_id, row_id)
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Audio file not found")
+    fmt = negotiate_format(format, request.headers.get("accept"))
+    return await audio_response(request, path, row_id, fmt, bitrate, sample_rate, negotiated=format is None)
+
+
+@router.get("/{job_id}/download")
+async def download_batch(job_id: str, request: Request):
+    """All rendered rows and the manifest as one zip (rebuilt when rows were added)"""
+    if _find(job_id) is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    target = _job_dir(job_id) / "results.zip"
+    manifest = _job_dir(job_id) / "manifest.jsonl"
+    if not manifest.exists():
+        raise HTTPException(status_code=404, detail="No rows rendered yet")
+    if not target.exists() or target.stat().st_mtime < manifest.stat().st_mtime:
+        await asyncio.to_thread(_build_zip, job_id, target)
+    return await cached_file_response(request, target, "application/zip", f"batch_{job_id}.zip")
@@ -0,0 +1,141 @@
+"""
+Micro-batching Scheduler - Groups concurrent TTS requests into batched inference calls
+"""
+
+import os
+import time
+import asyncio
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from fastapi import Request
+
+from api.inference import InferencePool, ClientDisconnected, wait_for_disconnect
+
+BATCH_WINDOW_MS = float(os.getenv("VIENEU_BATCH_WINDOW_MS", "20"))
+MAX_BATCH_SIZE = int(os.getenv("VIENEU_MAX_BATCH_SIZE", "8"))
+# Characters are used as a cheap stand-in for the model's token budget
+MAX_BATCH_CHARS = int(os.getenv("VIENEU_MAX_BATCH_CHARS", "2000"))
+
+
+@dataclass
+class _BatchItem:
+    payload: Any
+    cost: int
+    future: asyncio.Future
+    arrived: float
+
+
+@dataclass
+class _PendingGroup:
+    items: List[_BatchItem] = field(default_factory=list)
+    cost: int = 0
+    timer: Optional[asyncio.TimerHandle] = None
+
+
+class MicroBatcher:
+    """
+    Collects requests that share a key (voice/adapter) for up to `window_ms`
+    and runs them as a single pool job.
+
+    A group is flushed early once it reaches `max_batch_size` items or
+    `max_batch_chars` of text. `batch_fn(engine, key, payloads)` runs on an
+    inference worker and must return one result per payload, in order.
+    """
+
+    def __init__(
+        self,
+        pool: InferencePool,
+        batch_fn: Callable[[Any, Hashable, List[Any]], List[Any]],
+        window_ms: float = BATCH_WINDOW_MS,
+        max_batch_size: int = MAX_BATCH_SIZE,
+        max_batch_chars: int = MAX_BATCH_CHARS,
+    ):
+        self.pool = pool
+        self.batch_fn = batch_fn
+        self.window = max(0.0, window_ms) / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_batch_chars = max(1, max_batch_chars)
+        self._pending: Dict[Hashable, _PendingGroup] = {}
+        self._batch_sizes: Counter = Counter()
+        self._items = 0
+        self._wait_total = 0.0
+
+    async def submit(self, key: Hashable, payload: Any, cost: int, request: Optional[Request] = None):
+        """Queue one request and wait for its share of the batch result"""
+        loop = asyncio.get_running_loop()
+        item = _BatchItem(payload, cost, loop.create_future(), time.monotonic())
+
+        group = self._pending.get(key)
+        if group is not None and group.items and group.cost + cost > self.max_batch_chars:
+            self._flush(key)
+            group = None
+        if group is None:
+            group = self._pending[key] = _PendingGroup()
+
+        group.items.append(item)
+        group.cost += cost
+        if len(group.items) >= self.max_batch_size or group.cost >= self.max_batch_chars:
+            self._flush(key)
+        elif group.timer is None:
+            group.timer = loop.call_later(self.window, self._flush, key)
+
+        return await self._wait(item, request)
+
+    async def _wait(self, item: _BatchItem, request: Optional[Request]):
+        if request is None:
+            return await item.future
+
+        watcher = asyncio.ensure_future(wait_for_disconnect(request))
+        try:
+            done, _ = await asyncio.wait({item.future, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if item.future in done:
+                return item.future.result()
+            # Dropped from its batch if that batch has not started yet
+            item.future.cancel()
+            raise ClientDisconnected()
+        finally:
+            watcher.cancel()
+
+    def _flush(self, key: Hashable):
+        group = self._pending.pop(key, None)
+        if group is None:
+            return
+        if group.timer is not None:
+            group.timer.cancel()
+
+        items = [i for i in group.items if not i.future.done()]
+        if items:
+            asyncio.ensure_future(self._run(key, items))
+
+    async def _run(self, key: Hashable, items: List[_BatchItem]):
+        flushed = time.monotonic()
+        self._batch_sizes[len(items)] += 1
+        self._items += len(items)
+        self._wait_total += sum(flushed - i.arrived for i in items)
+
+        try:
+            results = await self.pool.submit(self.batch_fn, key, [i.payload for i in items])
+        except Exception as e:
+            for item in items:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+
+        for item, result in zip(items, results):
+            if not item.future.done():
+                item.future.set_result(result)
+
+    def stats(self) -> dict:
+        batches = sum(self._batch_sizes.values())
+        return {
+            "window_ms": self.window * 1000.0,
+            "max_batch_size": self.max_batch_size,
+            "max_batch_chars": self.max_batch_chars,
+            "batches": batches,
+            "requests": self._items,
+            "avg_batch_size": round(self._items / batches, 2) if batches else 0.0,
+            "avg_window_wait_ms": round(self._wait_total / self._items * 1000.0, 2) if self._items else 0.0,
+            "batch_size_distribution": {str(size): count for size, count in sorted(self._batch_sizes.items())},
+        }
@@ -0,0 +1,69 @@
+"""
+SQLite Storage - Shared database for persistent backend state
+One WAL-mode connection per thread; async callers go through a small dedicated executor
+"""
+
+import os
+import sqlite3
+import asyncio
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable
+
+# Root of all persistent state; the database, voices, models, features, ... live under it
+STORAGE_DIR = Path(os.getenv("VIENEU_STORAGE_DIR", str(Path(__file__).parent.parent / "storage")))
+DB_PATH = Path(os.getenv("VIENEU_DB_PATH", str(STORAGE_DIR / "studio.db")))
+DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+
+DB_THREADS = int(os.getenv("VIENEU_DB_THREADS", "4"))
+
+_local = threading.local()
+_executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix="vieneu-db")
+
+# Connections a forked child inherited; never used or closed there (closing could remove the parent's WAL)
+_inherited = []
+
+
+def _after_fork():
+    global _local
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        _inherited.append(conn)
+    _local = threading.local()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def connect() -> sqlite3.Connection:
+    """Connection owned by the calling thread"""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(str(DB_PATH), timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL is durable across process crashes, only an OS crash can lose the last commit
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        _local.conn = conn
+    return conn
+
+
+def init_schema(statements: Iterable[str]):
+    """Create tables/indexes if missing (idempotent, called at import)"""
+    conn = connect()
+    with conn:
+        for statement in statements:
+            conn.execute(statement)
+
+
+async def run_db(fn: Callable, *args):
+    """Run fn(conn, *args) on a database thread"""
+    def call():
+        conn = connect()
+        with conn:
+            return fn(conn, *args)
+
+    return await asyncio.get_running_loop().run_in_executor(_executor, call)
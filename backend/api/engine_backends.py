@@ -0,0 +1,207 @@
+"""
+Engine Backends - Precision, runtime and CPU threading presets for the TTS engine
+VIENEU_ENGINE_BACKEND picks the backbone/codec variants the SDK loads and what runs on the engine afterwards
+"""
+
+import os
+import inspect
+from typing import Callable, Dict, List, Optional
+
+from api.shared_weights import torch_modules
+
+ENGINE_BACKEND = os.getenv("VIENEU_ENGINE_BACKEND", "default")
+# Override the preset's checkpoints (e.g. a fine-tuned GGUF export)
+BACKBONE_REPO = os.getenv("VIENEU_BACKBONE_REPO")
+CODEC_REPO = os.getenv("VIENEU_CODEC_REPO")
+
+# 0 = one intra-op thread per pinned core, or the libraries' own default when not pinned
+INTRA_OP_THREADS = int(os.getenv("VIENEU_INTRA_OP_THREADS", "0"))
+INTER_OP_THREADS = int(os.getenv("VIENEU_INTER_OP_THREADS", "0"))
+# Core groups, one per inference process: "0-3;4-7" pins process 0 to cores 0-3 and process 1 to 4-7
+CPU_AFFINITY = os.getenv("VIENEU_CPU_AFFINITY", "")
+
+# Engine attributes quantized by the int8 preset; the codec's convolutions stay in float
+QUANTIZE_MODULES = [m.strip() for m in os.getenv("VIENEU_QUANTIZE_MODULES", "backbone").split(",") if m.strip()]
+
+GGUF_Q8_REPO = "pnnbao-ump/VieNeu-TTS-q8-gguf"
+GGUF_Q4_REPO = "pnnbao-ump/VieNeu-TTS-q4-gguf"
+ONNX_CODEC_REPO = "neuphonic/neucodec-onnx-decoder"
+
+# Environment variables the math runtimes read when they start their thread pools
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+class EngineBackend:
+    """
+    How the engine is built: keyword arguments for the SDK constructor and
+    an optional step run on the loaded engine. `shares_weights` is False
+    when that step swaps the weights for tensors that cannot be
+    memory-mapped (VIENEU_MMAP_WEIGHTS is then skipped).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        precision: str,
+        kwargs: Optional[dict] = None,
+        prepare: Optional[Callable] = None,
+        shares_weights: bool = True,
+    ):
+        self.name = name
+        self.precision = precision
+        self.kwargs = kwargs or {}
+        self.prepare = prepare
+        self.shares_weights = shares_weights
+
+    def describe(self) -> dict:
+        kwargs = constructor_kwargs(self)
+        return {
+            "name": self.name,
+            "precision": self.precision,
+            "backbone": kwargs.get("backbone_repo"),
+            "codec": kwargs.get("codec_repo"),
+        }
+
+
+def quantize_int8(engine) -> dict:
+    """Dynamic int8 quantization of the Linear layers in QUANTIZE_MODULES (CPU only)"""
+    quantized = []
+    for name, module in torch_modules(engine).items():
+        if name not in QUANTIZE_MODULES:
+            continue
+        import torch
+
+        tensor = next(iter(module.state_dict().values()), None)
+        if tensor is not None and tensor.device.type != "cpu":
+            print(f"[VieNeu] Skipping int8 quantization of {name}: it runs on {tensor.device}")
+            continue
+        setattr(engine, name, torch.ao.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8))
+        quantized.append(name)
+    if not quantized:
+        print(f"[VieNeu] No CPU torch module among {QUANTIZE_MODULES} to quantize; running unquantized")
+    return {"quantized": quantized}
+
+
+CPU = {"backbone_device": "cpu", "codec_device": "cpu"}
+
+BACKENDS: Dict[str, EngineBackend] = {}
+
+
+def register_backend(backend: EngineBackend):
+    """Add or replace a preset (for engines with other constructor options)"""
+    BACKENDS[backend.name] = backend
+
+
+register_backend(EngineBackend("default", "sdk default"))
+register_backend(EngineBackend("cpu", "fp32", CPU))
+register_backend(EngineBackend("cpu-int8", "int8", CPU, prepare=quantize_int8, shares_weights=False))
+# llama.cpp backbone with an ONNX Runtime codec decoder
+register_backend(EngineBackend("gguf-q8", "q8_0", {**CPU, "backbone_repo": GGUF_Q8_REPO, "codec_repo": ONNX_CODEC_REPO}))
+register_backend(EngineBackend("gguf-q4", "q4_k_m", {**CPU, "backbone_repo": GGUF_Q4_REPO, "codec_repo": ONNX_CODEC_REPO}))
+
+
+def get_backend(name: str = None) -> EngineBackend:
+    name = name or ENGINE_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown engine backend {name!r} (choose from {', '.join(BACKENDS)})")
+    return BACKENDS[name]
+
+
+def constructor_kwargs(backend: EngineBackend) -> dict:
+    kwargs = dict(backend.kwargs)
+    if BACKBONE_REPO:
+        kwargs["backbone_repo"] = BACKBONE_REPO
+    if CODEC_REPO:
+        kwargs["codec_repo"] = CODEC_REPO
+    return kwargs
+
+
+def backend_fingerprint() -> Optional[str]:
+    """Identifies non-default engine builds in cache keys; None for the SDK defaults"""
+    if ENGINE_BACKEND == "default" and not BACKBONE_REPO and not CODEC_REPO:
+        return None
+    return f"{ENGINE_BACKEND}|{BACKBONE_REPO or ''}|{CODEC_REPO or ''}"
+
+
+def build_engine(cls, backend: EngineBackend):
+    """Construct the engine for a preset and run its post-load step (blocking)"""
+    kwargs = constructor_kwargs(backend)
+    try:
+        params = inspect.signature(cls).parameters.values()
+    except (TypeError, ValueError):
+        params = None
+    if params is not None and not any(p.kind == p.VAR_KEYWORD for p in params):
+        unsupported = sorted(set(kwargs) - {p.name for p in params})
+        if unsupported:
+            # Loading the default model instead would silently ignore the requested precision
+            raise ValueError(f"{cls.__name__} does not accept {', '.join(unsupported)} needed by backend {backend.name!r}")
+    engine = cls(**kwargs)
+    if backend.prepare is not None:
+        backend.prepare(engine)
+    return engine
+
+
+def parse_cores(spec: str) -> List[int]:
+    """`0-3,8` -> [0, 1, 2, 3, 8]"""
+    cores = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        low, _, high = part.partition("-")
+        cores.extend(range(int(low), int(high or low) + 1))
+    return cores
+
+
+def core_groups() -> List[List[int]]:
+    return [cores for cores in (parse_cores(group) for group in CPU_AFFINITY.split(";")) if cores]
+
+
+# What configure_cpu applied in this process; reported in engine_status
+cpu_settings = {"group": None, "cores": None, "intra_op_threads": None, "inter_op_threads": None}
+
+
+def configure_cpu(group: int = 0) -> dict:
+    """
+    Pin this process to its VIENEU_CPU_AFFINITY core group and size the
+    math runtimes' thread pools. Runs before the engine loads; prefork
+    inference children call it again with their own index after forking.
+    """
+    groups = core_groups()
+    cores = None
+    if groups:
+        if hasattr(os, "sched_setaffinity"):
+            cores = groups[group % len(groups)]
+            os.sched_setaffinity(0, cores)
+        else:
+            print("[VieNeu] VIENEU_CPU_AFFINITY is not supported on this platform; not pinning")
+
+    intra = INTRA_OP_THREADS or (len(cores) if cores else 0)
+    if intra:
+        # Read by OpenMP/MKL/ONNX Runtime when they first start, i.e. while the engine loads
+        for var in THREAD_ENV_VARS:
+            os.environ[var] = str(intra)
+    try:
+        import torch
+    except ImportError:
+        torch = None
+    if torch is not None:
+        if intra:
+            torch.set_num_threads(intra)
+        if INTER_OP_THREADS and torch.get_num_interop_threads() != INTER_OP_THREADS:
+            try:
+                torch.set_num_interop_threads(INTER_OP_THREADS)
+            except RuntimeError as e:
+                # Only settable before the first parallel region of the process
+                print(f"[VieNeu] Could not set inter-op threads: {e}")
+        intra = torch.get_num_threads()
+
+    cpu_settings.update(
+        group=group,
+        cores=cores,
+        intra_op_threads=intra or None,
+        inter_op_threads=torch.get_num_interop_threads() if torch is not None else INTER_OP_THREADS or None,
+    )
+    if cores or intra:
+        print(f"[VieNeu] CPU group {group}: cores {cores or 'all'}, {intra or 'default'} intra-op thread(s)")
+    return dict(cpu_settings)
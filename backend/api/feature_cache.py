@@ -0,0 +1,228 @@
+"""
+Feature Cache - Encoded training features shared across jobs
+Codec tokens keyed by clip content hash, text ids by clip + transcript, per encoder version;
+stored in append-only int32 shard files that the training dataloader memory-maps
+"""
+
+import os
+import json
+import time
+import wave
+import hashlib
+import sqlite3
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from api.db import STORAGE_DIR, connect, init_schema
+from api.synthesis_cache import MODEL_VERSION, normalize_text
+
+FEATURES_DIR = STORAGE_DIR / "features"
+SHARD_BYTES = int(os.getenv("VIENEU_FEATURE_SHARD_BYTES", str(512 * 1024 * 1024)))
+FEATURE_DTYPE = np.dtype("<i4")
+PROGRESS_INTERVAL = 0.5
+
+# Features that depend on the clip's audio alone; the rest also depend on its transcript
+AUDIO_FEATURES = ("codes",)
+FEATURES = ("codes", "text")
+
+init_schema([
+    """
+    CREATE TABLE IF NOT EXISTS feature_arrays (
+        encoder TEXT NOT NULL,
+        key TEXT NOT NULL,
+        feature TEXT NOT NULL,
+        shard INTEGER NOT NULL,
+        offset INTEGER NOT NULL,
+        length INTEGER NOT NULL,
+        PRIMARY KEY (encoder, key, feature)
+    )
+    """,
+])
+
+
+def feature_key(clip: dict, feature: str) -> str:
+    """Audio features are shared by every transcript of a clip; text features are not"""
+    if feature in AUDIO_FEATURES:
+        return clip["sha"]
+    material = f"{clip['sha']}\n{normalize_text(clip['text'])}"
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class FeatureEncoder:
+    """Turns a prepared clip + transcript into named int arrays (codec tokens, text ids)"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.tokenizer = getattr(engine, "tokenizer", None)
+        text_kind = "tokenizer" if hasattr(self.tokenizer, "encode") else "codepoints"
+        self.version = f"{MODEL_VERSION}|codes|{text_kind}|1"
+
+    def encode(self, feature: str, audio_path: Path, text: str) -> np.ndarray:
+        if feature == "codes":
+            codes = self.engine.encode_reference(str(audio_path))
+            return np.asarray(codes.cpu() if hasattr(codes, "cpu") else codes)
+        text = normalize_text(text)
+        if hasattr(self.tokenizer, "encode"):
+            return np.asarray(self.tokenizer.encode(text))
+        return np.frombuffer(text.encode("utf-32-le"), dtype="<u4")
+
+
+def load_encoder() -> Optional[FeatureEncoder]:
+    """Encoder backed by the VieNeu engine, or None when the SDK cannot pre-encode audio"""
+    try:
+        from vieneu import Vieneu
+    except ImportError:
+        return None
+    engine = Vieneu()
+    if not hasattr(engine, "encode_reference"):
+        return None
+    return FeatureEncoder(engine)
+
+
+class FeatureStore:
+    """
+    One directory per encoder version holding `<feature>-<shard>.i32` files.
+
+    Arrays are appended flat (the codec returns one code sequence per clip);
+    (shard, offset, length) rows in the SQLite `feature_arrays` table locate
+    them. Readers get np.memmap views, so nothing is copied or parsed when a
+    dataloader touches a clip.
+    """
+
+    def __init__(self, encoder_version: str, directory: Optional[Path] = None, shard_bytes: int = SHARD_BYTES):
+        self.encoder_version = encoder_version
+        self.directory = (directory or FEATURES_DIR) / hashlib.sha256(encoder_version.encode("utf-8")).hexdigest()[:16]
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / "encoder.txt").write_text(encoder_version, encoding="utf-8")
+        self.shard_bytes = shard_bytes
+        self._maps: Dict[Tuple[str, int], np.memmap] = {}
+
+    def shard_path(self, feature: str, shard: int) -> Path:
+        return self.directory / f"{feature}-{shard:05d}.i32"
+
+    def _current_shard(self, feature: str) -> int:
+        shards = sorted(int(p.stem.rsplit("-", 1)[1]) for p in self.directory.glob(f"{feature}-*.i32"))
+        if not shards:
+            return 0
+        last = shards[-1]
+        return last + 1 if self.shard_path(feature, last).stat().st_size >= self.shard_bytes else last
+
+    def _rows(self, conn: sqlite3.Connection, feature: str, keys: List[str], columns: str):
+        unique = list(dict.fromkeys(keys))
+        for start in range(0, len(unique), 500):
+            batch = unique[start:start + 500]
+            marks = ",".join("?" for _ in batch)
+            yield from conn.execute(
+                f"SELECT key, {columns} FROM feature_arrays WHERE encoder = ? AND feature = ? AND key IN ({marks})",
+                (self.encoder_version, feature, *batch),
+            )
+
+    def cached(self, conn: sqlite3.Connection, wanted: List[Tuple[str, str]]) -> set:
+        """The (feature, key) pairs of `wanted` that are already stored for this encoder"""
+        found = set()
+        for feature in {f for f, _ in wanted}:
+            keys = [k for f, k in wanted if f == feature]
+            found.update((feature, row["key"]) for row in self._rows(conn, feature, keys, "feature"))
+        return found
+
+    def append(self, conn: sqlite3.Connection, arrays: List[Tuple[str, str, np.ndarray]]):
+        """Write (feature, key, array) entries, then index them (data first, so a crash never indexes garbage)"""
+        rows = []
+        for name, key, array in arrays:
+            array = np.ascontiguousarray(array, dtype=FEATURE_DTYPE)
+            shard = self._current_shard(name)
+            path = self.shard_path(name, shard)
+            with open(path, "ab") as f:
+                offset = f.tell() // FEATURE_DTYPE.itemsize
+                f.write(array.tobytes())
+            rows.append((self.encoder_version, key, name, shard, offset, array.size))
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO feature_arrays (encoder, key, feature, shard, offset, length) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def locate(self, conn: sqlite3.Connection, keys: List[Dict[str, str]], features: List[str]) -> np.ndarray:
+        """(clips, features, 3) int64 table of shard/offset/length; keys[i] maps feature -> key for clip i"""
+        table = np.full((len(keys), len(features), 3), -1, dtype=np.int64)
+        for j, feature in enumerate(features):
+            wanted = [clip[feature] for clip in keys]
+            found = {
+                row["key"]: (row["shard"], row["offset"], row["length"])
+                for row in self._rows(conn, feature, wanted, "shard, offset, length")
+            }
+            for i, key in enumerate(wanted):
+                if key in found:
+                    table[i, j] = found[key]
+        return table
+
+    def view(self, feature: str, shard: int, offset: int, length: int) -> np.ndarray:
+        """Zero-copy view of one stored array"""
+        key = (feature, shard)
+        mapped = self._maps.get(key)
+        if mapped is None or mapped.size < offset + length:
+            mapped = np.memmap(self.shard_path(feature, shard), dtype=FEATURE_DTYPE, mode="r")
+            self._maps[key] = mapped
+        return mapped[offset:offset + length]
+
+
+def encode_dataset(
+    job_dir: Path,
+    progress: Callable[[dict], None],
+    should_stop: Callable[[], bool] = lambda: False,
+    encoder: Optional[FeatureEncoder] = None,
+) -> Optional[dict]:
+    """
+    Encode clips from prepared.jsonl that are not cached yet and write the
+    job's features.json + features.npy index. Returns a summary, or None if
+    stopped or no encoder is available.
+    """
+    clips = [json.loads(line) for line in open(job_dir / "prepared.jsonl", encoding="utf-8") if line.strip()]
+    encoder = encoder or load_encoder()
+    if encoder is None:
+        return None
+
+    for clip in clips:
+        if "sha" not in clip:
+            # Manifests written before clips were hashed
+            with wave.open(str(job_dir / clip["audio"]), "rb") as f:
+                clip["sha"] = hashlib.sha256(f.readframes(f.getnframes())).hexdigest()
+
+    store = FeatureStore(encoder.version)
+    conn = connect()
+    keys = [{feature: feature_key(clip, feature) for feature in FEATURES} for clip in clips]
+    cached = store.cached(conn, [(f, k) for clip_keys in keys for f, k in clip_keys.items()])
+    todo = [
+        (clip, [(f, k) for f, k in clip_keys.items() if (f, k) not in cached])
+        for clip, clip_keys in zip(clips, keys)
+    ]
+    todo = [(clip, missing) for clip, missing in todo if missing]
+    state = {"total": len(clips), "cached": len(clips) - len(todo), "encoded": 0}
+    progress(dict(state))
+
+    last_report = time.monotonic()
+    seen = set(cached)
+    for clip, missing in todo:
+        if should_stop():
+            progress(dict(state))
+            return None
+        # Duplicate clips inside one dataset are encoded once; a corrected transcript only re-encodes its text
+        arrays = [(f, k, encoder.encode(f, job_dir / clip["audio"], clip["text"])) for f, k in missing if (f, k) not in seen]
+        if arrays:
+            store.append(conn, arrays)
+            seen.update((f, k) for f, k, _ in arrays)
+        state["encoded"] += 1
+        if time.monotonic() - last_report >= PROGRESS_INTERVAL:
+            progress(dict(state))
+            last_report = time.monotonic()
+
+    np.save(job_dir / "features.npy", store.locate(conn, keys, list(FEATURES)))
+    (job_dir / "features.json").write_text(
+        json.dumps({"encoder": encoder.version, "store": str(store.directory), "features": list(FEATURES)}),
+        encoding="utf-8",
+    )
+    progress(dict(state))
+    return state
+
@@ -1,18 +1,25 @@
 """
 History API Router - Generated audio history
+Persisted in SQLite (WAL) with keyset pagination and full-text search
 """
 
-import os
+import asyncio
+import sqlite3
 from pathlib import Path
 from typing import List, Optional
-from datetime import datetime
 from pydantic import BaseModel
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Request, Response
+
+from api.db import STORAGE_DIR, init_schema, run_db
+from api.output_index import forget as forget_outputs
+from api.transcode import audio_response, negotiate_format, remove_renditions
 
 router = APIRouter()
 
-AUDIO_DIR = Path(__file__).parent.parent / "storage" / "audio"
+# Legacy location of history audio; new entries point at Output/
+AUDIO_DIR = STORAGE_DIR / "audio"
+
+MAX_PAGE_SIZE = 200
 
 
 class HistoryItem(BaseModel):
@@ -24,79 +31,218 @@ class HistoryItem(BaseModel):
     audio_url: str
 
 
-# In-memory history (in production, use SQLite)
-_history: List[HistoryItem] = []
+init_schema([
+    """
+    CREATE TABLE IF NOT EXISTS history (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        id TEXT NOT NULL UNIQUE,
+        text TEXT NOT NULL,
+        voice TEXT NOT NULL,
+        duration REAL NOT NULL,
+        created_at TEXT NOT NULL,
+        audio_url TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_history_created ON history (created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_history_voice ON history (voice, seq)",
+])
+
+# Full-text search over the synthesized text; diacritics are folded so "xin chao" finds "xin chào"
+try:
+    init_schema([
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+            text, content='history', content_rowid='seq', tokenize='unicode61 remove_diacritics 2'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS history_fts_insert AFTER INSERT ON history BEGIN
+            INSERT INTO history_fts (rowid, text) VALUES (new.seq, new.text);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS history_fts_delete AFTER DELETE ON history BEGIN
+            INSERT INTO history_fts (history_fts, rowid, text) VALUES ('delete', old.seq, old.text);
+        END
+        """,
+    ])
+    _fts_enabled = True
+except sqlite3.OperationalError as e:
+    print(f"[VieNeu] SQLite FTS5 not available, history search falls back to LIKE: {e}")
+    _fts_enabled = False
+
+
+def _item(row: sqlite3.Row) -> HistoryItem:
+    return HistoryItem(
+        id=row["id"],
+        text=row["text"],
+        voice=row["voice"],
+        duration=row["duration"],
+        created_at=row["created_at"],
+        audio_url=row["audio_url"],
+    )
 
 
-def add_to_history(item: HistoryItem):
-    """Add item to history (called from TTS router)"""
-    _history.insert(0, item)
-    # Keep only last 100 items
-    if len(_history) > 100:
-        _history.pop()
+def _insert(conn: sqlite3.Connection, item: HistoryItem):
+    # Cached audio keeps its id across requests; re-adding it moves it to the top
+    conn.execute("DELETE FROM history WHERE id = ?", (item.id,))
+    conn.execute(
+        "INSERT INTO history (id, text, voice, duration, created_at, audio_url) VALUES (?, ?, ?, ?, ?, ?)",
+        (item.id, item.text, item.voice, item.duration, item.created_at, item.audio_url),
+    )
+
+
+async def add_to_history(item: HistoryItem):
+    """Add item to history (called from TTS routes after each synthesis)"""
+    try:
+        await run_db(_insert, item)
+    except sqlite3.Error as e:
+        # History is best effort; never fail a synthesis because of it
+        print(f"[VieNeu] Could not record history: {e}")
+
+
+def _fts_query(q: str) -> str:
+    # Quote every term so user input cannot inject FTS syntax; terms are ANDed
+    return " ".join('"' + term.replace('"', '""') + '"' for term in q.split())
+
+
+def _select_page(conn, limit: int, cursor: Optional[int], offset: int, voice: Optional[str], q: Optional[str]):
+    clauses, params = [], []
+    if cursor is not None:
+        clauses.append("h.seq < ?")
+        params.append(cursor)
+    if voice:
+        clauses.append("h.voice = ?")
+        params.append(voice)
+
+    source = "history h"
+    if q and q.strip():
+        if _fts_enabled:
+            source = "history_fts f JOIN history h ON h.seq = f.rowid"
+            clauses.append("history_fts MATCH ?")
+            params.append(_fts_query(q))
+        else:
+            clauses.append("h.text LIKE ?")
+            params.append(f"%{q.strip()}%")
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    sql = f"SELECT h.* FROM {source} {where} ORDER BY h.seq DESC LIMIT ?"
+    params.append(limit)
+    if offset and cursor is None:
+        sql += " OFFSET ?"
+        params.append(offset)
+    return conn.execute(sql, params).fetchall()
 
 
 @router.get("/", response_model=List[HistoryItem])
-async def get_history(limit: int = 50, offset: int = 0):
-    """Get generation history"""
-    return _history[offset : offset + limit]
+async def get_history(
+    response: Response,
+    limit: int = 50,
+    cursor: Optional[int] = None,
+    offset: int = 0,
+    voice: Optional[str] = None,
+    q: Optional[str] = None,
+):
+    """
+    Get generation history, newest first.
+
+    Pass the `X-Next-Cursor` response header back as `cursor` to fetch the
+    next page (constant cost at any depth). `offset` is kept for older clients.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    rows = await run_db(_select_page, limit, cursor, offset, voice, q)
+    if len(rows) == limit:
+        response.headers["X-Next-Cursor"] = str(rows[-1]["seq"])
+    return [_item(row) for row in rows]
+
+
+def _get(conn, item_id: str):
+    return conn.execute("SELECT * FROM history WHERE id = ?", (item_id,)).fetchone()
 
 
 @router.get("/{item_id}")
 async def get_history_item(item_id: str):
     """Get a specific history item"""
-    item = next((h for h in _history if h.id == item_id), None)
-    if not item:
+    row = await run_db(_get, item_id)
+    if not row:
         raise HTTPException(status_code=404, detail="Item not found")
-    return item
+    return _item(row)
+
+
+def _audio_path(item_id: str) -> Optional[Path]:
+    from api.tts import resolve_audio_path
+    path = resolve_audio_path(item_id)
+    if path is None:
+        legacy = AUDIO_DIR / f"{item_id}.wav"
+        path = legacy if legacy.exists() else None
+    return path
+
+
+@router.api_route("/{item_id}/audio", methods=["GET", "HEAD"])
+async def download_history_audio(
+    item_id: str,
+    request: Request,
+    format: Optional[str] = None,
+    bitrate: Optional[int] = None,
+    sample_rate: Optional[int] = None,
+):
+    """Download audio from history (same format options as /api/tts/audio)"""
+
+    audio_path = _audio_path(item_id)
+    if audio_path is None:
+        raise HTTPException(status_code=404, detail="Audio file not found")
 
+    fmt = negotiate_format(format, request.headers.get("accept"))
+    return await audio_response(request, audio_path, f"vieneu_{item_id}", fmt, bitrate, sample_rate, negotiated=format is None)
+
+
+def _delete(conn, item_id: str) -> bool:
+    return conn.execute("DELETE FROM history WHERE id = ?", (item_id,)).rowcount > 0
 
-@router.get("/{item_id}/audio")
-async def download_history_audio(item_id: str):
-    """Download audio from history"""
-    
-    audio_path = AUDIO_DIR / f"{item_id}.wav"
-    if not audio_path.exists():
-        raise HTTPException(status_code=404, detail="Audio file not found")
-    
-    return FileResponse(
-        audio_path,
-        media_type="audio/wav",
-        filename=f"vieneu_{item_id}.wav",
-    )
+
+def _unlink_audio(item_ids: List[str]) -> List[str]:
+    """Delete the audio files behind history items; returns the removed filenames"""
+    removed = []
+    for item_id in item_ids:
+        path = _audio_path(item_id)
+        if path is None:
+            continue
+        # Shared cache entries are managed by the synthesis cache, not by history
+        if path.name.startswith("VieNeuStudio-") or path.parent == AUDIO_DIR:
+            path.unlink(missing_ok=True)
+            remove_renditions(path)
+            removed.append(path.name)
+    return removed
 
 
 @router.delete("/{item_id}")
 async def delete_history_item(item_id: str):
     """Delete a history item"""
-    global _history
-    
-    item = next((h for h in _history if h.id == item_id), None)
-    if not item:
+
+    if not await run_db(_delete, item_id):
         raise HTTPException(status_code=404, detail="Item not found")
-    
+
     # Delete audio file
-    audio_path = AUDIO_DIR / f"{item_id}.wav"
-    if audio_path.exists():
-        audio_path.unlink()
-    
-    # Remove from history
-    _history = [h for h in _history if h.id != item_id]
-    
+    removed = await asyncio.to_thread(_unlink_audio, [item_id])
+    if removed:
+        await run_db(forget_outputs, removed)
+
     return {"status": "deleted"}
 
 
+def _clear(conn, batch_size: int = 1000):
+    """Delete everything in batches so huge histories never hold one giant transaction"""
+    while True:
+        rows = conn.execute("SELECT seq, id FROM history ORDER BY seq LIMIT ?", (batch_size,)).fetchall()
+        if not rows:
+            return
+        forget_outputs(conn, _unlink_audio([row["id"] for row in rows]))
+        conn.execute("DELETE FROM history WHERE seq <= ?", (rows[-1]["seq"],))
+        conn.commit()
+
+
 @router.delete("/")
 async def clear_history():
     """Clear all history"""
-    global _history
-    
-    # Delete all audio files
-    for item in _history:
-        audio_path = AUDIO_DIR / f"{item.id}.wav"
-        if audio_path.exists():
-            audio_path.unlink()
-    
-    _history = []
-    
+    await run_db(_clear)
     return {"status": "cleared"}
@@ -0,0 +1,112 @@
+"""
+HTTP Caching - Content ETags and conditional GET for served audio files
+Byte ranges (206, multi-range) and If-Range are handled by Starlette's FileResponse
+"""
+
+import os
+import asyncio
+import hashlib
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+HASH_CHUNK_BYTES = 1024 * 1024
+ETAG_MEMO_ENTRIES = 4096
+
+_etags: "OrderedDict[tuple, str]" = OrderedDict()
+_etags_lock = threading.Lock()
+
+
+def _file_identity(st: os.stat_result) -> tuple:
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def _hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest()[:32]
+
+
+def content_etag(path: Path, st: os.stat_result) -> str:
+    """Strong ETag from the file content, hashed once per file version (blocking)"""
+    identity = _file_identity(st)
+    with _etags_lock:
+        etag = _etags.get(identity)
+        if etag is not None:
+            _etags.move_to_end(identity)
+            return etag
+
+    etag = f'"{_hash_file(path)}"'
+    with _etags_lock:
+        _etags[identity] = etag
+        while len(_etags) > ETAG_MEMO_ENTRIES:
+            _etags.popitem(last=False)
+    return etag
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return etag in candidates
+
+
+def not_modified(request: Request, etag: str, mtime: float) -> bool:
+    """Evaluate If-None-Match, or If-Modified-Since when no ETag was sent"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(mtime) <= since
+    return False
+
+
+async def cached_file_response(
+    request: Request,
+    path: Path,
+    media_type: str,
+    filename: str,
+    immutable: bool = False,
+    headers: Optional[dict] = None,
+) -> Response:
+    """
+    FileResponse with a content ETag and Cache-Control, or a bodyless 304
+    when the client's copy is current. Ranges are served by FileResponse,
+    which also hands whole files to the server via pathsend where supported.
+    """
+    st = await asyncio.to_thread(os.stat, path)
+    etag = await asyncio.to_thread(content_etag, path, st)
+    cache_headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+        **(headers or {}),
+    }
+
+    if request.method in ("GET", "HEAD") and not_modified(request, etag, st.st_mtime):
+        return Response(status_code=304, headers=cache_headers)
+
+    return FileResponse(
+        path,
+        media_type=media_type,
+        filename=filename,
+        stat_result=st,
+        headers=cache_headers,
+    )
@@ -0,0 +1,238 @@
+"""
+Inference Pool - Runs blocking TTS engine calls off the event loop
+Bounded admission queue, per-request deadlines and client-disconnect cancellation
+"""
+
+import os
+import time
+import asyncio
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from fastapi import HTTPException, Request
+
+from api.metrics import STAGE_SECONDS
+
+INFERENCE_WORKERS = int(os.getenv("VIENEU_INFERENCE_WORKERS", "1"))
+INFERENCE_QUEUE_SIZE = int(os.getenv("VIENEU_INFERENCE_QUEUE_SIZE", "8"))
+INFERENCE_TIMEOUT = float(os.getenv("VIENEU_INFERENCE_TIMEOUT", "120"))
+
+# How often a waiting request checks whether its client went away
+DISCONNECT_POLL_INTERVAL = 0.25
+
+
+class PoolSaturated(Exception):
+    """Admission queue is full"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Inference queue full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    """Job did not finish before its deadline"""
+
+
+class ClientDisconnected(Exception):
+    """Client went away while the job was waiting or running"""
+
+
+class EngineUnreachable(Exception):
+    """No inference server accepted the job"""
+
+
+class _Abandoned(Exception):
+    """Raised on the worker when a queued job is no longer wanted"""
+
+
+class InferencePool:
+    """
+    Owns the TTS engine and a fixed set of worker threads.
+
+    At most `workers + queue_size` jobs are admitted at once; anything beyond
+    that is rejected immediately so callers can answer 429 instead of piling
+    up behind a busy model. Jobs receive the engine as their first argument.
+    """
+
+    def __init__(
+        self,
+        engine_factory: Callable[[], Any],
+        workers: int = INFERENCE_WORKERS,
+        queue_size: int = INFERENCE_QUEUE_SIZE,
+        timeout: float = INFERENCE_TIMEOUT,
+    ):
+        self.engine_factory = engine_factory
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix="vieneu-infer",
+        )
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._running = 0
+        # Moving average of job wall time, used to estimate Retry-After
+        self._avg_seconds = 1.0
+        self._stats = {
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "timed_out": 0,
+            "cancelled": 0,
+        }
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.queue_size
+
+    def retry_after(self) -> int:
+        """Estimated seconds until a slot frees up"""
+        with self._lock:
+            backlog = max(1, self._admitted - self.workers + 1)
+            estimate = self._avg_seconds * backlog / self.workers
+        return max(1, int(estimate + 0.999))
+
+    def _execute(self, fn: Callable, args: tuple, kwargs: dict, abandoned: threading.Event, deadline: float, submitted: float, affinity: Optional[int]):
+        """Runs on a worker thread"""
+        STAGE_SECONDS.observe(time.monotonic() - submitted, "queue_wait")
+        # Skip jobs whose caller already gave up while they sat in the queue
+        if abandoned.is_set() or time.monotonic() > deadline:
+            raise _Abandoned()
+
+        with self._lock:
+            self._running += 1
+        started = time.monotonic()
+        try:
+            return self._call(fn, args, kwargs, affinity)
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self._running -= 1
+                self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * elapsed
+
+    def _call(self, fn: Callable, args: tuple, kwargs: dict, affinity: Optional[int] = None):
+        return fn(self.engine_factory(), *args, **kwargs)
+
+    def _release(self, future):
+        with self._lock:
+            self._admitted -= 1
+            if future.cancelled() or isinstance(future.exception(), _Abandoned):
+                self._stats["cancelled"] += 1
+            elif future.exception() is not None:
+                self._stats["failed"] += 1
+            else:
+                self._stats["completed"] += 1
+
+    async def submit(
+        self,
+        fn: Callable,
+        *args,
+        timeout: Optional[float] = None,
+        request: Optional[Request] = None,
+        affinity: Optional[int] = None,
+        **kwargs,
+    ):
+        """
+        Run fn(engine, *args, **kwargs) on a worker thread and await the result.
+        Jobs with the same `affinity` go to the same engine when there are several.
+        """
+        with self._lock:
+            if self._admitted >= self.capacity:
+                self._stats["rejected"] += 1
+                rejected = True
+            else:
+                self._admitted += 1
+                rejected = False
+        if rejected:
+            raise PoolSaturated(self.retry_after())
+
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        abandoned = threading.Event()
+
+        try:
+            job = self._executor.submit(self._execute, fn, args, kwargs, abandoned, deadline, time.monotonic(), affinity)
+        except BaseException:
+            with self._lock:
+                self._admitted -= 1
+            raise
+        job.add_done_callback(self._release)
+        result = asyncio.wrap_future(job)
+
+        watcher = None
+        if request is not None:
+            watcher = asyncio.ensure_future(wait_for_disconnect(request))
+
+        try:
+            waiting = {result} if watcher is None else {result, watcher}
+            done, _ = await asyncio.wait(
+                waiting,
+                timeout=timeout,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if result in done:
+                return result.result()
+
+            abandoned.set()
+            job.cancel()
+            if watcher is not None and watcher in done:
+                raise ClientDisconnected()
+            with self._lock:
+                self._stats["timed_out"] += 1
+            raise DeadlineExceeded()
+        except asyncio.CancelledError:
+            abandoned.set()
+            job.cancel()
+            raise
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "admitted": self._admitted,
+                "running": self._running,
+                "queued": max(0, self._admitted - self._running),
+                "avg_job_seconds": round(self._avg_seconds, 3),
+                **self._stats,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def wait_for_disconnect(request: Request):
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+
+
+@contextmanager
+def inference_http_errors():
+    """Translate pool errors into HTTP responses"""
+    try:
+        yield
+    except PoolSaturated as e:
+        raise HTTPException(
+            status_code=429,
+            detail="TTS engine is busy, please retry later",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    except DeadlineExceeded:
+        raise HTTPException(status_code=504, detail="TTS generation timed out")
+    except EngineUnreachable:
+        raise HTTPException(status_code=503, detail="No inference server is reachable")
+    except ClientDisconnected:
+        # Nobody is listening any more; the status code only shows up in logs
+        raise HTTPException(status_code=499, detail="Client disconnected")
+
+
+async def run_inference(pool: InferencePool, fn: Callable, *args, request: Optional[Request] = None, **kwargs):
+    """Submit a job, answering 429/504/499 when the pool gives up on it"""
+    with inference_http_errors():
+        return await pool.submit(fn, *args, request=request, **kwargs)
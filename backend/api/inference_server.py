@@ -0,0 +1,305 @@
+"""
+Inference Server - Holds the TTS engine in its own process, shared by all API workers
+API workers forward engine jobs over a Unix socket when VIENEU_INFERENCE_SOCKETS is set
+"""
+
+import os
+import gc
+import sys
+import time
+import signal
+import argparse
+import importlib
+import itertools
+import threading
+from pathlib import Path
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Callable, Dict, List, Optional
+
+from api.db import STORAGE_DIR
+from api.inference import EngineUnreachable, InferencePool
+
+RUN_DIR = STORAGE_DIR / "run"
+DEFAULT_SOCKET = RUN_DIR / "inference-{i}.sock"
+AUTHKEY_PATH = RUN_DIR / "inference.key"
+
+# Comma-separated socket paths; when set, API workers do not load the model themselves
+INFERENCE_SOCKETS = [s.strip() for s in os.getenv("VIENEU_INFERENCE_SOCKETS", "").split(",") if s.strip()]
+
+# Only job functions from the backend's own modules may be called remotely
+ALLOWED_MODULE_PREFIX = "api."
+
+# Pause before re-forking an inference process that exited (--processes mode)
+RESPAWN_DELAY = 1.0
+
+
+def _authkey() -> bytes:
+    """Shared secret for the socket handshake, created on first use and readable only by this user"""
+    env = os.getenv("VIENEU_INFERENCE_AUTHKEY")
+    if env:
+        return env.encode("utf-8")
+    RUN_DIR.mkdir(parents=True, exist_ok=True)
+    try:
+        fd = os.open(AUTHKEY_PATH, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        return AUTHKEY_PATH.read_bytes()
+    with os.fdopen(fd, "wb") as f:
+        f.write(os.urandom(32).hex().encode("ascii"))
+    return AUTHKEY_PATH.read_bytes()
+
+
+def _resolve(module: str, name: str) -> Callable:
+    if not module.startswith(ALLOWED_MODULE_PREFIX):
+        raise PermissionError(f"{module}.{name} may not be called remotely")
+    return getattr(importlib.import_module(module), name)
+
+
+class RemoteInferencePool(InferencePool):
+    """
+    InferencePool whose worker threads forward jobs to inference servers.
+
+    Admission control, deadlines and disconnect handling stay in the API
+    worker. A job is sent as (module, function name, args) and run by the
+    server as fn(engine, *args), so arguments and results must pickle.
+    Each worker thread keeps one connection per server; jobs are spread
+    round-robin and skip servers that refuse the connection.
+    """
+
+    def __init__(self, sockets: List[str], **kwargs):
+        super().__init__(lambda: None, **kwargs)
+        self.sockets = list(sockets)
+        # Last status reply of each server (None = unreachable), refreshed by tts.watch_inference_servers
+        self.servers: list = []
+        self._local = threading.local()
+        self._next = itertools.count()
+        self._authkey = _authkey()
+
+    def _connection(self, address: str) -> Connection:
+        connections: Dict[str, Connection] = self._local.__dict__.setdefault("connections", {})
+        conn = connections.get(address)
+        if conn is None:
+            conn = connections[address] = Client(address, family="AF_UNIX", authkey=self._authkey)
+        return conn
+
+    def _drop(self, address: str):
+        conn = self._local.__dict__.get("connections", {}).pop(address, None)
+        if conn is not None:
+            conn.close()
+
+    def request(self, address: str, message: tuple):
+        """Send one message to one server and wait for its reply (blocking)"""
+        conn = self._connection(address)
+        try:
+            conn.send(message)
+            status, value = conn.recv()
+        except (EOFError, OSError) as e:
+            self._drop(address)
+            raise EngineUnreachable(f"Inference server {address} went away: {e}")
+        if status == "error":
+            raise value
+        return value
+
+    def _call(self, fn: Callable, args: tuple, kwargs: dict, affinity: Optional[int] = None):
+        message = ("call", fn.__module__, fn.__name__, args, kwargs)
+        # Sessions stick to one server (falling over to the next), other jobs are spread round-robin
+        start = next(self._next) if affinity is None else affinity
+        for i in range(len(self.sockets)):
+            address = self.sockets[(start + i) % len(self.sockets)]
+            try:
+                self._connection(address)
+            except (OSError, EOFError):
+                # Not listening
+                continue
+            try:
+                return self.request(address, message)
+            except EngineUnreachable:
+                # Died mid-job; jobs write to fixed paths, so rerunning one is safe.
+                # Errors raised by the job itself (even OSError) are re-raised as they are.
+                continue
+        raise EngineUnreachable("No inference server is reachable")
+
+    def broadcast(self, message: tuple) -> list:
+        """Send a message to every server; unreachable ones answer None (blocking)"""
+        replies = []
+        for address in self.sockets:
+            try:
+                replies.append(self.request(address, message))
+            except (EngineUnreachable, OSError, EOFError):
+                self._drop(address)
+                replies.append(None)
+        return replies
+
+    def stats(self) -> dict:
+        return {**super().stats(), "servers": self.servers}
+
+
+class InferenceServer:
+    """Accepts API worker connections and runs their jobs on one engine, `workers` at a time"""
+
+    def __init__(self, address: str, workers: int, cpu_group: int = 0):
+        self.address = address
+        self.cpu_group = cpu_group
+        self.slots = threading.BoundedSemaphore(max(1, workers))
+        self.workers = max(1, workers)
+        self._running = 0
+        self._completed = 0
+        self._lock = threading.Lock()
+
+    def status(self) -> dict:
+        from api.tts import engine_status, memory_usage
+
+        with self._lock:
+            running, completed = self._running, self._completed
+        return {
+            "address": self.address,
+            "pid": os.getpid(),
+            "engine": dict(engine_status),
+            "memory": memory_usage(),
+            "workers": self.workers,
+            "running": running,
+            "completed": completed,
+        }
+
+    def _run(self, module: str, name: str, args: tuple, kwargs: dict):
+        from api.tts import get_tts_engine
+
+        fn = _resolve(module, name)
+        with self.slots:
+            with self._lock:
+                self._running += 1
+            try:
+                return fn(get_tts_engine(), *args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._completed += 1
+
+    def _serve_connection(self, conn: Connection):
+        with conn:
+            while True:
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    if message[0] == "status":
+                        reply = ("ok", self.status())
+                    else:
+                        reply = ("ok", self._run(*message[1:]))
+                except Exception as e:
+                    reply = ("error", e)
+                try:
+                    conn.send(reply)
+                except (EOFError, OSError):
+                    return
+                except Exception as e:
+                    # The exception itself could not be pickled
+                    conn.send(("error", RuntimeError(f"{type(reply[1]).__name__}: {reply[1]}; {e}")))
+
+    def serve_forever(self):
+        from api.tts import engine_status, load_and_warm
+        from api.engine_backends import configure_cpu
+
+        # Before the engine loads; a prefork child re-pins the engine it inherited
+        engine_status["cpu"] = configure_cpu(self.cpu_group)
+        path = Path(self.address)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.unlink(missing_ok=True)
+        listener = Listener(self.address, family="AF_UNIX", authkey=_authkey())
+        os.chmod(self.address, 0o600)
+        print(f"[VieNeu] Inference server listening on {self.address} ({self.workers} worker(s))")
+
+        # Load and warm right away; API workers report not-ready until this finishes
+        threading.Thread(target=load_and_warm, name="vieneu-warmup", daemon=True).start()
+
+        while True:
+            try:
+                conn = listener.accept()
+            except (OSError, EOFError) as e:
+                # Failed handshake (wrong key) or a client that hung up mid-connect
+                print(f"[VieNeu] Rejected inference connection: {e}")
+                continue
+            threading.Thread(target=self._serve_connection, args=(conn,), name="vieneu-infer-conn", daemon=True).start()
+
+
+def prefork(socket_template: str, processes: int, workers: int):
+    """
+    Load the engine once, then fork `processes` servers from it.
+
+    Children share the parent's weights copy-on-write; only activations,
+    warm-up buffers and LoRA adapters (loaded after the fork) are private.
+    A child that dies is re-forked from the loaded parent in well under a
+    second instead of paying for a model load.
+    """
+    from api.tts import get_tts_engine, engine_status
+
+    if not hasattr(os, "fork"):
+        raise SystemExit("--processes needs a platform with fork()")
+    started = time.monotonic()
+    if get_tts_engine() is None:
+        raise SystemExit(f"[VieNeu] Engine failed to load: {engine_status['error']}")
+    print(f"[VieNeu] Engine loaded once for {processes} inference processes ({time.monotonic() - started:.1f}s)")
+    # Objects that exist now are never collected, so the collector does not touch (and unshare) their pages
+    gc.freeze()
+
+    children: Dict[int, int] = {}
+
+    def spawn(index: int):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                InferenceServer(socket_template.format(i=index), workers, cpu_group=index).serve_forever()
+            finally:
+                os._exit(1)
+        children[pid] = index
+
+    def stop(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for index in range(processes):
+        spawn(index)
+
+    while True:
+        pid, status = os.wait()
+        index = children.pop(pid, None)
+        if index is None:
+            continue
+        print(f"[VieNeu] Inference process {index} exited with status {status}; forking a replacement")
+        # Avoid a tight loop when children die immediately (e.g. a bad socket path)
+        time.sleep(RESPAWN_DELAY)
+        spawn(index)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the TTS engine as a shared inference server")
+    parser.add_argument("--socket", default=str(DEFAULT_SOCKET), help="Unix socket path to listen on; {i} is replaced by the process index (or --cpu-group)")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("VIENEU_INFERENCE_WORKERS", "1")), help="Jobs run on the engine at once, per process")
+    parser.add_argument("--processes", type=int, default=1, help="Server processes forked from one loaded engine, sharing its weights")
+    parser.add_argument("--cpu-group", type=int, default=0, help="VIENEU_CPU_AFFINITY core group to pin to (--processes pins process i to group i)")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(Path(__file__).parent.parent.parent.parent / "VieNeu-TTS"))
+    from dotenv import load_dotenv
+    load_dotenv()
+    # This process is the server; it must load the engine rather than forward to itself
+    os.environ.pop("VIENEU_INFERENCE_SOCKETS", None)
+
+    if args.processes > 1:
+        if "{i}" not in args.socket:
+            raise SystemExit("--socket must contain {i} when --processes is more than 1")
+        prefork(args.socket, args.processes, args.workers)
+    else:
+        InferenceServer(args.socket.format(i=args.cpu_group), args.workers, cpu_group=args.cpu_group).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
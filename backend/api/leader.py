@@ -0,0 +1,68 @@
+"""
+Leader Election - Picks the one API worker that runs background work
+An exclusive lock next to the database; the OS releases it when the holding process exits
+"""
+
+import os
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+from api.db import DB_PATH
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+LOCK_PATH = DB_PATH.with_name(DB_PATH.name + ".leader")
+
+# How often followers try to take over from a leader that went away
+RETRY_SECONDS = 5.0
+
+
+class Leadership:
+    """
+    With several API workers (`uvicorn --workers N`) sharing one database,
+    queue runners and scanners must run exactly once. The first worker to
+    lock LOCK_PATH runs them; the others retry so one of them takes over if
+    the leader exits.
+    """
+
+    def __init__(self, path=LOCK_PATH):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    async def wait(self, on_elected: Callable[[], Awaitable[None]]):
+        """Retry until this worker becomes leader, then run on_elected"""
+        while not self.try_acquire():
+            await asyncio.sleep(RETRY_SECONDS)
+        print(f"[VieNeu] Worker {os.getpid()} took over background work")
+        await on_elected()
+
+    def release(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+leadership = Leadership()
@@ -0,0 +1,176 @@
+"""
+Log Broker - Bounded in-memory pub/sub for training logs and metrics
+Subscribers sleep until something is published and can resume from any retained event id
+"""
+
+import os
+import json
+import asyncio
+from itertools import islice
+from collections import deque
+from pathlib import Path
+from datetime import datetime
+from typing import AsyncIterator, List, Optional
+
+from pydantic import BaseModel
+
+LOG_BUFFER_EVENTS = int(os.getenv("VIENEU_TRAINING_LOG_EVENTS", "10000"))
+
+# Sent to idle SSE connections so proxies do not drop them
+KEEPALIVE_SECONDS = 15.0
+
+
+class LogEvent(BaseModel):
+    id: int
+    type: str  # "log", "metric" or "end"
+    time: str
+    message: Optional[str] = None
+    data: Optional[dict] = None
+
+    def sse(self) -> str:
+        """Server-sent event frame; plain log lines stay unnamed for EventSource.onmessage"""
+        if self.type == "log":
+            # One data line per message line (tracebacks); EventSource joins them back with "\n"
+            data = "".join(f"data: {line}\n" for line in (self.message or "").splitlines() or [""])
+            return f"id: {self.id}\n{data}\n"
+        if self.type == "end":
+            return f"id: {self.id}\ndata: [END]\n\n"
+        return f"id: {self.id}\nevent: {self.type}\ndata: {json.dumps(self.data)}\n\n"
+
+
+class LogBroker:
+    """
+    Ring buffer of the latest events plus a wake-up future that is resolved
+    and replaced on every publish. Ids increase for the life of the process,
+    so a `Last-Event-ID` stays meaningful across jobs. Publish from the event loop.
+    """
+
+    def __init__(self, capacity: int = LOG_BUFFER_EVENTS):
+        self._events: "deque[LogEvent]" = deque(maxlen=capacity)
+        self._next_id = 0
+        self._closed = False
+        self._wakeup: Optional[asyncio.Future] = None
+        self._subscribers = 0
+        self._journal = None
+        self.last_metric: Optional[dict] = None
+
+    def _publish(self, event_type: str, message: Optional[str] = None, data: Optional[dict] = None) -> LogEvent:
+        event = LogEvent(
+            id=self._next_id,
+            type=event_type,
+            time=datetime.now().isoformat(timespec="seconds"),
+            message=message,
+            data=data,
+        )
+        self._append(event)
+        if self._journal is not None:
+            self._journal.write(event.model_dump_json() + "\n")
+            self._journal.flush()
+        return event
+
+    def _append(self, event: LogEvent):
+        self._next_id = event.id + 1
+        self._events.append(event)
+        if event.type == "metric":
+            self.last_metric = event.data
+        if self._wakeup is not None and not self._wakeup.done():
+            self._wakeup.set_result(None)
+        self._wakeup = None
+
+    def reset(self, journal: Optional[Path] = None):
+        """
+        Start a new run: forget retained events but keep ids increasing.
+        Events are also appended to `journal`, for other API workers to replay.
+        """
+        self._events.clear()
+        self._closed = False
+        self.last_metric = None
+        self._close_journal()
+        if journal is not None:
+            self._journal = open(journal, "w", encoding="utf-8")
+
+    def replay(self, event: LogEvent):
+        """Publish an event read from another process's journal, keeping its id"""
+        self._append(event)
+        if event.type == "end":
+            self._closed = True
+
+    def _close_journal(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def log(self, message: str) -> LogEvent:
+        return self._publish("log", message=f"[{datetime.now().strftime('%H:%M:%S')}] {message}")
+
+    def metric(self, **values) -> LogEvent:
+        """Structured progress, e.g. step, loss, lr, throughput"""
+        return self._publish("metric", data=values)
+
+    def close(self):
+        """Mark the run finished; subscribers drain and end"""
+        if not self._closed:
+            self._closed = True
+            self._publish("end")
+        self._close_journal()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def next_id(self) -> int:
+        return self._next_id
+
+    @property
+    def first_id(self) -> int:
+        return self._events[0].id if self._events else self._next_id
+
+    def since(self, event_id: int, event_type: Optional[str] = None) -> List[LogEvent]:
+        """Retained events with id >= event_id"""
+        start = max(0, event_id - self.first_id)
+        events = list(islice(self._events, start, None))
+        if event_type is not None:
+            events = [e for e in events if e.type == event_type]
+        return events
+
+    async def _wait(self, timeout: float) -> bool:
+        if self._wakeup is None:
+            self._wakeup = asyncio.get_running_loop().create_future()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._wakeup), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def subscribe(self, last_event_id: Optional[int] = None) -> AsyncIterator[Optional[LogEvent]]:
+        """
+        Yield events after `last_event_id` (everything retained when None),
+        then new ones as they arrive; None is yielded after each idle keep-alive period.
+        """
+        cursor = 0 if last_event_id is None else last_event_id + 1
+        self._subscribers += 1
+        try:
+            while True:
+                events = self.since(cursor)
+                for event in events:
+                    yield event
+                    if event.type == "end":
+                        return
+                if events:
+                    cursor = events[-1].id + 1
+                elif self._closed:
+                    return
+                elif not await self._wait(KEEPALIVE_SECONDS):
+                    yield None
+        finally:
+            self._subscribers -= 1
+
+    def stats(self) -> dict:
+        return {
+            "retained": len(self._events),
+            "capacity": self._events.maxlen,
+            "first_id": self.first_id,
+            "next_id": self._next_id,
+            "subscribers": self._subscribers,
+        }
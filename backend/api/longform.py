@@ -0,0 +1,401 @@
+"""
+Long-form API Router - Document synthesis (audiobooks, articles)
+Segments long text, renders segments in parallel and stitches one output file
+"""
+
+import re
+import json
+import asyncio
+import hashlib
+import threading
+from enum import Enum
+from pathlib import Path
+from typing import Dict, List, Optional
+from datetime import datetime
+
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+from pydantic import BaseModel
+
+from api.inference import PoolSaturated
+from api.audio import read_wav, trim_silence, stitch, to_pcm16, write_wav
+from api.segmenter import split_paragraphs, split_sentences, split_clauses
+from api.tts import OUTPUT_DIR, inference_pool, output_index, synthesize_to_file, generate_filename
+from api.models import resolve_adapter_async
+from api.engine_backends import backend_fingerprint
+from api.text_frontend import text_frontend
+from api.synthesis_cache import MODEL_VERSION
+from api.history import HistoryItem, add_to_history
+
+router = APIRouter()
+
+LONGFORM_DIR = OUTPUT_DIR / "longform"
+LONGFORM_DIR.mkdir(parents=True, exist_ok=True)
+
+MAX_UPLOAD_BYTES = 5 * 1024 * 1024
+
+# Normalized silence inserted after each segment (seconds)
+CLAUSE_PAUSE = 0.12
+SENTENCE_PAUSE = 0.3
+PARAGRAPH_PAUSE = 0.7
+
+
+class DocumentStatus(str, Enum):
+    QUEUED = "queued"
+    RENDERING = "rendering"
+    STITCHING = "stitching"
+    COMPLETED = "completed"
+    ERROR = "error"
+
+
+class SegmentStatus(str, Enum):
+    PENDING = "pending"
+    RENDERING = "rendering"
+    DONE = "done"
+    ERROR = "error"
+
+
+class LongformRequest(BaseModel):
+    text: str
+    voice_id: str = "ngoc-huyen"
+
+
+class LongformSegment(BaseModel):
+    index: int
+    text: str
+    pause: float
+    status: SegmentStatus = SegmentStatus.PENDING
+    error: Optional[str] = None
+
+
+class LongformDocument(BaseModel):
+    id: str
+    voice_id: str
+    engine: Optional[str] = None  # engine_fingerprint the segments were rendered with
+    status: DocumentStatus
+    segments: List[LongformSegment]
+    created_at: str
+    completed_at: Optional[str] = None
+    audio_id: Optional[str] = None
+    audio_url: Optional[str] = None
+    duration: float = 0.0
+    error: Optional[str] = None
+
+
+# Documents being rendered by this process; finished ones are read back from their manifest
+_documents: Dict[str, LongformDocument] = {}
+_tasks: Dict[str, asyncio.Task] = {}
+_manifest_lock = threading.Lock()
+
+
+def strip_markdown(text: str) -> str:
+    """Reduce Markdown to plain readable text"""
+    text = re.sub(r"```.*?```", "", text, flags=re.S)
+    text = re.sub(r"!\[[^\]]*\]\([^)]*\)", "", text)
+    text = re.sub(r"\[([^\]]*)\]\([^)]*\)", r"\1", text)
+    text = re.sub(r"^\s{0,3}(#{1,6}|>|[-*+]|\d+\.)\s+", "", text, flags=re.M)
+    text = re.sub(r"[*_`~]+", "", text)
+    return text
+
+
+def segment_document(text: str) -> List[LongformSegment]:
+    """Split into synthesis segments, each carrying the pause that follows it"""
+    segments: List[LongformSegment] = []
+    for paragraph in split_paragraphs(text):
+        for sentence in split_sentences(paragraph):
+            clauses = split_clauses(sentence, first_max_chars=160)
+            for i, clause in enumerate(clauses):
+                pause = SENTENCE_PAUSE if i == len(clauses) - 1 else CLAUSE_PAUSE
+                segments.append(LongformSegment(index=len(segments), text=clause, pause=pause))
+        if segments:
+            segments[-1].pause = PARAGRAPH_PAUSE
+    return segments
+
+
+async def engine_fingerprint(voice_id: str) -> str:
+    """Everything besides the text that changes a segment's audio (the material of synthesis_cache.cache_key)"""
+    material = json.dumps(
+        {
+            "adapter": await resolve_adapter_async(voice_id),
+            "model": MODEL_VERSION,
+            "backend": backend_fingerprint(),
+            "frontend": text_frontend.fingerprint(),
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()[:16]
+
+
+def document_id(text: str, voice_id: str, engine: str) -> str:
+    """
+    Same text, voice and engine setup map to the same document, which makes
+    resume possible; a new adapter, backend or lexicon starts a new document
+    instead of stitching old segments to new ones.
+    """
+    return hashlib.sha256(f"{voice_id}\n{engine}\n{text}".encode("utf-8")).hexdigest()[:16]
+
+
+def _doc_dir(doc_id: str) -> Path:
+    return LONGFORM_DIR / doc_id
+
+
+def _find(doc_id: str) -> Optional[LongformDocument]:
+    if not re.fullmatch(r"[0-9a-f]{16}", doc_id):
+        return None
+    return _documents.get(doc_id) or _load_manifest(doc_id)
+
+
+def _segment_path(doc_id: str, index: int) -> Path:
+    return _doc_dir(doc_id) / f"seg_{index:05d}.wav"
+
+
+def _write_manifest(doc_id: str, data: str):
+    path = _doc_dir(doc_id) / "manifest.json"
+    with _manifest_lock:
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(data, encoding="utf-8")
+        tmp.replace(path)
+
+
+async def _save_manifest(doc: LongformDocument):
+    # Serialize on the loop so the snapshot is consistent, write on a thread
+    await asyncio.to_thread(_write_manifest, doc.id, doc.model_dump_json(indent=2))
+
+
+def _load_manifest(doc_id: str) -> Optional[LongformDocument]:
+    path = _doc_dir(doc_id) / "manifest.json"
+    if not path.exists():
+        return None
+    return LongformDocument(**json.loads(path.read_text(encoding="utf-8")))
+
+
+def render_segment(tts, text: str, voice_id: str, path: Path) -> bool:
+    """Render one segment atomically so a crash never leaves a half-written file (blocking)"""
+    tmp = path.with_suffix(".part.wav")
+    if not synthesize_to_file(tts, text, tmp, voice_id=voice_id):
+        return False
+    tmp.replace(path)
+    return True
+
+
+def stitch_document(doc: LongformDocument, output_path: Path) -> float:
+    """Join rendered segments into one WAV and return its duration (blocking)"""
+    waveforms, sample_rate = [], None
+    for segment in doc.segments:
+        audio, sample_rate = read_wav(_segment_path(doc.id, segment.index))
+        waveforms.append(trim_silence(audio, sample_rate))
+    audio = stitch(waveforms, [s.pause for s in doc.segments], sample_rate)
+    write_wav(output_path, [to_pcm16(audio)], sample_rate)
+    return len(audio) / sample_rate
+
+
+async def _render_one(doc: LongformDocument, segment: LongformSegment):
+    path = _segment_path(doc.id, segment.index)
+    segment.status = SegmentStatus.RENDERING
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + inference_pool.timeout
+    try:
+        while True:
+            try:
+                rendered = await inference_pool.submit(render_segment, segment.text, doc.voice_id, path)
+                break
+            except PoolSaturated as e:
+                # Interactive traffic has priority; wait for room instead of failing the document
+                if loop.time() >= deadline:
+                    raise
+                await asyncio.sleep(min(e.retry_after, 1.0))
+        if not rendered:
+            raise RuntimeError("VieNeu engine not available")
+        segment.status = SegmentStatus.DONE
+    except Exception as e:
+        segment.status = SegmentStatus.ERROR
+        segment.error = str(e) or type(e).__name__
+    await _save_manifest(doc)
+
+
+async def render_document(doc: LongformDocument):
+    """Render missing segments in parallel, then stitch the result"""
+    try:
+        await _save_manifest(doc)
+
+        # One in-flight segment per worker keeps the queue open for interactive requests
+        limit = asyncio.Semaphore(inference_pool.workers)
+
+        async def bounded(segment: LongformSegment):
+            async with limit:
+                await _render_one(doc, segment)
+
+        await asyncio.gather(*(
+            bounded(s) for s in doc.segments if s.status != SegmentStatus.DONE
+        ))
+
+        failed = [s.index for s in doc.segments if s.status == SegmentStatus.ERROR]
+        if failed:
+            raise RuntimeError(f"{len(failed)} segment(s) failed, first at #{failed[0]}")
+
+        doc.status = DocumentStatus.STITCHING
+        base_filename = doc.audio_id or generate_filename()
+        doc.duration = await asyncio.to_thread(stitch_document, doc, OUTPUT_DIR / f"{base_filename}.wav")
+        doc.audio_id = base_filename
+        doc.audio_url = f"/api/tts/audio/{base_filename}"
+        doc.status = DocumentStatus.COMPLETED
+        doc.completed_at = datetime.now().isoformat()
+        await add_to_history(HistoryItem(
+            id=base_filename,
+            text=" ".join(s.text for s in doc.segments),
+            voice=doc.voice_id,
+            duration=doc.duration,
+            created_at=doc.completed_at,
+            audio_url=doc.audio_url,
+        ))
+        await output_index.record(OUTPUT_DIR / f"{base_filename}.wav", doc.voice_id, " ".join(s.text for s in doc.segments))
+        print(f"[VieNeu] Long-form document {doc.id} rendered ({len(doc.segments)} segments)")
+
+    except Exception as e:
+        doc.status = DocumentStatus.ERROR
+        doc.error = str(e)
+        print(f"[VieNeu] Long-form document {doc.id} failed: {e}")
+
+    finally:
+        # Cancelled on shutdown: the manifest stays `rendering` and is resumed on the next start
+        await _save_manifest(doc)
+        _tasks.pop(doc.id, None)
+        _documents.pop(doc.id, None)
+
+
+def _start(doc: LongformDocument):
+    doc.status = DocumentStatus.RENDERING
+    doc.error = None
+    for segment in doc.segments:
+        # Resume: keep segments whose audio survived a previous run
+        if _segment_path(doc.id, segment.index).exists():
+            segment.status = SegmentStatus.DONE
+        else:
+            segment.status = SegmentStatus.PENDING
+            segment.error = None
+
+    _documents[doc.id] = doc
+    _tasks[doc.id] = asyncio.ensure_future(render_document(doc))
+
+
+async def resume_unfinished():
+    """Restart documents that were rendering when the server stopped (called from the app lifespan)"""
+    for path in LONGFORM_DIR.glob("*/manifest.json"):
+        try:
+            doc = _load_manifest(path.parent.name)
+        except (OSError, ValueError):
+            continue
+        if doc is None or doc.id in _tasks or doc.status in (DocumentStatus.COMPLETED, DocumentStatus.ERROR):
+            continue
+        if doc.engine != await engine_fingerprint(doc.voice_id):
+            doc.status = DocumentStatus.ERROR
+            doc.error = "Interrupted, and the voice's model, backend or lexicons changed since; submit the text again"
+            await _save_manifest(doc)
+            continue
+        print(f"[VieNeu] Resuming long-form document {doc.id}")
+        _start(doc)
+
+
+async def shutdown():
+    """Stop rendering without marking documents failed (called from the app lifespan)"""
+    tasks = list(_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _progress(doc: LongformDocument) -> dict:
+    done = sum(1 for s in doc.segments if s.status == SegmentStatus.DONE)
+    total = len(doc.segments)
+    return {
+        **doc.model_dump(),
+        "total_segments": total,
+        "completed_segments": done,
+        "progress": int(done / total * 100) if total else 100,
+    }
+
+
+async def _submit(text: str, voice_id: str) -> dict:
+    if not text.strip():
+        raise HTTPException(status_code=400, detail="Text cannot be empty")
+
+    engine = await engine_fingerprint(voice_id)
+    doc_id = document_id(text, voice_id, engine)
+    if doc_id in _tasks:
+        return _progress(_documents[doc_id])
+
+    doc = _find(doc_id)
+    if doc is not None and doc.status == DocumentStatus.COMPLETED:
+        if doc.audio_id and (OUTPUT_DIR / f"{doc.audio_id}.wav").exists():
+            return _progress(doc)
+
+    if doc is None:
+        segments = segment_document(text)
+        if not segments:
+            raise HTTPException(status_code=400, detail="No speakable text found")
+        doc = LongformDocument(
+            id=doc_id,
+            voice_id=voice_id,
+            engine=engine,
+            status=DocumentStatus.QUEUED,
+            segments=segments,
+            created_at=datetime.now().isoformat(),
+        )
+        _doc_dir(doc_id).mkdir(parents=True, exist_ok=True)
+
+    _start(doc)
+    return _progress(doc)
+
+
+@router.post("/")
+async def create_document(request: LongformRequest):
+    """Synthesize arbitrarily long text; resubmitting the same text resumes it"""
+    return await _submit(request.text, request.voice_id)
+
+
+@router.post("/upload")
+async def upload_document(
+    file: UploadFile = File(...),
+    voice_id: str = Form("ngoc-huyen"),
+):
+    """Synthesize an uploaded .txt or .md document"""
+    suffix = Path(file.filename or "").suffix.lower()
+    if suffix not in (".txt", ".md"):
+        raise HTTPException(status_code=400, detail="Only .txt and .md files are supported")
+
+    content = await file.read(MAX_UPLOAD_BYTES + 1)
+    if len(content) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Document too large (max 5 MB)")
+
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Document must be UTF-8 text")
+
+    if suffix == ".md":
+        text = strip_markdown(text)
+    return await _submit(text, voice_id)
+
+
+@router.get("/{doc_id}")
+async def get_document(doc_id: str):
+    """Document status with per-segment progress"""
+    doc = _find(doc_id)
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return _progress(doc)
+
+
+@router.post("/{doc_id}/resume")
+async def resume_document(doc_id: str):
+    """Resume a failed or interrupted document, re-rendering only missing segments"""
+    if doc_id in _tasks:
+        return _progress(_documents[doc_id])
+
+    doc = _find(doc_id)
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if doc.engine != await engine_fingerprint(doc.voice_id):
+        raise HTTPException(status_code=409, detail="The voice's model, backend or lexicons changed; submit the text again")
+
+    _start(doc)
+    return _progress(doc)
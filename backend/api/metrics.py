@@ -0,0 +1,243 @@
+"""
+Metrics - Prometheus counters, gauges and histograms for the TTS pipeline
+Exposed as text at /metrics; label values are bounded so the series count cannot grow without limit
+"""
+
+import os
+import time
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+MAX_LABEL_VALUES = int(os.getenv("VIENEU_METRICS_MAX_VOICES", "50"))
+OVERFLOW_LABEL = "other"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RTF_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 5.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class BoundedLabel:
+    """Passes the first `limit` distinct values through and maps the rest to "other" """
+
+    def __init__(self, limit: int = MAX_LABEL_VALUES):
+        self.limit = limit
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    def __call__(self, value: Optional[str]) -> str:
+        value = value or "none"
+        if value in self._seen:
+            return value
+        with self._lock:
+            if len(self._seen) < self.limit:
+                self._seen.add(value)
+                return value
+        return OVERFLOW_LABEL
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, *labels: str):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.label_names, k)} {_format_value(v)}" for k, v in values]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (+Inf last), sum]
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            snapshot = [(k, list(counts), total) for k, (counts, total) in self._series.items()]
+        lines = self.header()
+        for labels, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+class GaugeCollector(_Metric):
+    """Values read at scrape time, so the hot path pays nothing for them"""
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], Iterable[Tuple[tuple, float]]], labels: Iterable[str] = (), kind: str = "gauge"):
+        super().__init__(name, documentation, labels)
+        self.kind = kind
+        self.read = read
+
+    def collect(self) -> List[str]:
+        try:
+            values = [(k, v) for k, v in self.read() if v is not None]
+        except Exception:
+            return []
+        return self.header() + [f"{self.name}{_format_labels(self.label_names, k)} {_format_value(v)}" for k, v in values]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, documentation: str, read: Callable, labels: Iterable[str] = (), kind: str = "gauge"):
+        """Register a scrape-time reading; `read` returns (label values, value) pairs"""
+        self.register(GaugeCollector(name, documentation, read, labels, kind))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+voice_label = BoundedLabel()
+
+STAGE_SECONDS = registry.register(Histogram(
+    "vieneu_stage_seconds",
+    "Time spent per synthesis pipeline stage",
+    ("stage",),
+))
+REAL_TIME_FACTOR = registry.register(Histogram(
+    "vieneu_real_time_factor",
+    "Inference seconds per second of audio produced, per request",
+    ("voice",),
+    RTF_BUCKETS,
+))
+CHARACTERS = registry.register(Counter("vieneu_characters_total", "Characters synthesized", ("voice",)))
+AUDIO_SECONDS = registry.register(Counter("vieneu_audio_seconds_total", "Seconds of audio synthesized", ("voice",)))
+HTTP_SECONDS = registry.register(Histogram(
+    "vieneu_http_request_seconds",
+    "HTTP request latency by route template and status class",
+    ("route", "method", "status"),
+))
+
+
+class stage_timer:
+    """`with stage_timer("inference"):` records the block's duration in vieneu_stage_seconds"""
+
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        STAGE_SECONDS.observe(time.perf_counter() - self.started, self.stage)
+        return False
+
+
+def observe_synthesis(voice_id: Optional[str], characters: int, audio_seconds: float, inference_seconds: float):
+    """Per-request throughput: characters, audio produced and real-time factor"""
+    voice = voice_label(voice_id)
+    CHARACTERS.inc(characters, voice)
+    AUDIO_SECONDS.inc(audio_seconds, voice)
+    if audio_seconds > 0:
+        REAL_TIME_FACTOR.observe(inference_seconds / audio_seconds, voice)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing each request until its last body chunk is sent.
+
+    Routes are labelled by template (`/api/tts/audio/{audio_id}`), never the
+    raw path, and statuses by class, so labels stay bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_SECONDS.observe(
+                time.perf_counter() - started,
+                route_template(scope),
+                scope.get("method", ""),
+                f"{status[0] // 100}xx",
+            )
+
+
+def route_template(scope) -> str:
+    """Request path with matched path parameters put back as `{name}`"""
+    if scope.get("route") is None:
+        return "unmatched"
+    params = {str(v): k for k, v in scope.get("path_params", {}).items()}
+    if not params:
+        return scope["path"]
+    return "/".join("{" + params[part] + "}" if part in params else part for part in scope["path"].split("/"))
@@ -0,0 +1,448 @@
+"""
+Model Import - Background adapter downloads into a content-addressed blob store
+Files are stored once under storage/blobs/ and hardlinked into each storage/models/<id>/ view
+"""
+
+import os
+import uuid
+import shutil
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import urllib.request
+from enum import Enum
+from pathlib import Path
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from pydantic import BaseModel
+
+from api.db import STORAGE_DIR, init_schema, run_db
+
+BLOBS_DIR = STORAGE_DIR / "blobs"
+CHUNK_BYTES = 1024 * 1024
+IMPORT_CONCURRENCY = int(os.getenv("VIENEU_IMPORT_CONCURRENCY", "2"))
+# Directory laid out as <repo_id>/<files>, usable as source "local"
+MIRROR_DIR = os.getenv("VIENEU_MODEL_MIRROR_DIR")
+HF_ENDPOINT = os.getenv("VIENEU_HF_ENDPOINT") or os.getenv("HF_ENDPOINT")
+
+
+class ImportStatus(str, Enum):
+    QUEUED = "queued"
+    DOWNLOADING = "downloading"
+    COMPLETED = "completed"
+    CANCELLED = "cancelled"
+    ERROR = "error"
+
+
+class ImportJob(BaseModel):
+    id: str
+    model_id: str
+    repo_id: str
+    source: str
+    revision: Optional[str] = None
+    status: ImportStatus
+    files_total: int = 0
+    files_done: int = 0
+    total_bytes: int = 0
+    done_bytes: int = 0
+    reused_bytes: int = 0  # already in the blob store, so not stored again
+    current_file: Optional[str] = None
+    created_at: str
+    completed_at: Optional[str] = None
+    error: Optional[str] = None
+
+
+class RemoteFile(NamedTuple):
+    path: str
+    size: Optional[int]
+    sha256: Optional[str]  # known up front for hub LFS files, which lets them skip download
+
+
+class ImportCancelled(Exception):
+    pass
+
+
+class ImportSource:
+    """Where adapter files come from; subclasses list a repo and stream one file from an offset"""
+
+    def list_files(self, repo_id: str, revision: Optional[str]) -> List[RemoteFile]:
+        raise NotImplementedError
+
+    def open(self, repo_id: str, revision: Optional[str], remote: RemoteFile, offset: int) -> Tuple[Iterator[bytes], int]:
+        """(chunks, offset actually served); 0 means the source restarted from the beginning"""
+        raise NotImplementedError
+
+
+class HubSource(ImportSource):
+    """Hugging Face Hub (or a mirror of its API via VIENEU_HF_ENDPOINT); resumes with HTTP Range"""
+
+    def __init__(self, endpoint: Optional[str] = HF_ENDPOINT):
+        self.endpoint = endpoint
+
+    def list_files(self, repo_id: str, revision: Optional[str]) -> List[RemoteFile]:
+        from huggingface_hub import HfApi
+
+        info = HfApi(endpoint=self.endpoint).model_info(repo_id, revision=revision, files_metadata=True)
+        files = []
+        for sibling in info.siblings or []:
+            lfs = sibling.lfs
+            sha = (lfs.get("sha256") if isinstance(lfs, dict) else getattr(lfs, "sha256", None)) if lfs else None
+            files.append(RemoteFile(sibling.rfilename, sibling.size, sha))
+        return files
+
+    def open(self, repo_id, revision, remote, offset):
+        from huggingface_hub import hf_hub_url
+        from huggingface_hub.utils import build_hf_headers
+
+        url = hf_hub_url(repo_id, remote.path, revision=revision, endpoint=self.endpoint)
+        headers = build_hf_headers()
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+        response = urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=60)
+        served = offset if response.status == 206 else 0
+
+        def chunks():
+            with response:
+                while True:
+                    chunk = response.read(CHUNK_BYTES)
+                    if not chunk:
+                        return
+                    yield chunk
+
+        return chunks(), served
+
+
+class LocalSource(ImportSource):
+    """A directory of adapters laid out as <root>/<repo_id>/ (an offline mirror or shared drive)"""
+
+    def __init__(self, root: Optional[str] = MIRROR_DIR):
+        self.root = Path(root) if root else None
+
+    def _repo_dir(self, repo_id: str) -> Path:
+        if self.root is None:
+            raise ValueError("Local import source is not configured (set VIENEU_MODEL_MIRROR_DIR)")
+        path = (self.root / repo_id).resolve()
+        if not path.is_relative_to(self.root.resolve()) or not path.is_dir():
+            raise ValueError(f"{repo_id} not found in {self.root}")
+        return path
+
+    def list_files(self, repo_id, revision):
+        base = self._repo_dir(repo_id)
+        return [
+            RemoteFile(p.relative_to(base).as_posix(), p.stat().st_size, None)
+            for p in sorted(base.rglob("*"))
+            if p.is_file() and not any(part.startswith(".") for part in p.relative_to(base).parts)
+        ]
+
+    def open(self, repo_id, revision, remote, offset):
+        f = open(self._repo_dir(repo_id) / remote.path, "rb")
+        f.seek(offset)
+
+        def chunks():
+            with f:
+                while True:
+                    chunk = f.read(CHUNK_BYTES)
+                    if not chunk:
+                        return
+                    yield chunk
+
+        return chunks(), offset
+
+
+SOURCES: Dict[str, ImportSource] = {
+    "huggingface": HubSource(),
+    "local": LocalSource(),
+}
+
+
+def register_source(name: str, source: ImportSource):
+    """Make another import source (e.g. an internal mirror) selectable by name"""
+    SOURCES[name] = source
+
+
+class BlobStore:
+    """sha256-addressed files; views are hardlinks, so a blob is freed once no view links it"""
+
+    def __init__(self, root: Path = BLOBS_DIR):
+        self.root = root
+        self.partial_dir = root / "partial"
+        self.partial_dir.mkdir(parents=True, exist_ok=True)
+
+    def path(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256
+
+    def has(self, sha256: Optional[str]) -> bool:
+        return bool(sha256) and self.path(sha256).exists()
+
+    def put(self, tmp: Path, sha256: str) -> Path:
+        target = self.path(sha256)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if target.exists():
+            tmp.unlink()
+        else:
+            tmp.replace(target)
+        return target
+
+    def link(self, sha256: str, view_path: Path):
+        view_path.parent.mkdir(parents=True, exist_ok=True)
+        view_path.unlink(missing_ok=True)
+        try:
+            os.link(self.path(sha256), view_path)
+        except OSError:
+            # Filesystems without hardlinks get a copy
+            shutil.copyfile(self.path(sha256), view_path)
+
+    def collect_garbage(self) -> int:
+        """Delete blobs no view links to any more; returns bytes freed"""
+        freed = 0
+        for path in self.root.glob("??/*"):
+            st = path.stat()
+            if st.st_nlink <= 1:
+                path.unlink()
+                freed += st.st_size
+        return freed
+
+
+init_schema([
+    """
+    CREATE TABLE IF NOT EXISTS model_imports (
+        id TEXT PRIMARY KEY,
+        status TEXT NOT NULL,
+        data TEXT NOT NULL
+    )
+    """,
+])
+
+
+def _save(conn: sqlite3.Connection, job: ImportJob):
+    with conn:
+        conn.execute(
+            "INSERT INTO model_imports (id, status, data) VALUES (?, ?, ?) ON CONFLICT (id) DO UPDATE SET status = excluded.status, data = excluded.data",
+            (job.id, job.status.value, job.model_dump_json()),
+        )
+
+
+def _list(conn: sqlite3.Connection, statuses: Optional[List[str]] = None) -> List[ImportJob]:
+    if statuses:
+        marks = ",".join("?" for _ in statuses)
+        rows = conn.execute(f"SELECT data FROM model_imports WHERE status IN ({marks})", statuses).fetchall()
+    else:
+        rows = conn.execute("SELECT data FROM model_imports").fetchall()
+    jobs = [ImportJob.model_validate_json(row["data"]) for row in rows]
+    return sorted(jobs, key=lambda j: j.created_at, reverse=True)
+
+
+def _delete_model(conn: sqlite3.Connection, model_id: str):
+    with conn:
+        conn.execute("DELETE FROM model_imports WHERE json_extract(data, '$.model_id') = ?", (model_id,))
+
+
+class ImportManager:
+    """
+    Runs adapter imports as background tasks with byte-level progress.
+
+    Each file streams into storage/blobs/partial/<job>/ and moves into the
+    blob store once hashed; files whose hash is already stored are skipped.
+    The adapter view is assembled next to storage/models/ and renamed into
+    place at the end, so the engine never sees a half-imported adapter.
+    Cancelled or interrupted imports keep their partial files and resume
+    where they stopped.
+    """
+
+    def __init__(self, models_dir: Path, on_complete: Callable[[sqlite3.Connection, ImportJob], None], blobs: Optional[BlobStore] = None):
+        self.models_dir = models_dir
+        self.on_complete = on_complete
+        self.blobs = blobs or BlobStore()
+        self._jobs: Dict[str, ImportJob] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._cancel: Dict[str, threading.Event] = {}
+        self._shutting_down = False
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def get(self, job_id: str) -> Optional[ImportJob]:
+        if job_id in self._jobs:
+            return self._jobs[job_id]
+        jobs = [j for j in await run_db(_list) if j.id == job_id]
+        return jobs[0] if jobs else None
+
+    async def list(self) -> List[ImportJob]:
+        return [self._jobs.get(j.id, j) for j in await run_db(_list)]
+
+    async def active_for(self, repo_id: str) -> Optional[ImportJob]:
+        """Unfinished import of repo_id, possibly running in another API worker"""
+        active = await run_db(_list, [ImportStatus.QUEUED.value, ImportStatus.DOWNLOADING.value])
+        job = next((j for j in active if j.repo_id == repo_id), None)
+        return self._jobs.get(job.id, job) if job else None
+
+    async def submit(self, repo_id: str, model_id: str, source: str, revision: Optional[str] = None) -> ImportJob:
+        if source not in SOURCES:
+            raise ValueError(f"Unknown import source '{source}' (available: {', '.join(SOURCES)})")
+        job = ImportJob(
+            id=uuid.uuid4().hex[:12],
+            model_id=model_id,
+            repo_id=repo_id,
+            source=source,
+            revision=revision,
+            status=ImportStatus.QUEUED,
+            created_at=datetime.now().isoformat(),
+        )
+        await run_db(_save, job)
+        self._start(job)
+        return job
+
+    def _start(self, job: ImportJob):
+        job.status = ImportStatus.QUEUED
+        job.error = None
+        self._jobs[job.id] = job
+        self._cancel[job.id] = threading.Event()
+        self._tasks[job.id] = asyncio.ensure_future(self._run(job))
+
+    async def resume(self, job: ImportJob) -> ImportJob:
+        if job.id not in self._tasks:
+            self._start(job)
+        return job
+
+    async def cancel(self, job_id: str) -> Optional[ImportJob]:
+        task = self._tasks.get(job_id)
+        if task is None:
+            return None
+        self._cancel[job_id].set()
+        await asyncio.gather(task, return_exceptions=True)
+        return self._jobs[job_id]
+
+    async def forget_model(self, model_id: str) -> int:
+        """Drop a deleted model's import records and any blobs only it used; returns bytes freed"""
+        await run_db(_delete_model, model_id)
+        return await asyncio.to_thread(self.blobs.collect_garbage)
+
+    def _partial_dir(self, job: ImportJob) -> Path:
+        return self.blobs.partial_dir / job.id
+
+    def _staging_dir(self, job: ImportJob) -> Path:
+        return self.models_dir / f".{job.model_id}.importing"
+
+    def _fetch(self, job: ImportJob, source: ImportSource, remote: RemoteFile, cancel: threading.Event) -> str:
+        """Download (or resume) one file into the blob store and return its sha256 (blocking)"""
+        part = self._partial_dir(job) / (remote.path + ".part")
+        part.parent.mkdir(parents=True, exist_ok=True)
+        offset = part.stat().st_size if part.exists() else 0
+        if remote.size is not None and offset > remote.size:
+            part.unlink()
+            offset = 0
+
+        digest = hashlib.sha256()
+        if offset:
+            with open(part, "rb") as f:
+                while chunk := f.read(CHUNK_BYTES):
+                    digest.update(chunk)
+
+        chunks, served = source.open(job.repo_id, job.revision, remote, offset)
+        if served != offset:
+            # Source could not resume; start the file over
+            job.done_bytes -= offset
+            digest = hashlib.sha256()
+            part.unlink(missing_ok=True)
+        with open(part, "ab") as f:
+            for chunk in chunks:
+                if cancel.is_set():
+                    raise ImportCancelled()
+                f.write(chunk)
+                digest.update(chunk)
+                job.done_bytes += len(chunk)
+
+        sha = digest.hexdigest()
+        if remote.sha256 and sha != remote.sha256:
+            job.done_bytes -= part.stat().st_size
+            part.unlink()
+            raise ValueError(f"{remote.path}: checksum mismatch")
+        if self.blobs.has(sha):
+            job.reused_bytes += part.stat().st_size
+        self.blobs.put(part, sha)
+        return sha
+
+    async def _import(self, job: ImportJob):
+        source = SOURCES[job.source]
+        cancel = self._cancel[job.id]
+        files = await asyncio.to_thread(source.list_files, job.repo_id, job.revision)
+        if not files:
+            raise ValueError(f"{job.repo_id} has no files")
+
+        staging = self._staging_dir(job)
+        partial = self._partial_dir(job)
+        job.files_total = len(files)
+        job.total_bytes = sum(f.size or 0 for f in files)
+        # Bytes already on disk from an interrupted run count as done
+        job.done_bytes = sum(p.stat().st_size for p in partial.rglob("*.part")) if partial.exists() else 0
+        job.files_done = 0
+        job.reused_bytes = 0
+        await run_db(_save, job)
+
+        for remote in files:
+            if cancel.is_set():
+                raise ImportCancelled()
+            job.current_file = remote.path
+            view_path = staging / remote.path
+            if not view_path.resolve().is_relative_to(staging.resolve()):
+                raise ValueError(f"Unsafe file path {remote.path}")
+
+            if view_path.exists() and (remote.size is None or view_path.stat().st_size == remote.size):
+                # Linked by an earlier run of this import
+                job.done_bytes += view_path.stat().st_size
+            elif self.blobs.has(remote.sha256):
+                await asyncio.to_thread(self.blobs.link, remote.sha256, view_path)
+                job.done_bytes += remote.size or 0
+                job.reused_bytes += remote.size or 0
+            else:
+                sha = await asyncio.to_thread(self._fetch, job, source, remote, cancel)
+                await asyncio.to_thread(self.blobs.link, sha, view_path)
+            job.files_done += 1
+            await run_db(_save, job)
+
+        target = self.models_dir / job.model_id
+        if target.exists():
+            await asyncio.to_thread(shutil.rmtree, target)
+        await asyncio.to_thread(staging.replace, target)
+        await asyncio.to_thread(shutil.rmtree, partial, True)
+
+    async def _run(self, job: ImportJob):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(max(1, IMPORT_CONCURRENCY))
+        try:
+            async with self._slots:
+                job.status = ImportStatus.DOWNLOADING
+                await run_db(_save, job)
+                await self._import(job)
+            job.status = ImportStatus.COMPLETED
+            job.current_file = None
+            job.completed_at = datetime.now().isoformat()
+            await run_db(self.on_complete, job)
+            print(f"[VieNeu] Imported {job.repo_id}: {job.total_bytes / 1e6:.1f} MB, {job.reused_bytes / 1e6:.1f} MB already stored")
+        except ImportCancelled:
+            # Server shutdown leaves the job `downloading` so it resumes on the next start
+            if not self._shutting_down:
+                job.status = ImportStatus.CANCELLED
+                job.completed_at = datetime.now().isoformat()
+        except Exception as e:
+            job.status = ImportStatus.ERROR
+            job.error = str(e) or type(e).__name__
+            job.completed_at = datetime.now().isoformat()
+            print(f"[VieNeu] Import of {job.repo_id} failed: {job.error}")
+        finally:
+            self._tasks.pop(job.id, None)
+            self._cancel.pop(job.id, None)
+            await run_db(_save, job)
+
+    async def start(self):
+        """Resume imports that were queued or downloading when the server stopped (app lifespan)"""
+        self._shutting_down = False
+        for job in await run_db(_list, [ImportStatus.QUEUED.value, ImportStatus.DOWNLOADING.value]):
+            print(f"[VieNeu] Resuming import of {job.repo_id}")
+            self._start(job)
+
+    async def shutdown(self):
+        self._shutting_down = True
+        for event in self._cancel.values():
+            event.set()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
@@ -2,16 +2,19 @@
 Models API Router - LoRA adapter management
 """
 
-import os
 import shutil
-from pathlib import Path
+import asyncio
+import sqlite3
 from typing import List, Optional
 from pydantic import BaseModel
 from fastapi import APIRouter, HTTPException
 
+from api.db import STORAGE_DIR, connect, init_schema, run_db
+from api.model_import import ImportJob, ImportManager, ImportStatus
+
 router = APIRouter()
 
-MODELS_DIR = Path(__file__).parent.parent / "storage" / "models"
+MODELS_DIR = STORAGE_DIR / "models"
 MODELS_DIR.mkdir(parents=True, exist_ok=True)
 
 
@@ -26,10 +29,12 @@ class LoraModel(BaseModel):
 
 class ImportRequest(BaseModel):
     repo_id: str
+    source: str = "huggingface"  # or "local", or any name passed to register_source
+    revision: Optional[str] = None
 
 
-# In-memory model registry (in production, use SQLite or similar)
-_models_registry: List[LoraModel] = [
+# Model registry, shared by every API worker through the database
+DEFAULT_MODELS = [
     LoraModel(
         id="ngoc-huyen",
         name="Ngọc Huyền",
@@ -40,70 +45,209 @@ _models_registry: List[LoraModel] = [
     )
 ]
 
+init_schema([
+    """
+    CREATE TABLE IF NOT EXISTS models (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        id TEXT NOT NULL UNIQUE,
+        name TEXT NOT NULL,
+        description TEXT NOT NULL,
+        source TEXT NOT NULL,
+        repo_id TEXT,
+        is_active INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+])
+
+
+def _model(row: sqlite3.Row) -> LoraModel:
+    return LoraModel(
+        id=row["id"],
+        name=row["name"],
+        description=row["description"],
+        source=row["source"],
+        repo_id=row["repo_id"],
+        is_active=bool(row["is_active"]),
+    )
+
+
+def _insert(conn: sqlite3.Connection, model: LoraModel):
+    with conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO models (id, name, description, source, repo_id, is_active) VALUES (?, ?, ?, ?, ?, ?)",
+            (model.id, model.name, model.description, model.source, model.repo_id, int(model.is_active)),
+        )
+
+
+def _list(conn: sqlite3.Connection) -> List[LoraModel]:
+    return [_model(row) for row in conn.execute("SELECT * FROM models ORDER BY seq")]
+
+
+def _activate(conn: sqlite3.Connection, model_id: str) -> bool:
+    with conn:
+        if conn.execute("SELECT 1 FROM models WHERE id = ?", (model_id,)).fetchone() is None:
+            return False
+        conn.execute("UPDATE models SET is_active = (id = ?)", (model_id,))
+        return True
+
+
+def _delete(conn: sqlite3.Connection, model_id: str):
+    with conn:
+        conn.execute("DELETE FROM models WHERE id = ?", (model_id,))
+
+
+if connect().execute("SELECT 1 FROM models LIMIT 1").fetchone() is None:
+    for _default in DEFAULT_MODELS:
+        _insert(connect(), _default)
+
+
+def get_active_model_id() -> Optional[str]:
+    """Id of the currently active LoRA adapter, if any"""
+    row = connect().execute("SELECT id FROM models WHERE is_active = 1").fetchone()
+    return row["id"] if row else None
+
+
+def _get(conn: sqlite3.Connection, model_id: str) -> Optional[LoraModel]:
+    row = conn.execute("SELECT * FROM models WHERE id = ?", (model_id,)).fetchone()
+    return _model(row) if row else None
+
+
+def get_model(model_id: str) -> Optional[LoraModel]:
+    """Blocking lookup for inference workers; handlers use run_db(_get, ...)"""
+    return _get(connect(), model_id)
+
+
+def _get_by_repo(conn: sqlite3.Connection, repo_id: str) -> Optional[LoraModel]:
+    row = conn.execute("SELECT * FROM models WHERE repo_id = ?", (repo_id,)).fetchone()
+    return _model(row) if row else None
+
+
+def _register_import(conn: sqlite3.Connection, job: ImportJob):
+    """Add a finished import to the registry"""
+    _insert(conn, LoraModel(
+        id=job.model_id,
+        name=job.model_id.replace("-", " ").title(),
+        description=f"Imported from {job.repo_id}",
+        source=job.source,
+        repo_id=job.repo_id,
+        is_active=False,
+    ))
+
+
+import_manager = ImportManager(MODELS_DIR, _register_import)
+
+
+# Voices that always run on the base model without a LoRA
+BASE_MODEL_VOICES = {"default"}
+
+
+def _resolve_adapter(conn: sqlite3.Connection, voice_id: Optional[str]) -> Optional[str]:
+    if voice_id is None or voice_id in BASE_MODEL_VOICES or voice_id.startswith("custom-"):
+        return None
+    if conn.execute("SELECT 1 FROM models WHERE id = ?", (voice_id,)).fetchone() is not None:
+        return voice_id
+    row = conn.execute("SELECT id FROM models WHERE is_active = 1").fetchone()
+    return row["id"] if row else None
+
+
+def resolve_adapter(voice_id: Optional[str]) -> Optional[str]:
+    """
+    Adapter that serves a voice: its own LoRA if the voice is an imported
+    model, the base model for preset/cloned voices, else the active model.
+    Blocking; event-loop code uses resolve_adapter_async.
+    """
+    return _resolve_adapter(connect(), voice_id)
+
+
+async def resolve_adapter_async(voice_id: Optional[str]) -> Optional[str]:
+    """resolve_adapter with the lookups on a database thread"""
+    if voice_id is None or voice_id in BASE_MODEL_VOICES or voice_id.startswith("custom-"):
+        return None
+    return await run_db(_resolve_adapter, voice_id)
+
 
 @router.get("/", response_model=List[LoraModel])
 async def list_models():
     """List all available LoRA models"""
-    return _models_registry
+    return await run_db(_list)
 
 
-@router.post("/import")
+@router.post("/import", response_model=ImportJob)
 async def import_model(request: ImportRequest):
-    """Import LoRA model from HuggingFace"""
+    """Queue a LoRA model import; poll /imports/{id} for progress"""
     
     repo_id = request.repo_id.strip()
     if not repo_id:
         raise HTTPException(status_code=400, detail="Repository ID required")
     
+    # Same repo already downloading: hand back that job instead of fetching twice
+    active = await import_manager.active_for(repo_id)
+    if active is not None:
+        return active
+    
     # Check if already imported
-    if any(m.repo_id == repo_id for m in _models_registry):
+    model_id = repo_id.split("/")[-1]
+    if await run_db(_get_by_repo, repo_id) is not None or await run_db(_get, model_id) is not None:
         raise HTTPException(status_code=400, detail="Model already imported")
     
     try:
-        # Download from HuggingFace
-        from huggingface_hub import snapshot_download
-        
-        model_id = repo_id.split("/")[-1]
-        local_path = MODELS_DIR / model_id
-        
-        snapshot_download(
-            repo_id=repo_id,
-            local_dir=str(local_path),
-        )
-        
-        # Add to registry
-        new_model = LoraModel(
-            id=model_id,
-            name=model_id.replace("-", " ").title(),
-            description=f"Imported from {repo_id}",
-            source="huggingface",
-            repo_id=repo_id,
-            is_active=False,
-        )
-        _models_registry.append(new_model)
-        
-        return {"status": "success", "model": new_model}
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        return await import_manager.submit(repo_id, model_id, request.source, request.revision)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/imports", response_model=List[ImportJob])
+async def list_imports():
+    """Import jobs, newest first"""
+    return await import_manager.list()
+
+
+@router.get("/imports/{job_id}", response_model=ImportJob)
+async def get_import(job_id: str):
+    """Import progress in files and bytes"""
+    job = await import_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import not found")
+    return job
+
+
+@router.post("/imports/{job_id}/cancel", response_model=ImportJob)
+async def cancel_import(job_id: str):
+    """Stop an import; downloaded bytes are kept for /resume"""
+    job = await import_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=409, detail="Import is not running")
+    return job
+
+
+@router.post("/imports/{job_id}/resume", response_model=ImportJob)
+async def resume_import(job_id: str):
+    """Restart a cancelled or failed import from where it stopped"""
+    job = await import_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import not found")
+    if job.status == ImportStatus.COMPLETED:
+        raise HTTPException(status_code=409, detail="Import already completed")
+    if await run_db(_get, job.model_id) is not None:
+        raise HTTPException(status_code=400, detail="Model already imported")
+    return await import_manager.resume(job)
 
 
 @router.post("/{model_id}/activate")
 async def activate_model(model_id: str):
     """Set a model as the active model"""
     
-    found = False
-    for model in _models_registry:
-        if model.id == model_id:
-            model.is_active = True
-            found = True
-        else:
-            model.is_active = False
-    
-    if not found:
+    if not await run_db(_activate, model_id):
         raise HTTPException(status_code=404, detail="Model not found")
     
-    # TODO: Actually reload the model in TTS engine
+    # Swap the adapter in now so the next request does not pay for it
+    from api.tts import preload_adapter
+    try:
+        await preload_adapter(model_id)
+    except HTTPException:
+        pass
+    except Exception as e:
+        print(f"[VieNeu] Could not preload adapter {model_id}: {e}")
     
     return {"status": "success", "active_model": model_id}
 
@@ -112,31 +256,46 @@ async def activate_model(model_id: str):
 async def delete_model(model_id: str):
     """Delete a LoRA model"""
     
-    global _models_registry
-    
-    model = next((m for m in _models_registry if m.id == model_id), None)
+    model = await run_db(_get, model_id)
     if not model:
         raise HTTPException(status_code=404, detail="Model not found")
     
     if model.is_active:
         raise HTTPException(status_code=400, detail="Cannot delete active model")
     
+    # Drop it from the engine before its files disappear
+    from api.tts import release_adapter
+    try:
+        await release_adapter(model_id)
+    except Exception as e:
+        print(f"[VieNeu] Could not unload adapter {model_id}: {e}")
+    
     # Remove from filesystem if exists
     model_path = MODELS_DIR / model_id
     if model_path.exists():
-        shutil.rmtree(model_path)
+        await asyncio.to_thread(shutil.rmtree, model_path)
     
     # Remove from registry
-    _models_registry = [m for m in _models_registry if m.id != model_id]
+    await run_db(_delete, model_id)
+    
+    # Free blobs no other adapter shares
+    await import_manager.forget_model(model_id)
     
     return {"status": "success"}
 
 
+@router.get("/residency")
+async def adapter_residency():
+    """Resident adapters, swap latency and hit counts for sizing the adapter cache"""
+    from api.tts import adapter_stats
+    return await adapter_stats()
+
+
 @router.post("/{model_id}/test")
 async def test_model(model_id: str, text: str = "Xin chào, đây là giọng nói thử nghiệm."):
     """Quick test a model with sample text"""
     
-    model = next((m for m in _models_registry if m.id == model_id), None)
+    model = await run_db(_get, model_id)
     if not model:
         raise HTTPException(status_code=404, detail="Model not found")
     
@@ -0,0 +1,209 @@
+"""
+Output Index - SQLite index of generated audio files in Output/
+Updated as files are written or deleted; a background scan reconciles changes made outside the API
+"""
+
+import os
+import wave
+import asyncio
+import hashlib
+import sqlite3
+from pathlib import Path
+from datetime import datetime
+from typing import List, Optional
+
+from api.db import init_schema, run_db
+from api.synthesis_cache import normalize_text
+
+OUTPUT_PATTERN_PREFIX = "VieNeuStudio-"
+SCAN_INTERVAL = float(os.getenv("VIENEU_OUTPUT_SCAN_INTERVAL", "300"))
+
+init_schema([
+    """
+    CREATE TABLE IF NOT EXISTS output_files (
+        filename TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        created TEXT NOT NULL,
+        duration REAL,
+        voice TEXT,
+        text_hash TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_output_created ON output_files (created, filename)",
+    "CREATE INDEX IF NOT EXISTS idx_output_voice ON output_files (voice, created)",
+])
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()[:16]
+
+
+def _is_output(name: str) -> bool:
+    return name.startswith(OUTPUT_PATTERN_PREFIX) and name.endswith(".wav")
+
+
+def _wav_duration(path: Path) -> Optional[float]:
+    """Duration from the WAV header only; None for unreadable or still-streaming files"""
+    try:
+        with wave.open(str(path), "rb") as f:
+            return round(f.getnframes() / f.getframerate(), 3)
+    except (wave.Error, EOFError, OSError, ZeroDivisionError):
+        return None
+
+
+def _upsert(conn: sqlite3.Connection, filename: str, st: os.stat_result, duration, voice=None, digest=None):
+    # Re-stats from the scan keep the voice/text hash recorded at generation time
+    conn.execute(
+        """
+        INSERT INTO output_files (filename, size, mtime_ns, created, duration, voice, text_hash)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (filename) DO UPDATE SET
+            size = excluded.size,
+            mtime_ns = excluded.mtime_ns,
+            duration = excluded.duration,
+            voice = COALESCE(excluded.voice, output_files.voice),
+            text_hash = COALESCE(excluded.text_hash, output_files.text_hash)
+        """,
+        (
+            filename,
+            st.st_size,
+            st.st_mtime_ns,
+            datetime.fromtimestamp(st.st_ctime).isoformat(),
+            duration,
+            voice,
+            digest,
+        ),
+    )
+
+
+def forget(conn: sqlite3.Connection, filenames: List[str]):
+    """Drop index rows (use from code already running on a database thread)"""
+    conn.executemany("DELETE FROM output_files WHERE filename = ?", [(name,) for name in filenames])
+
+
+class OutputIndex:
+    """
+    Index of VieNeuStudio-*.wav files in one directory.
+
+    Writers call `record()`; deleters call `forget()`. `reconcile()` catches everything else:
+    it skips entirely while the directory mtime is unchanged, and otherwise
+    only reads headers of files whose size or mtime differ from the index.
+    """
+
+    def __init__(self, directory: Path, scan_interval: float = SCAN_INTERVAL):
+        self.directory = directory
+        self.scan_interval = scan_interval
+        self._dir_mtime_ns: Optional[int] = None
+        self._scan_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"scans": 0, "scans_skipped": 0, "restatted": 0, "removed": 0, "last_scan_seconds": 0.0}
+
+    async def record(self, path: Path, voice: Optional[str] = None, text: Optional[str] = None):
+        """Index a file that was just written"""
+        def write(conn):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                return
+            _upsert(conn, path.name, st, _wav_duration(path), voice, text_hash(text) if text else None)
+
+        if not _is_output(path.name):
+            return
+        try:
+            await run_db(write)
+        except sqlite3.Error as e:
+            print(f"[VieNeu] Could not index output file {path.name}: {e}")
+
+    def _reconcile(self, conn: sqlite3.Connection, force: bool) -> bool:
+        try:
+            dir_mtime = self.directory.stat().st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if not force and dir_mtime == self._dir_mtime_ns:
+            self._stats["scans_skipped"] += 1
+            return False
+
+        known = {
+            row["filename"]: (row["size"], row["mtime_ns"])
+            for row in conn.execute("SELECT filename, size, mtime_ns FROM output_files")
+        }
+        seen = set()
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not _is_output(entry.name) or not entry.is_file():
+                    continue
+                seen.add(entry.name)
+                st = entry.stat()
+                if known.get(entry.name) == (st.st_size, st.st_mtime_ns):
+                    continue
+                _upsert(conn, entry.name, st, _wav_duration(Path(entry.path)))
+                self._stats["restatted"] += 1
+
+        gone = [name for name in known if name not in seen]
+        if gone:
+            forget(conn, gone)
+            self._stats["removed"] += len(gone)
+        self._dir_mtime_ns = dir_mtime
+        return True
+
+    async def reconcile(self, force: bool = False):
+        """Bring the index in line with the directory"""
+        async with self._scan_lock:
+            started = asyncio.get_running_loop().time()
+            if await run_db(self._reconcile, force):
+                self._stats["scans"] += 1
+                self._stats["last_scan_seconds"] = round(asyncio.get_running_loop().time() - started, 3)
+
+    async def _run(self):
+        await self.reconcile(force=True)
+        while True:
+            await asyncio.sleep(self.scan_interval)
+            try:
+                await self.reconcile()
+            except sqlite3.Error as e:
+                print(f"[VieNeu] Output index scan failed: {e}")
+
+    def start(self):
+        """Start the background scan (called from the app lifespan)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _page(self, conn, limit: int, cursor: Optional[str], voice: Optional[str], text: Optional[str], since: Optional[str]):
+        clauses, params = [], []
+        if voice:
+            clauses.append("voice = ?")
+            params.append(voice)
+        if text:
+            clauses.append("text_hash = ?")
+            params.append(text_hash(text))
+        if since:
+            clauses.append("created >= ?")
+            params.append(since)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        total = conn.execute(f"SELECT COUNT(*) FROM output_files {where}", params).fetchone()[0]
+
+        if cursor:
+            created, _, filename = cursor.partition("|")
+            clauses.append("(created, filename) < (?, ?)")
+            params.extend([created, filename])
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = conn.execute(
+            f"SELECT * FROM output_files {where} ORDER BY created DESC, filename DESC LIMIT ?", params + [limit]
+        ).fetchall()
+        return rows, total
+
+    async def page(self, limit: int, cursor: Optional[str] = None, voice: Optional[str] = None,
+                   text: Optional[str] = None, since: Optional[str] = None):
+        """(rows, files matching the filters, next cursor or None), newest first"""
+        rows, total = await run_db(self._page, limit, cursor, voice, text, since)
+        next_cursor = f"{rows[-1]['created']}|{rows[-1]['filename']}" if len(rows) == limit else None
+        return rows, total, next_cursor
+
+    def stats(self) -> dict:
+        return {"scan_interval": self.scan_interval, **self._stats}
@@ -0,0 +1,172 @@
+"""
+Text Segmenter - Splits Vietnamese text into paragraphs, sentences and clauses
+Used to synthesize long input incrementally
+"""
+
+import re
+from typing import List
+
+# Abbreviations that end with a dot but do not end a sentence
+ABBREVIATIONS = {
+    "tp", "tt", "ts", "ths", "pgs", "gs", "bs", "ks", "ls", "nxb", "q", "p",
+    "v.v", "vv", "st", "mr", "mrs", "ms", "dr", "no", "tr",
+}
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…])[\"”’)\]]*\s+")
+_CLAUSE_BREAK = re.compile(r"(?<=[,;:])\s+|\s+[–—-]\s+")
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_WHITESPACE = re.compile(r"\s+")
+
+# Clauses shorter than this are merged into a neighbour to keep prosody natural
+MIN_CLAUSE_CHARS = 12
+
+
+def split_paragraphs(text: str) -> List[str]:
+    """Split on blank lines"""
+    paragraphs = (_WHITESPACE.sub(" ", p).strip() for p in _PARAGRAPH_BREAK.split(text))
+    return [p for p in paragraphs if p]
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split a paragraph on sentence-final punctuation, keeping abbreviations intact"""
+    text = _WHITESPACE.sub(" ", text).strip()
+    if not text:
+        return []
+
+    sentences: List[str] = []
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        candidate = text[start:match.start()].strip()
+        last_word = candidate.rsplit(" ", 1)[-1].rstrip(".").lower()
+        if candidate.endswith(".") and last_word in ABBREVIATIONS:
+            continue
+        sentences.append(text[start:match.end()].strip())
+        start = match.end()
+
+    tail = text[start:].strip()
+    if tail:
+        sentences.append(tail)
+    return sentences
+
+
+def _split_words(text: str, max_chars: int) -> List[str]:
+    """Hard-wrap text with no usable punctuation at word boundaries"""
+    pieces, current = [], ""
+    for word in text.split(" "):
+        if current and len(current) + 1 + len(word) > max_chars:
+            pieces.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _pack(pieces: List[str], max_chars: int, first_max_chars: int = 0) -> List[str]:
+    """Greedily join consecutive pieces; the first packed unit may use a tighter limit"""
+    packed: List[str] = []
+    for piece in pieces:
+        limit = first_max_chars if first_max_chars and len(packed) == 1 else max_chars
+        if packed and len(packed[-1]) + 1 + len(piece) <= limit:
+            packed[-1] = f"{packed[-1]} {piece}"
+        else:
+            packed.append(piece)
+    return packed
+
+
+def split_clauses(text: str, max_chars: int = 160, first_max_chars: int = 60) -> List[str]:
+    """
+    Split text into synthesis units no longer than max_chars.
+
+    Sentences are kept whole when they fit; longer ones are broken at
+    commas, semicolons and dashes, then at word boundaries. The first unit
+    is capped at first_max_chars so streaming can start speaking early.
+    """
+    units: List[str] = []
+    for sentence in split_sentences(text):
+        limit = first_max_chars if not units else max_chars
+        if len(sentence) <= limit:
+            units.append(sentence)
+            continue
+
+        pieces: List[str] = []
+        for clause in _CLAUSE_BREAK.split(sentence):
+            clause = clause.strip()
+            if clause:
+                pieces.extend(_split_words(clause, limit))
+        units.extend(_pack(pieces, max_chars, first_max_chars if not units else 0))
+
+    # Fold tiny fragments into the following unit
+    merged: List[str] = []
+    for unit in units:
+        if merged and len(merged[-1]) < MIN_CLAUSE_CHARS and len(merged[-1]) + 1 + len(unit) <= max_chars:
+            merged[-1] = f"{merged[-1]} {unit}"
+        else:
+            merged.append(unit)
+    return merged
+
+
+# Clause ends that are final once followed by whitespace; a trailing "." may still be "125.000" or "TP.HCM"
+_BOUNDARY = re.compile(r"[.!?…,;:][\"”’)\]]*\s+|\s+[–—-]\s+")
+
+
+class ClauseBuffer:
+    """
+    split_clauses for text that arrives in fragments (e.g. LLM tokens).
+
+    feed() returns the clauses that later text can no longer change, as
+    soon as a clause boundary has been seen; flush() returns whatever is
+    left. Text without any boundary is cut at a word once it outgrows the
+    clause limit. The first clause of each turn gets the tighter
+    first_max_chars cap so speech can start early.
+    """
+
+    def __init__(self, max_chars: int = 160, first_max_chars: int = 60):
+        self.max_chars = max_chars
+        self.first_max_chars = first_max_chars
+        self.text = ""
+        self._first = True
+
+    def _limit(self) -> int:
+        return self.first_max_chars if self._first else self.max_chars
+
+    def _cut(self) -> int:
+        """Length of the prefix that is complete, or 0"""
+        cut = 0
+        for match in _BOUNDARY.finditer(self.text):
+            prefix = self.text[:match.end()].rstrip()
+            last_word = prefix.rsplit(" ", 1)[-1].rstrip(".").lower()
+            if prefix.endswith(".") and last_word in ABBREVIATIONS:
+                continue
+            if len(prefix.strip()) >= MIN_CLAUSE_CHARS:
+                cut = match.end()
+        if not cut and len(self.text) > self._limit():
+            space = self.text.rfind(" ", 0, self._limit())
+            cut = space + 1 if space > 0 else self._limit()
+        return cut
+
+    def _take(self, ready: str) -> List[str]:
+        clauses = split_clauses(ready, self.max_chars, self._limit())
+        if clauses:
+            self._first = False
+        return clauses
+
+    def feed(self, fragment: str) -> List[str]:
+        self.text += fragment
+        cut = self._cut()
+        if not cut:
+            return []
+        ready, self.text = self.text[:cut], self.text[cut:]
+        return self._take(ready)
+
+    def flush(self) -> List[str]:
+        """Everything buffered, as clauses; the next clause starts a new turn"""
+        ready, self.text = self.text, ""
+        clauses = self._take(ready)
+        self._first = True
+        return clauses
+
+    def clear(self):
+        self.text = ""
+        self._first = True
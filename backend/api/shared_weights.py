@@ -0,0 +1,92 @@
+"""
+Shared Weights - Backs the engine's torch weights with memory-mapped files
+Processes mapping the same files share one copy in the page cache instead of each holding a private one
+"""
+
+import os
+import gc
+import time
+import hashlib
+from typing import Dict, Optional
+
+from api.db import STORAGE_DIR
+
+WEIGHTS_DIR = STORAGE_DIR / "weights"
+MMAP_WEIGHTS = os.getenv("VIENEU_MMAP_WEIGHTS", "0") == "1"
+
+
+def torch_modules(engine) -> Dict[str, object]:
+    """Top-level torch modules held by the engine (backbone, codec, ...)"""
+    try:
+        import torch
+    except ImportError:
+        return {}
+    return {
+        name: value
+        for name, value in vars(engine).items()
+        if isinstance(value, torch.nn.Module)
+    }
+
+
+def weights_key(engine, model_version: str) -> str:
+    """Directory name for an engine's mapped weights; changes with the engine class and model"""
+    cls = type(engine)
+    return hashlib.sha256(f"{cls.__module__}.{cls.__qualname__}|{model_version}".encode("utf-8")).hexdigest()[:16]
+
+
+def map_weights(engine, model_version: str) -> Optional[dict]:
+    """
+    Swap the engine's parameters and buffers for tensors mapped from
+    storage/weights/<key>/<module>.pt, writing those files on first use.
+
+    Must run before LoRA adapters are loaded, so only base weights are
+    shared and adapter deltas stay private. The private copies loaded by
+    the engine are freed. Returns what was mapped, or None when the engine
+    holds no torch modules.
+    """
+    modules = torch_modules(engine)
+    if not modules:
+        return None
+    import torch
+
+    started = time.monotonic()
+    directory = WEIGHTS_DIR / weights_key(engine, model_version)
+    directory.mkdir(parents=True, exist_ok=True)
+    mapped = {}
+    for name, module in modules.items():
+        tensor = next(iter(module.state_dict().values()), None)
+        if tensor is None or tensor.device.type != "cpu":
+            # GPU weights live in device memory; mapping only helps CPU inference
+            continue
+        path = directory / f"{name}.pt"
+        if not path.exists():
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            torch.save(module.state_dict(), tmp)
+            tmp.replace(path)
+            print(f"[VieNeu] Wrote mappable weights for {name} ({path.stat().st_size / 1e6:.0f} MB)")
+        state = torch.load(path, mmap=True, weights_only=True, map_location="cpu")
+        module.load_state_dict(state, assign=True)
+        mapped[name] = path.stat().st_size
+    if not mapped:
+        return None
+    gc.collect()
+    elapsed = round(time.monotonic() - started, 2)
+    print(f"[VieNeu] Mapped {sum(mapped.values()) / 1e6:.0f} MB of weights from {directory} in {elapsed}s")
+    return {"dir": str(directory), "bytes": sum(mapped.values()), "modules": sorted(mapped), "seconds": elapsed}
+
+
+def shared_memory() -> dict:
+    """Proportional (PSS) and shared resident memory of this process, from /proc (Linux only)"""
+    fields = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    fields[key] = int(value.split()[0]) * 1024
+    except OSError:
+        return {"pss_bytes": None, "shared_bytes": None}
+    return {
+        "pss_bytes": fields.get("Pss"),
+        "shared_bytes": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+    }
@@ -0,0 +1,174 @@
+"""
+Synthesis Cache - Content-addressed store of generated audio
+Single-flight deduplication of identical in-flight requests, LRU eviction under a byte budget
+"""
+
+import os
+import json
+import shutil
+import asyncio
+import hashlib
+import unicodedata
+from pathlib import Path
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from api.inference import ClientDisconnected
+from api.engine_backends import backend_fingerprint
+from api.text_frontend import text_frontend
+
+CACHE_MAX_BYTES = int(os.getenv("VIENEU_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+MODEL_VERSION = os.getenv("VIENEU_MODEL_VERSION", "pnnbao-ump/VieNeu-TTS-0.3B")
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form used for cache keys: NFC with collapsed whitespace"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(text: str, voice_id: str, adapter: Optional[str], params: Optional[dict] = None) -> str:
+    """Hash of everything that influences the synthesized audio"""
+    material = json.dumps(
+        {
+            "text": normalize_text(text),
+            "voice": voice_id,
+            "adapter": adapter,
+            "model": MODEL_VERSION,
+            "params": params or {},
+            # Quantized and alternative runtimes produce different audio
+            **({"backend": backend_fingerprint()} if backend_fingerprint() else {}),
+            # Normalization rules and lexicons change what the engine is asked to say
+            "frontend": text_frontend.fingerprint(),
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def is_cache_key(value: str) -> bool:
+    return len(value) == 64 and all(c in "0123456789abcdef" for c in value)
+
+
+class SynthesisCache:
+    """
+    WAV files stored as <key>.wav in one directory.
+
+    Bookkeeping happens on the event loop; file copies and deletes are
+    pushed to a thread. The LRU order is rebuilt from file mtimes on start.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int = CACHE_MAX_BYTES):
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0}
+        self._load()
+
+    def _load(self):
+        files = []
+        for entry in os.scandir(self.directory):
+            name, ext = os.path.splitext(entry.name)
+            if ext == ".wav" and is_cache_key(name):
+                st = entry.stat()
+                files.append((st.st_mtime, name, st.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._bytes += size
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"{key}.wav"
+
+    def lookup(self, key: str) -> Optional[Path]:
+        """Return the cached file and mark it recently used, or None"""
+        if key not in self._entries:
+            return None
+        self._entries.move_to_end(key)
+        self._stats["hits"] += 1
+        return self.path(key)
+
+    def _copy_in(self, key: str, source: Path) -> int:
+        target = self.path(key)
+        tmp = target.with_suffix(".tmp")
+        tmp.unlink(missing_ok=True)
+        try:
+            # Hardlink when possible: the Output/ file and the cache entry share blocks
+            os.link(source, tmp)
+        except OSError:
+            shutil.copyfile(source, tmp)
+        tmp.replace(target)
+        return target.stat().st_size
+
+    def _unlink(self, keys: list):
+        for key in keys:
+            self.path(key).unlink(missing_ok=True)
+            # Transcoded renditions (<key>.32k.opus, ...) go with their source
+            for rendition in self.directory.glob(f"{key}.*"):
+                rendition.unlink(missing_ok=True)
+
+    async def put(self, key: str, source: Path) -> Path:
+        """Admit a freshly generated file and evict least recently used entries over budget"""
+        size = await asyncio.to_thread(self._copy_in, key, source)
+        self._bytes += size - self._entries.pop(key, 0)
+        self._entries[key] = size
+
+        evicted = []
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            old_key, old_size = self._entries.popitem(last=False)
+            self._bytes -= old_size
+            evicted.append(old_key)
+        if evicted:
+            self._stats["evictions"] += len(evicted)
+            await asyncio.to_thread(self._unlink, evicted)
+        return self.path(key)
+
+    async def get_or_create(self, key: str, produce: Callable[[], Awaitable[Path]]) -> Tuple[Path, bool]:
+        """
+        Return (path, cached). On a miss `produce` generates the audio; concurrent
+        callers with the same key wait for that single generation instead of
+        running their own.
+        """
+        while True:
+            path = self.lookup(key)
+            if path is not None:
+                return path, True
+
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+
+            self._stats["coalesced"] += 1
+            try:
+                return await asyncio.shield(inflight), True
+            except ClientDisconnected:
+                # The leader's client left; try again, possibly as the new leader
+                continue
+
+        self._stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            path = await self.put(key, await produce())
+            future.set_result(path)
+            return path, False
+        except BaseException as e:
+            future.set_exception(ClientDisconnected() if isinstance(e, asyncio.CancelledError) else e)
+            # Mark retrieved so an error nobody waited on is not logged as unhandled
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+            "inflight": len(self._inflight),
+            **self._stats,
+        }
@@ -0,0 +1,422 @@
+"""
+Text Frontend - Vietnamese normalization ahead of the engine
+Works sentence by sentence with a shared LRU of results; pronunciation lexicons live in SQLite
+"""
+
+import os
+import re
+import json
+import time
+import inspect
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from api.db import connect, init_schema
+from api.segmenter import split_sentences
+
+TEXT_FRONTEND = os.getenv("VIENEU_TEXT_FRONTEND", "1") == "1"
+FRONTEND_CACHE_SIZE = int(os.getenv("VIENEU_FRONTEND_CACHE_SIZE", "10000"))
+LEXICON_MAX_ENTRIES = int(os.getenv("VIENEU_LEXICON_MAX_ENTRIES", "100000"))
+
+# Bump when the normalization rules change, so cached audio made with the old rules is not reused
+FRONTEND_VERSION = "3"
+
+# How often a process checks the database for lexicon changes made by other workers
+LEXICON_POLL_SECONDS = 2.0
+
+init_schema([
+    """
+    CREATE TABLE IF NOT EXISTS lexicons (
+        name TEXT PRIMARY KEY,
+        entries TEXT NOT NULL,
+        updated_at TEXT NOT NULL
+    )
+    """,
+])
+
+DIGITS = ("không", "một", "hai", "ba", "bốn", "năm", "sáu", "bảy", "tám", "chín")
+
+# Built-in abbreviations; user lexicons are applied on top and win on conflicts
+ABBREVIATIONS = {
+    "TP.HCM": "thành phố Hồ Chí Minh",
+    "TPHCM": "thành phố Hồ Chí Minh",
+    "HCM": "Hồ Chí Minh",
+    "TP.": "thành phố",
+    "HN": "Hà Nội",
+    "VN": "Việt Nam",
+    "v.v.": "vân vân",
+    "v/v": "về việc",
+    "PGS.TS.": "phó giáo sư tiến sĩ",
+    "PGS.": "phó giáo sư",
+    "GS.": "giáo sư",
+    "TS.": "tiến sĩ",
+    "ThS.": "thạc sĩ",
+    "BS.": "bác sĩ",
+    "UBND": "ủy ban nhân dân",
+    "THPT": "trung học phổ thông",
+    "THCS": "trung học cơ sở",
+    "ĐH": "đại học",
+    "SĐT": "số điện thoại",
+    "Q.": "quận",
+    "tr.": "trang",
+}
+
+UNITS = {
+    "km/h": "ki lô mét trên giờ",
+    "km": "ki lô mét",
+    "kg": "ki lô gam",
+    "cm": "xen ti mét",
+    "mm": "mi li mét",
+    "m2": "mét vuông",
+    "m²": "mét vuông",
+    "m": "mét",
+    "g": "gam",
+    "ml": "mi li lít",
+    "l": "lít",
+    "kw": "ki lô oát",
+}
+
+CURRENCIES = {"đ": "đồng", "đồng": "đồng", "vnđ": "đồng", "vnd": "đồng", "usd": "đô la", "$": "đô la", "€": "ơ rô", "eur": "ơ rô"}
+
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+_NUMBER = r"\d{1,3}(?:\.\d{3})+(?:,\d+)?|\d+(?:,\d+)?"
+_DATE = re.compile(r"\b(?:ngày\s+)?(\d{1,2})([/-])(\d{1,2})\2(\d{4})\b", re.IGNORECASE)
+_DAY_MONTH = re.compile(r"\b(ngày)\s+(\d{1,2})[/-](\d{1,2})\b", re.IGNORECASE)
+_MONTH_YEAR = re.compile(r"\b(tháng)\s+(\d{1,2})/(\d{4})\b", re.IGNORECASE)
+_TIME = re.compile(r"\b(\d{1,2})(?::|h|g)(\d{2})\b")
+_HOUR = re.compile(r"\b(\d{1,2})h\b")
+_CURRENCY_BEFORE = re.compile(rf"([$€])\s*({_NUMBER})")
+_CURRENCY_AFTER = re.compile(rf"({_NUMBER})\s*(vnđ|vnd|usd|eur|đồng|đ|\$|€)(?!\w)", re.IGNORECASE)
+_THOUSANDS = re.compile(r"\b(\d+)k\b", re.IGNORECASE)
+_PERCENT = re.compile(rf"({_NUMBER})\s*%")
+_UNIT = re.compile(rf"({_NUMBER})\s*({'|'.join(re.escape(u) for u in UNITS)})(?![\w/²])", re.IGNORECASE)
+_ORDINAL = re.compile(r"\b(thứ)\s+(\d+)\b", re.IGNORECASE)
+_RANGE = re.compile(r"\b(\d{1,4})\s*[-–]\s*(\d{1,4})\b")
+_NUMBER_TOKEN = re.compile(rf"(?<![\w.,])(?:{_NUMBER})(?![\w])")
+
+
+def _read_triple(n: int, full: bool) -> List[str]:
+    """0-999; `full` reads zero hundreds and "linh" as needed inside a larger number"""
+    hundreds, tens, units = n // 100, n // 10 % 10, n % 10
+    words = []
+    if full or hundreds:
+        words += [DIGITS[hundreds], "trăm"]
+    if tens == 0:
+        if units and (full or hundreds):
+            words.append("linh")
+    elif tens == 1:
+        words.append("mười")
+    else:
+        words += [DIGITS[tens], "mươi"]
+    if units:
+        if units == 1 and tens >= 2:
+            words.append("mốt")
+        elif units == 5 and tens >= 1:
+            words.append("lăm")
+        elif units == 4 and tens >= 2:
+            words.append("tư")
+        else:
+            words.append(DIGITS[units])
+    return words
+
+
+def read_integer(n: int) -> str:
+    """1234 -> "một nghìn hai trăm ba mươi tư" """
+    if n == 0:
+        return DIGITS[0]
+    groups = []
+    while n:
+        groups.append(n % 1000)
+        n //= 1000
+    words = []
+    for i in range(len(groups) - 1, -1, -1):
+        if groups[i] == 0:
+            continue
+        words += _read_triple(groups[i], full=i < len(groups) - 1)
+        scale = (("", "nghìn", "triệu")[i % 3] + " tỷ" * (i // 3)).strip()
+        if scale:
+            words.append(scale)
+    return " ".join(words)
+
+
+def read_digits(digits: str) -> str:
+    return " ".join(DIGITS[int(d)] for d in digits)
+
+
+def read_number(token: str) -> str:
+    """Vietnamese-formatted number (dot thousands, comma decimals); leading zeros read digit by digit"""
+    whole, _, fraction = token.replace(".", "").partition(",")
+    if (len(whole) > 1 and whole.startswith("0")) or len(whole) > 15:
+        spoken = read_digits(whole)
+    else:
+        spoken = read_integer(int(whole))
+    if fraction:
+        decimals = read_digits(fraction) if fraction.startswith("0") or len(fraction) > 3 else read_integer(int(fraction))
+        spoken += f" phẩy {decimals}"
+    return spoken
+
+
+def _month(m: int) -> str:
+    return "tư" if m == 4 else read_integer(m)
+
+
+def expand_numbers(text: str) -> str:
+    """Dates, times, currency, percentages, units, ordinals and plain numbers to words"""
+    def date(m):
+        day, month, year = int(m[1]), int(m[3]), int(m[4])
+        if not (1 <= day <= 31 and 1 <= month <= 12):
+            return m[0]
+        return f"ngày {read_integer(day)} tháng {_month(month)} năm {read_integer(year)}"
+
+    def day_month(m):
+        day, month = int(m[2]), int(m[3])
+        if not (1 <= day <= 31 and 1 <= month <= 12):
+            return m[0]
+        return f"{m[1]} {read_integer(day)} tháng {_month(month)}"
+
+    def month_year(m):
+        month = int(m[2])
+        if not 1 <= month <= 12:
+            return m[0]
+        return f"{m[1]} {_month(month)} năm {read_integer(int(m[3]))}"
+
+    def clock(m):
+        hour, minute = int(m[1]), int(m[2])
+        if hour > 24 or minute > 59:
+            return m[0]
+        return f"{read_integer(hour)} giờ" + (f" {read_integer(minute)} phút" if minute else "")
+
+    def number_range(m):
+        low, high = int(m[1]), int(m[2])
+        if low < high:
+            return f"{read_integer(low)} đến {read_integer(high)}"
+        # Not ascending, so "15-4" is a day and month rather than a range
+        if 1 <= low <= 31 and 1 <= high <= 12:
+            return f"{read_integer(low)} tháng {_month(high)}"
+        return m[0]
+
+    def ordinal(m):
+        n = int(m[2])
+        return f"{m[1]} " + {1: "nhất", 4: "tư"}.get(n, read_integer(n))
+
+    text = _DATE.sub(date, text)
+    text = _DAY_MONTH.sub(day_month, text)
+    text = _MONTH_YEAR.sub(month_year, text)
+    text = _TIME.sub(clock, text)
+    text = _HOUR.sub(lambda m: f"{read_integer(int(m[1]))} giờ", text)
+    # Symbols and units become words next to their number; the number itself is read last
+    text = _CURRENCY_BEFORE.sub(lambda m: f"{m[2]} {CURRENCIES[m[1]]}", text)
+    text = _CURRENCY_AFTER.sub(lambda m: f"{m[1]} {CURRENCIES[m[2].lower()]}", text)
+    text = _THOUSANDS.sub(lambda m: f"{m[1]} nghìn", text)
+    text = _PERCENT.sub(lambda m: f"{m[1]} phần trăm", text)
+    text = _UNIT.sub(lambda m: f"{m[1]} {UNITS[m[2].lower()]}", text)
+    text = _ORDINAL.sub(ordinal, text)
+    text = _RANGE.sub(number_range, text)
+    text = _NUMBER_TOKEN.sub(lambda m: read_number(m[0]), text)
+    return text.replace("&", " và ")
+
+
+class Lexicon:
+    """
+    Terms compiled to a dict keyed by their lowercased word/punctuation
+    tokens. Matching is greedy, longest term first, and only on whole
+    tokens, so lookup cost depends on the text length and the longest term,
+    not on how many terms there are. Spacing inside a term is not
+    significant ("TP. HCM" matches "TP.HCM").
+    """
+
+    def __init__(self, entries: Dict[str, str]):
+        self.entries: Dict[Tuple[str, ...], str] = {}
+        self.max_tokens = 0
+        for term, pronunciation in entries.items():
+            key = tuple(t.lower() for t in _TOKEN.findall(term))
+            if key:
+                self.entries[key] = pronunciation
+                self.max_tokens = max(self.max_tokens, len(key))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def apply(self, text: str) -> str:
+        if not self.entries:
+            return text
+        tokens = list(_TOKEN.finditer(text))
+        lowered = [t[0].lower() for t in tokens]
+        out, last, i = [], 0, 0
+        while i < len(tokens):
+            for length in range(min(self.max_tokens, len(tokens) - i), 0, -1):
+                replacement = self.entries.get(tuple(lowered[i:i + length]))
+                if replacement is not None:
+                    out.append(text[last:tokens[i].start()])
+                    out.append(replacement)
+                    last = tokens[i + length - 1].end()
+                    i += length
+                    break
+            else:
+                i += 1
+        out.append(text[last:])
+        return "".join(out)
+
+
+def normalize_sentence(sentence: str, lexicon: Lexicon) -> str:
+    return " ".join(expand_numbers(lexicon.apply(sentence)).split())
+
+
+# Lexicon storage (shared by all workers through the database)
+
+def _lexicon_versions(conn) -> List[tuple]:
+    return [tuple(r) for r in conn.execute("SELECT name, updated_at FROM lexicons ORDER BY name")]
+
+
+def list_lexicons(conn) -> List[dict]:
+    rows = conn.execute("SELECT name, entries, updated_at FROM lexicons ORDER BY name").fetchall()
+    return [{"name": r["name"], "entries": len(json.loads(r["entries"])), "updated_at": r["updated_at"]} for r in rows]
+
+
+def get_lexicon(conn, name: str) -> Optional[Dict[str, str]]:
+    row = conn.execute("SELECT entries FROM lexicons WHERE name = ?", (name,)).fetchone()
+    return json.loads(row["entries"]) if row else None
+
+
+def save_lexicon(conn, name: str, entries: Dict[str, str]):
+    """Store a lexicon (run through run_db; callers then refresh the frontend)"""
+    conn.execute(
+        "INSERT OR REPLACE INTO lexicons (name, entries, updated_at) VALUES (?, ?, ?)",
+        (name, json.dumps(entries, ensure_ascii=False), datetime.now().isoformat()),
+    )
+
+
+def delete_lexicon(conn, name: str) -> bool:
+    return bool(conn.execute("DELETE FROM lexicons WHERE name = ?", (name,)).rowcount)
+
+
+class TextFrontend:
+    """
+    Normalizes (lexicons, abbreviations, numbers) each sentence once. Results
+    are kept in an LRU of up to `max_entries` sentences shared by every
+    request in the process. The engine is then told to skip its own
+    normalizer (`skip_normalize=True`), so text is normalized exactly once.
+    Safe to call from several inference threads.
+    """
+
+    def __init__(self, max_entries: int = FRONTEND_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._lexicon = Lexicon(ABBREVIATIONS)
+        self._versions: Optional[List[tuple]] = None
+        self._fingerprint = FRONTEND_VERSION
+        self._checked_at = 0.0
+        self._skips_normalize: Dict[type, Tuple[bool, bool]] = {}
+        self._stats = {"requests": 0, "hits": 0, "misses": 0, "seconds_spent": 0.0}
+
+    def refresh(self, force: bool = False):
+        """Recompile lexicons when the database changed (checked at most every LEXICON_POLL_SECONDS)"""
+        if not force and time.monotonic() - self._checked_at < LEXICON_POLL_SECONDS:
+            return
+        with self._refresh_lock:
+            if not force and time.monotonic() - self._checked_at < LEXICON_POLL_SECONDS:
+                return
+            conn = connect()
+            versions = _lexicon_versions(conn)
+            if versions != self._versions:
+                merged = dict(ABBREVIATIONS)
+                for row in conn.execute("SELECT entries FROM lexicons ORDER BY name"):
+                    merged.update(json.loads(row["entries"]))
+                lexicon = Lexicon(merged)
+                digest = hashlib.sha256(json.dumps(versions).encode("utf-8")).hexdigest()[:12]
+                with self._lock:
+                    self._lexicon = lexicon
+                    self._versions = versions
+                    self._fingerprint = f"{FRONTEND_VERSION}|{digest}"
+                    # Sentences normalized with the old lexicons are stale
+                    self._entries.clear()
+            self._checked_at = time.monotonic()
+
+    def fingerprint(self) -> Optional[str]:
+        """Rules + lexicon version, part of synthesis cache keys; None when the frontend is off"""
+        if not TEXT_FRONTEND:
+            return None
+        self.refresh()
+        return self._fingerprint
+
+    def _engine_caps(self, tts) -> Tuple[bool, bool]:
+        """(infer takes skip_normalize, infer_batch takes skip_normalize) for this engine class"""
+        cls = type(tts)
+        caps = self._skips_normalize.get(cls)
+        if caps is None:
+            def takes_skip_normalize(name):
+                # Only a named parameter counts: some SDK engines pass skip_normalize on from **kwargs themselves
+                fn = getattr(tts, name, None)
+                try:
+                    return fn is not None and "skip_normalize" in inspect.signature(fn).parameters
+                except (TypeError, ValueError):
+                    return False
+            caps = self._skips_normalize[cls] = (takes_skip_normalize("infer"), takes_skip_normalize("infer_batch"))
+        return caps
+
+    def _sentence(self, sentence: str) -> str:
+        """Normalized sentence, through the cache"""
+        with self._lock:
+            normalized = self._entries.get(sentence)
+            if normalized is not None:
+                self._entries.move_to_end(sentence)
+                self._stats["hits"] += 1
+                return normalized
+            lexicon = self._lexicon
+
+        started = time.perf_counter()
+        normalized = normalize_sentence(sentence, lexicon)
+        cost = time.perf_counter() - started
+
+        with self._lock:
+            self._stats["misses"] += 1
+            self._stats["seconds_spent"] += cost
+            # A concurrent miss on the same sentence may have stored it already; either result is identical
+            self._entries[sentence] = normalized
+            self._entries.move_to_end(sentence)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return normalized
+
+    def normalize(self, text: str) -> str:
+        self.refresh()
+        normalized = [self._sentence(s) for s in split_sentences(text)]
+        with self._lock:
+            self._stats["requests"] += 1
+        return " ".join(normalized) if normalized else text
+
+    def infer_kwargs(self, tts, text: str) -> dict:
+        """`text` (and `skip_normalize`) to pass to tts.infer (blocking, runs on an inference worker)"""
+        if not TEXT_FRONTEND:
+            return {"text": text}
+        kwargs = {"text": self.normalize(text)}
+        if self._engine_caps(tts)[0]:
+            kwargs["skip_normalize"] = True
+        return kwargs
+
+    def batch_kwargs(self, tts, texts: List[str]) -> Tuple[List[str], dict]:
+        """(texts, extra kwargs) for tts.infer_batch"""
+        if not TEXT_FRONTEND:
+            return list(texts), {}
+        extra = {"skip_normalize": True} if self._engine_caps(tts)[1] else {}
+        return [self.normalize(text) for text in texts], extra
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries), max_entries=self.max_entries, lexicon_terms=len(self._lexicon))
+        stats["enabled"] = TEXT_FRONTEND
+        stats["hit_rate"] = round(stats["hits"] / (stats["hits"] + stats["misses"]), 3) if stats["hits"] + stats["misses"] else None
+        # Every hit saves what normalizing that sentence would have cost, estimated by the mean miss
+        saved = stats["hits"] * stats["seconds_spent"] / stats["misses"] if stats["misses"] else 0.0
+        stats["seconds_saved"] = round(saved, 6)
+        stats["saved_ms_per_request"] = round(saved / stats["requests"] * 1000, 3) if stats["requests"] else None
+        stats["seconds_spent"] = round(stats["seconds_spent"], 6)
+        return stats
+
+
+text_frontend = TextFrontend()
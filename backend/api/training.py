@@ -1,98 +1,96 @@
 """
 Training API Router - Fine-tuning management
+Jobs are queued persistently and run out of process (see api.training_runner)
 """
 
-import asyncio
-from pathlib import Path
+import shutil
 from typing import Optional
 from datetime import datetime
-from enum import Enum
 
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form, BackgroundTasks
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Header
 from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
-
-router = APIRouter()
-
-TRAINING_DIR = Path(__file__).parent.parent / "storage" / "training"
-TRAINING_DIR.mkdir(parents=True, exist_ok=True)
-
-
-class TrainingStatus(str, Enum):
-    IDLE = "idle"
-    PREPARING = "preparing"
-    TRAINING = "training"
-    COMPLETED = "completed"
-    ERROR = "error"
-    STOPPED = "stopped"
-
-
-class TrainingConfig(BaseModel):
-    base_model: str = "pnnbao-ump/VieNeu-TTS-0.3B"
-    max_steps: int = 5000
-    learning_rate: str = "2e-4"
-    batch_size: int = 4
 
+from api.log_broker import LogBroker
+from api.training_data import (
+    MAX_DATASET_BYTES,
+    MAX_METADATA_BYTES,
+    ZIP_MAGIC,
+    DatasetError,
+    save_upload,
+)
+from api.training_runner import (
+    TRAINING_DIR,
+    FINISHED_STATUSES,
+    TrainingConfig,
+    TrainingStatus,
+    TrainingSupervisor,
+)
 
-class TrainingJob(BaseModel):
-    id: str
-    status: TrainingStatus
-    config: TrainingConfig
-    progress: int = 0
-    current_step: int = 0
-    started_at: Optional[str] = None
-    completed_at: Optional[str] = None
-    error: Optional[str] = None
-
+router = APIRouter()
 
-# Current training job
-_current_job: Optional[TrainingJob] = None
-_training_logs: list = []
+training_logs = LogBroker()
+training_supervisor = TrainingSupervisor(training_logs)
 
 
 @router.get("/status")
 async def get_status():
-    """Get current training status"""
+    """Get current training status (the running job, else the most recent one)"""
+    job = training_supervisor.current
+    if job is None:
+        recent = await training_supervisor.list(limit=1)
+        job = recent[0] if recent else None
+    queued = await training_supervisor.queued()
     return {
-        "job": _current_job,
-        "logs_count": len(_training_logs),
+        "job": job,
+        "queue": [j.id for j in queued],
+        "logs_count": training_logs.next_id,
+        "metrics": training_logs.last_metric,
+        "log_broker": training_logs.stats(),
     }
 
 
 @router.post("/start")
 async def start_training(
-    background_tasks: BackgroundTasks,
     base_model: str = Form("pnnbao-ump/VieNeu-TTS-0.3B"),
     max_steps: int = Form(5000),
     learning_rate: str = Form("2e-4"),
     batch_size: int = Form(4),
     dataset: UploadFile = File(...),
     metadata: UploadFile = File(...),
+    dataset_sha256: Optional[str] = Form(None),
 ):
-    """Start a new training job"""
+    """
+    Queue a new training job; it starts when the jobs ahead of it finish.
     
-    global _current_job, _training_logs
+    Uploads are streamed to disk; pass `dataset_sha256` to have the archive
+    verified. Extraction and clip preprocessing happen in the training worker.
+    """
     
-    if _current_job and _current_job.status == TrainingStatus.TRAINING:
-        raise HTTPException(
-            status_code=400,
-            detail="A training job is already running"
-        )
+    try:
+        float(learning_rate)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="learning_rate must be a number")
     
     # Save uploaded files
     job_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+    suffix = 1
+    while (TRAINING_DIR / job_id).exists():
+        suffix += 1
+        job_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{suffix}"
     job_dir = TRAINING_DIR / job_id
     job_dir.mkdir(parents=True, exist_ok=True)
     
-    dataset_path = job_dir / "dataset.zip"
-    with open(dataset_path, "wb") as f:
-        content = await dataset.read()
-        f.write(content)
-    
-    metadata_path = job_dir / "metadata.csv"
-    with open(metadata_path, "wb") as f:
-        content = await metadata.read()
-        f.write(content)
+    try:
+        dataset_bytes, sha = await save_upload(dataset, job_dir / "dataset.zip", MAX_DATASET_BYTES, magic=ZIP_MAGIC)
+        if dataset_sha256 and dataset_sha256.lower() != sha:
+            raise DatasetError("dataset.zip checksum does not match dataset_sha256")
+        await save_upload(metadata, job_dir / "metadata.csv", MAX_METADATA_BYTES)
+    except DatasetError as e:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except BaseException:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise
     
     # Create job
     config = TrainingConfig(
@@ -101,110 +99,81 @@ async def start_training(
         learning_rate=learning_rate,
         batch_size=batch_size,
     )
+    job = await training_supervisor.submit(job_id, config, dataset_bytes=dataset_bytes, dataset_sha256=sha)
+    queue = [j.id for j in await training_supervisor.queued()]
     
-    _current_job = TrainingJob(
-        id=job_id,
-        status=TrainingStatus.PREPARING,
-        config=config,
-        started_at=datetime.now().isoformat(),
-    )
-    
-    _training_logs = [f"[{datetime.now().strftime('%H:%M:%S')}] Training job started"]
-    
-    # Start training in background
-    background_tasks.add_task(run_training, job_id, job_dir, config)
-    
-    return {"status": "started", "job_id": job_id}
+    return {
+        "status": "queued",
+        "job_id": job.id,
+        # 0 = next to run (or already picked up)
+        "position": queue.index(job.id) if job.id in queue else 0,
+    }
 
 
-async def run_training(job_id: str, job_dir: Path, config: TrainingConfig):
-    """Background training task"""
-    global _current_job, _training_logs
-    
-    try:
-        _current_job.status = TrainingStatus.TRAINING
-        _training_logs.append(f"[{datetime.now().strftime('%H:%M:%S')}] Preparing dataset...")
-        
-        # TODO: Actually run training using VieNeu finetune scripts
-        # For now, simulate progress
-        for step in range(0, config.max_steps, 100):
-            if _current_job.status == TrainingStatus.STOPPED:
-                break
-            
-            await asyncio.sleep(0.5)  # Simulate training time
-            _current_job.current_step = step
-            _current_job.progress = int((step / config.max_steps) * 100)
-            
-            if step % 500 == 0:
-                _training_logs.append(
-                    f"[{datetime.now().strftime('%H:%M:%S')}] Step {step}/{config.max_steps}"
-                )
-        
-        if _current_job.status != TrainingStatus.STOPPED:
-            _current_job.status = TrainingStatus.COMPLETED
-            _current_job.progress = 100
-            _current_job.completed_at = datetime.now().isoformat()
-            _training_logs.append(
-                f"[{datetime.now().strftime('%H:%M:%S')}] Training completed!"
-            )
-    
-    except Exception as e:
-        _current_job.status = TrainingStatus.ERROR
-        _current_job.error = str(e)
-        _training_logs.append(
-            f"[{datetime.now().strftime('%H:%M:%S')}] ERROR: {str(e)}"
-        )
+@router.get("/jobs")
+async def list_jobs(limit: int = 50):
+    """List training jobs, newest first"""
+    return {"jobs": await training_supervisor.list(limit=max(1, min(limit, 200)))}
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Get one training job"""
+    job = await training_supervisor.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.post("/jobs/{job_id}/resume")
+async def resume_job(job_id: str):
+    """Queue a stopped or failed job again; training continues from its last checkpoint"""
+    job = await training_supervisor.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status not in (TrainingStatus.STOPPED, TrainingStatus.ERROR):
+        raise HTTPException(status_code=400, detail=f"Job is {job.status.value}")
+    job = await training_supervisor.requeue(job)
+    return {"status": "queued", "job_id": job.id, "checkpoint_step": job.checkpoint_step}
 
 
 @router.post("/stop")
-async def stop_training():
-    """Stop the current training job"""
-    global _current_job, _training_logs
+async def stop_training(job_id: Optional[str] = None):
+    """Stop the running training job (or cancel a queued one with `job_id`)"""
     
-    if not _current_job or _current_job.status != TrainingStatus.TRAINING:
+    job = await training_supervisor.stop(job_id)
+    if job is None:
         raise HTTPException(status_code=400, detail="No training job running")
     
-    _current_job.status = TrainingStatus.STOPPED
-    _training_logs.append(
-        f"[{datetime.now().strftime('%H:%M:%S')}] Training stopped by user"
-    )
-    
-    return {"status": "stopped"}
+    return {"status": "stopping" if job.status not in FINISHED_STATUSES else job.status.value, "job_id": job.id}
 
 
 @router.get("/logs")
 async def get_logs(offset: int = 0):
-    """Get training logs"""
+    """Get training log lines from event id `offset` (pass back `total` to continue)"""
+    events = training_logs.since(offset)
     return {
-        "logs": _training_logs[offset:],
-        "total": len(_training_logs),
+        "logs": [e.message for e in events if e.type == "log"],
+        "total": training_logs.next_id,
+        "dropped": max(0, training_logs.first_id - offset),
     }
 
 
 @router.get("/logs/stream")
-async def stream_logs():
-    """Stream training logs via SSE"""
+async def stream_logs(last_event_id: Optional[int] = Header(None)):
+    """
+    Stream training logs via SSE.
+    
+    Text lines arrive as plain `data:` messages, progress as `event: metric`
+    JSON. Reconnecting clients resume after their `Last-Event-ID`.
+    """
     
     async def log_generator():
-        last_index = 0
-        while True:
-            if last_index < len(_training_logs):
-                for log in _training_logs[last_index:]:
-                    yield f"data: {log}\n\n"
-                last_index = len(_training_logs)
-            
-            await asyncio.sleep(0.5)
-            
-            # Stop streaming when training is done
-            if _current_job and _current_job.status in [
-                TrainingStatus.COMPLETED,
-                TrainingStatus.ERROR,
-                TrainingStatus.STOPPED,
-            ]:
-                yield f"data: [END]\n\n"
-                break
+        async for event in training_logs.subscribe(last_event_id):
+            yield event.sse() if event is not None else ": keep-alive\n\n"
     
     return StreamingResponse(
         log_generator(),
         media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
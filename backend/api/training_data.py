@@ -0,0 +1,272 @@
+"""
+Training Data - Streamed dataset uploads and parallel clip preprocessing
+Uploads are written in chunks on the API side; extraction and per-clip work run in the training worker
+"""
+
+import os
+import csv
+import json
+import time
+import wave
+import shutil
+import hashlib
+import zipfile
+import subprocess
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Tuple
+
+import aiofiles
+import numpy as np
+
+from api.audio import to_pcm16, trim_silence, write_wav
+
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+MAX_DATASET_BYTES = int(os.getenv("VIENEU_MAX_DATASET_BYTES", str(10 * 1024 ** 3)))
+MAX_EXTRACTED_BYTES = int(os.getenv("VIENEU_MAX_EXTRACTED_BYTES", str(40 * 1024 ** 3)))
+MAX_METADATA_BYTES = 64 * 1024 * 1024
+
+PREP_WORKERS = int(os.getenv("VIENEU_PREP_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+TARGET_SAMPLE_RATE = int(os.getenv("VIENEU_TRAINING_SAMPLE_RATE", "24000"))
+MIN_CLIP_SECONDS = float(os.getenv("VIENEU_TRAINING_MIN_SECONDS", "0.5"))
+MAX_CLIP_SECONDS = float(os.getenv("VIENEU_TRAINING_MAX_SECONDS", "20"))
+
+AUDIO_EXTENSIONS = {".wav", ".mp3", ".flac", ".ogg", ".m4a"}
+FFMPEG = os.getenv("VIENEU_FFMPEG", "ffmpeg")
+
+ZIP_MAGIC = b"PK\x03\x04"
+PROGRESS_INTERVAL = 0.5
+
+
+class DatasetError(ValueError):
+    pass
+
+
+async def save_upload(upload, path: Path, max_bytes: int, magic: Optional[bytes] = None) -> Tuple[int, str]:
+    """
+    Stream an upload to `path` in chunks, returning (size, sha256).
+
+    Size and leading magic bytes are checked as data arrives, so an oversized
+    or wrong-type upload is rejected without being stored in full.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(path, "wb") as f:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                if size == 0 and magic and not chunk.startswith(magic):
+                    raise DatasetError(f"{upload.filename} is not the expected file type")
+                size += len(chunk)
+                if size > max_bytes:
+                    raise DatasetError(f"{upload.filename} exceeds {max_bytes // (1024 * 1024)} MB")
+                digest.update(chunk)
+                await f.write(chunk)
+        if size == 0:
+            raise DatasetError(f"{upload.filename} is empty")
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    return size, digest.hexdigest()
+
+
+def extract_archive(zip_path: Path, dest: Path, max_bytes: int = MAX_EXTRACTED_BYTES) -> Dict[str, Path]:
+    """
+    Extract audio members one at a time (streamed, never whole files in memory).
+
+    Returns a lookup from both the member path and its basename to the
+    extracted file. Absolute or `..` member paths are rejected.
+    """
+    done_marker = dest / ".complete"
+    dest.mkdir(parents=True, exist_ok=True)
+    root = dest.resolve()
+
+    files: Dict[str, Path] = {}
+    with zipfile.ZipFile(zip_path) as archive:
+        members = [m for m in archive.infolist() if not m.is_dir() and Path(m.filename).suffix.lower() in AUDIO_EXTENSIONS]
+        if sum(m.file_size for m in members) > max_bytes:
+            raise DatasetError("Dataset expands beyond the extraction limit")
+
+        for member in members:
+            target = (dest / member.filename).resolve()
+            if not target.is_relative_to(root):
+                raise DatasetError(f"Unsafe path in archive: {member.filename}")
+            if not done_marker.exists():
+                target.parent.mkdir(parents=True, exist_ok=True)
+                with archive.open(member) as src, open(target, "wb") as dst:
+                    shutil.copyfileobj(src, dst, UPLOAD_CHUNK_BYTES)
+            relative = Path(member.filename).as_posix()
+            files[relative] = target
+            files.setdefault(Path(relative).name, target)
+
+    done_marker.touch()
+    return files
+
+
+def read_metadata(path: Path) -> List[Tuple[str, str]]:
+    """(audio file, transcript) rows from `file|text` or `file,text` metadata"""
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        sample = f.read(64 * 1024)
+        f.seek(0)
+        delimiter = "|" if "|" in sample else ("\t" if "\t" in sample else ",")
+        rows = []
+        for line_no, row in enumerate(csv.reader(f, delimiter=delimiter)):
+            if len(row) < 2 or not row[0].strip():
+                continue
+            name = row[0].strip()
+            # Header rows ("audio|text", "file,transcript", ...) name no audio file
+            if line_no == 0 and Path(name).suffix.lower() not in AUDIO_EXTENSIONS:
+                continue
+            rows.append((name, delimiter.join(row[1:]).strip()))
+    return rows
+
+
+def _decode_wav(path: Path) -> Tuple[np.ndarray, int]:
+    with wave.open(str(path), "rb") as f:
+        channels, width, rate = f.getnchannels(), f.getsampwidth(), f.getframerate()
+        raw = f.readframes(f.getnframes())
+    if width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif width == 3:
+        bytes3 = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+        ints = (bytes3[:, 0].astype(np.int32) | (bytes3[:, 1].astype(np.int32) << 8) | (bytes3[:, 2].astype(np.int32) << 16))
+        samples = np.where(ints >= 1 << 23, ints - (1 << 24), ints).astype(np.float32) / float(1 << 23)
+    elif width == 4:
+        samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / float(1 << 31)
+    else:
+        raise DatasetError(f"unsupported sample width {width}")
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return samples, rate
+
+
+def _decode_ffmpeg(path: Path, sample_rate: int) -> Tuple[np.ndarray, int]:
+    if shutil.which(FFMPEG) is None:
+        raise DatasetError("not a WAV file and ffmpeg is not installed")
+    result = subprocess.run(
+        [FFMPEG, "-hide_banner", "-loglevel", "error", "-i", str(path), "-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "pipe:1"],
+        capture_output=True,
+        check=False,
+    )
+    if result.returncode != 0:
+        raise DatasetError(result.stderr.decode(errors="replace").strip() or "ffmpeg could not decode the clip")
+    return np.frombuffer(result.stdout, dtype="<i2").astype(np.float32) / 32768.0, sample_rate
+
+
+def resample(audio: np.ndarray, source_rate: int, target_rate: int) -> np.ndarray:
+    """Linear-interpolation resampling (speech is band-limited well below 8 kHz)"""
+    if source_rate == target_rate or audio.size == 0:
+        return audio
+    length = int(round(audio.size * target_rate / source_rate))
+    positions = np.arange(length, dtype=np.float64) * (source_rate / target_rate)
+    return np.interp(positions, np.arange(audio.size), audio).astype(np.float32)
+
+
+def preprocess_clip(task: tuple) -> dict:
+    """Decode, resample, trim and check one clip (runs in a pool process)"""
+    index, name, source, target, text, sample_rate, min_seconds, max_seconds = task
+    result = {"index": index, "name": name, "text": text, "ok": False}
+    try:
+        if not text:
+            raise DatasetError("empty transcript")
+        if source is None:
+            raise DatasetError("audio file not in archive")
+        try:
+            audio, rate = _decode_wav(Path(source))
+        except (wave.Error, EOFError):
+            audio, rate = _decode_ffmpeg(Path(source), sample_rate)
+        audio = trim_silence(resample(audio, rate, sample_rate), sample_rate)
+        duration = audio.size / sample_rate
+        if duration < min_seconds:
+            raise DatasetError(f"too short after trimming ({duration:.2f}s)")
+        if duration > max_seconds:
+            raise DatasetError(f"too long ({duration:.1f}s > {max_seconds:.0f}s)")
+        peak = float(np.abs(audio).max())
+        if peak > 0.999:
+            # Leave headroom rather than reject: clipping in a few samples is common in scraped data
+            audio = audio * (0.95 / peak)
+        pcm = to_pcm16(audio)
+        write_wav(Path(target), [pcm], sample_rate)
+        # Content hash of the processed samples keys the shared feature cache
+        result.update(ok=True, duration=round(duration, 3), file=Path(target).name, sha=hashlib.sha256(pcm).hexdigest())
+    except (DatasetError, OSError, ValueError) as e:
+        result["reason"] = str(e)
+    return result
+
+
+def prepare_dataset(
+    job_dir: Path,
+    progress: Callable[[dict], None],
+    should_stop: Callable[[], bool] = lambda: False,
+    workers: int = PREP_WORKERS,
+) -> Optional[dict]:
+    """
+    Turn dataset.zip + metadata.csv into job_dir/clips/*.wav and a
+    prepared.jsonl manifest. Finished preparation is reused on resume;
+    returns the summary, or None if stopped.
+    """
+    summary_path = job_dir / "prepared.json"
+    if summary_path.exists():
+        summary = json.loads(summary_path.read_text(encoding="utf-8"))
+        progress({k: summary[k] for k in ("total", "done", "kept", "rejected", "seconds")})
+        return summary
+
+    raw_dir = job_dir / "raw"
+    clips_dir = job_dir / "clips"
+    clips_dir.mkdir(parents=True, exist_ok=True)
+
+    files = extract_archive(job_dir / "dataset.zip", raw_dir)
+    rows = read_metadata(job_dir / "metadata.csv")
+    if not rows:
+        raise DatasetError("metadata.csv has no `file|text` rows")
+
+    tasks = []
+    for index, (name, text) in enumerate(rows):
+        source = files.get(name) or files.get(Path(name).name) or files.get(f"{name}.wav")
+        target = clips_dir / f"{index:06d}.wav"
+        tasks.append((index, name, str(source) if source else None, str(target), text, TARGET_SAMPLE_RATE, MIN_CLIP_SECONDS, MAX_CLIP_SECONDS))
+
+    state = {"total": len(tasks), "done": 0, "kept": 0, "rejected": 0, "seconds": 0.0}
+    progress(dict(state))
+    results = []
+    last_report = time.monotonic()
+    # spawn, not fork: the worker has a thread blocked on stdin, which a forked child would deadlock on
+    with ProcessPoolExecutor(max_workers=max(1, workers), mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(preprocess_clip, task) for task in tasks]
+        try:
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                state["done"] += 1
+                if result["ok"]:
+                    state["kept"] += 1
+                    state["seconds"] = round(state["seconds"] + result["duration"], 3)
+                else:
+                    state["rejected"] += 1
+                if should_stop():
+                    return None
+                if time.monotonic() - last_report >= PROGRESS_INTERVAL:
+                    progress(dict(state))
+                    last_report = time.monotonic()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    results.sort(key=lambda r: r["index"])
+    with open(job_dir / "prepared.jsonl", "w", encoding="utf-8") as f:
+        for result in results:
+            if result["ok"]:
+                f.write(json.dumps({"audio": f"clips/{result['file']}", "text": result["text"], "duration": result["duration"], "sha": result["sha"]}, ensure_ascii=False) + "\n")
+    rejected = [{"name": r["name"], "reason": r["reason"]} for r in results if not r["ok"]]
+    summary = {**state, "rejected_examples": rejected[:50]}
+    summary_path.write_text(json.dumps(summary, ensure_ascii=False), encoding="utf-8")
+    shutil.rmtree(raw_dir, ignore_errors=True)
+    progress(dict(state))
+    if state["kept"] == 0:
+        raise DatasetError("no usable clips in dataset: " + "; ".join(f"{r['name']}: {r['reason']}" for r in rejected[:3]))
+    return summary
@@ -0,0 +1,424 @@
+"""
+Training Runner - Persistent job queue and supervisor for out-of-process fine-tuning
+Jobs live in SQLite; each one runs in an `api.training_worker` subprocess that reports over JSON lines
+"""
+
+import os
+import sys
+import json
+import asyncio
+import sqlite3
+from pathlib import Path
+from datetime import datetime
+from enum import Enum
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+from api.db import STORAGE_DIR, init_schema, run_db
+from api.log_broker import LogBroker, LogEvent
+
+BACKEND_DIR = Path(__file__).parent.parent
+TRAINING_DIR = STORAGE_DIR / "training"
+TRAINING_DIR.mkdir(parents=True, exist_ok=True)
+
+MAX_RESTARTS = int(os.getenv("VIENEU_TRAINING_MAX_RESTARTS", "2"))
+STOP_TIMEOUT = float(os.getenv("VIENEU_TRAINING_STOP_TIMEOUT", "30"))
+
+# Other API workers queue jobs and request stops through the database and job directory;
+# the leading worker checks for them this often
+POLL_SECONDS = 1.0
+STOP_REQUEST = "stop.request"
+JOURNAL = "events.jsonl"
+
+
+class TrainingStatus(str, Enum):
+    IDLE = "idle"
+    QUEUED = "queued"
+    PREPARING = "preparing"
+    TRAINING = "training"
+    COMPLETED = "completed"
+    ERROR = "error"
+    STOPPED = "stopped"
+
+
+ACTIVE_STATUSES = (TrainingStatus.PREPARING, TrainingStatus.TRAINING)
+FINISHED_STATUSES = (TrainingStatus.COMPLETED, TrainingStatus.ERROR, TrainingStatus.STOPPED)
+
+
+class TrainingConfig(BaseModel):
+    base_model: str = "pnnbao-ump/VieNeu-TTS-0.3B"
+    max_steps: int = 5000
+    learning_rate: str = "2e-4"
+    batch_size: int = 4
+
+
+class TrainingJob(BaseModel):
+    id: str
+    status: TrainingStatus
+    config: TrainingConfig
+    progress: int = 0
+    current_step: int = 0
+    checkpoint_step: Optional[int] = None
+    data_prep: Optional[dict] = None  # total/done/kept/rejected clips and kept seconds
+    features: Optional[dict] = None  # total/cached/encoded clips in the feature cache
+    dataset_bytes: Optional[int] = None
+    dataset_sha256: Optional[str] = None
+    restarts: int = 0
+    queued_at: Optional[str] = None
+    started_at: Optional[str] = None
+    completed_at: Optional[str] = None
+    error: Optional[str] = None
+
+
+init_schema([
+    """
+    CREATE TABLE IF NOT EXISTS training_jobs (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        id TEXT NOT NULL UNIQUE,
+        status TEXT NOT NULL,
+        data TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_training_jobs_status ON training_jobs (status, seq)",
+])
+
+
+def _save(conn: sqlite3.Connection, job: TrainingJob):
+    conn.execute(
+        """
+        INSERT INTO training_jobs (id, status, data) VALUES (?, ?, ?)
+        ON CONFLICT (id) DO UPDATE SET status = excluded.status, data = excluded.data
+        """,
+        (job.id, job.status.value, job.model_dump_json()),
+    )
+
+
+def _load(conn: sqlite3.Connection, job_id: str) -> Optional[TrainingJob]:
+    row = conn.execute("SELECT data FROM training_jobs WHERE id = ?", (job_id,)).fetchone()
+    return TrainingJob.model_validate_json(row["data"]) if row else None
+
+
+def _list(conn: sqlite3.Connection, statuses: Optional[List[str]] = None, limit: int = 100) -> List[TrainingJob]:
+    if statuses:
+        marks = ",".join("?" for _ in statuses)
+        rows = conn.execute(
+            f"SELECT data FROM training_jobs WHERE status IN ({marks}) ORDER BY seq LIMIT ?", (*statuses, limit)
+        ).fetchall()
+    else:
+        rows = conn.execute("SELECT data FROM training_jobs ORDER BY seq DESC LIMIT ?", (limit,)).fetchall()
+    return [TrainingJob.model_validate_json(row["data"]) for row in rows]
+
+
+def job_dir(job_id: str) -> Path:
+    return TRAINING_DIR / job_id
+
+
+class TrainingSupervisor:
+    """
+    Runs queued jobs one at a time, each in a supervised worker process.
+
+    The API process only reads worker output and updates job state, so it
+    stays responsive. A crashed worker is restarted from its last checkpoint
+    up to MAX_RESTARTS times; jobs interrupted by an API restart are requeued.
+    """
+
+    def __init__(self, logs: LogBroker):
+        self.logs = logs
+        self.current: Optional[TrainingJob] = None
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._follow_task: Optional[asyncio.Task] = None
+        self._stop_requested = False
+        self._shutting_down = False
+
+    async def get(self, job_id: str) -> Optional[TrainingJob]:
+        if self.current is not None and self.current.id == job_id:
+            return self.current
+        return await run_db(_load, job_id)
+
+    async def list(self, limit: int = 100) -> List[TrainingJob]:
+        jobs = await run_db(_list, None, limit)
+        if self.current is not None:
+            jobs = [self.current if j.id == self.current.id else j for j in jobs]
+        return jobs
+
+    async def queued(self) -> List[TrainingJob]:
+        return await run_db(_list, [TrainingStatus.QUEUED.value], 1000)
+
+    async def save(self, job: TrainingJob):
+        await run_db(_save, job)
+
+    async def submit(self, job_id: str, config: TrainingConfig, **fields) -> TrainingJob:
+        """Persist a new job (its files are already in job_dir) and queue it"""
+        (job_dir(job_id) / "config.json").write_text(config.model_dump_json(), encoding="utf-8")
+        job = TrainingJob(
+            id=job_id,
+            status=TrainingStatus.QUEUED,
+            config=config,
+            queued_at=datetime.now().isoformat(),
+            **fields,
+        )
+        await self.save(job)
+        self._wakeup.set()
+        return job
+
+    async def requeue(self, job: TrainingJob) -> TrainingJob:
+        """Queue a stopped or failed job again; it resumes from its last checkpoint"""
+        job.status = TrainingStatus.QUEUED
+        job.error = None
+        job.restarts = 0
+        job.queued_at = datetime.now().isoformat()
+        await self.save(job)
+        self._wakeup.set()
+        return job
+
+    async def stop(self, job_id: Optional[str] = None) -> Optional[TrainingJob]:
+        """Stop the running job (checkpointing first) or cancel a queued one"""
+        if self.current is not None and job_id in (None, self.current.id) and self._task is None:
+            # Running under the leading API worker, which picks this up
+            (job_dir(self.current.id) / STOP_REQUEST).touch()
+            return self.current
+        if self.current is not None and job_id in (None, self.current.id):
+            self._stop_requested = True
+            await self._signal_stop()
+            return self.current
+
+        job = await run_db(_load, job_id) if job_id else None
+        if job is None or job.status != TrainingStatus.QUEUED:
+            return None
+        job.status = TrainingStatus.STOPPED
+        job.completed_at = datetime.now().isoformat()
+        await self.save(job)
+        return job
+
+    async def _signal_stop(self):
+        process = self._process
+        if process is None or process.returncode is not None:
+            return
+        try:
+            process.stdin.write(b"stop\n")
+            await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+        async def escalate():
+            try:
+                await asyncio.wait_for(process.wait(), STOP_TIMEOUT)
+            except asyncio.TimeoutError:
+                print(f"[VieNeu] Training worker ignored stop for {STOP_TIMEOUT:.0f}s, killing it")
+                process.kill()
+
+        asyncio.ensure_future(escalate())
+
+    async def _recover(self):
+        """Jobs that were running when the API went down go back to the front of the queue"""
+        for job in await run_db(_list, [s.value for s in ACTIVE_STATUSES], 1000):
+            job.status = TrainingStatus.QUEUED
+            await self.save(job)
+            print(f"[VieNeu] Requeued interrupted training job {job.id}")
+
+    def _apply(self, job: TrainingJob, message: dict) -> bool:
+        """Apply one worker message; returns True when the job state should be persisted"""
+        kind = message.get("type")
+        if kind == "status":
+            job.status = TrainingStatus(message["status"])
+            if job.started_at is None:
+                job.started_at = datetime.now().isoformat()
+            return True
+        if kind == "log":
+            self.logs.log(message["message"])
+        elif kind == "metric":
+            step = message.get("step", job.current_step)
+            job.current_step = step
+            job.progress = min(100, int(step / job.config.max_steps * 100))
+            self.logs.metric(**{k: v for k, v in message.items() if k != "type"})
+            # Persisted so other API workers see progress
+            return True
+        elif kind == "prep":
+            job.data_prep = {k: v for k, v in message.items() if k != "type"}
+            # The worker sends these at most every PROGRESS_INTERVAL, so each one can be persisted
+            return True
+        elif kind == "features":
+            job.features = {k: v for k, v in message.items() if k != "type"}
+            return True
+        elif kind == "checkpoint":
+            job.checkpoint_step = message["step"]
+            self.logs.log(f"Checkpoint saved at step {message['step']}")
+            return True
+        elif kind == "error":
+            job.error = message.get("message")
+            self.logs.log(f"ERROR: {job.error}")
+        return False
+
+    async def _run_worker(self, job: TrainingJob) -> tuple:
+        """Run the worker once; returns (exit code, last message type)"""
+        self._process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "api.training_worker", str(job_dir(job.id)),
+            cwd=str(BACKEND_DIR),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+        )
+        if self._stop_requested:
+            await self._signal_stop()
+
+        last = None
+        async for raw in self._process.stdout:
+            line = raw.decode("utf-8", errors="replace").strip()
+            if not line:
+                continue
+            try:
+                message = json.loads(line)
+            except ValueError:
+                # Tracebacks and library output from the worker
+                self.logs.log(line)
+                continue
+            last = message.get("type")
+            if self._apply(job, message):
+                await self.save(job)
+        code = await self._process.wait()
+        self._process = None
+        return code, last
+
+    async def _watch_stop_request(self, job: TrainingJob):
+        request = job_dir(job.id) / STOP_REQUEST
+        while True:
+            await asyncio.sleep(POLL_SECONDS)
+            if request.exists():
+                request.unlink(missing_ok=True)
+                self._stop_requested = True
+                await self._signal_stop()
+
+    async def _run_job(self, job: TrainingJob):
+        self.current = job
+        self._stop_requested = False
+        (job_dir(job.id) / STOP_REQUEST).unlink(missing_ok=True)
+        self.logs.reset(journal=job_dir(job.id) / JOURNAL)
+        self.logs.log("Training job started" if job.checkpoint_step is None else "Training job resumed")
+        watcher = asyncio.ensure_future(self._watch_stop_request(job))
+        try:
+            await self._supervise(job)
+        finally:
+            watcher.cancel()
+
+    async def _supervise(self, job: TrainingJob):
+        while True:
+            code, last = await self._run_worker(job)
+
+            if self._shutting_down:
+                # Left active on purpose: requeued and resumed on the next start
+                await self.save(job)
+                return
+            if last == "done" and code == 0:
+                job.status = TrainingStatus.COMPLETED
+                job.progress = 100
+                self.logs.log("Training completed!")
+                break
+            if self._stop_requested or last == "stopped":
+                job.status = TrainingStatus.STOPPED
+                self.logs.log("Training stopped by user")
+                break
+            if last == "error" or job.restarts >= MAX_RESTARTS:
+                job.status = TrainingStatus.ERROR
+                job.error = job.error or f"Training worker exited with code {code}"
+                break
+
+            job.restarts += 1
+            self.logs.log(f"Training worker exited with code {code}; restarting from checkpoint ({job.restarts}/{MAX_RESTARTS})")
+            await self.save(job)
+
+        job.completed_at = datetime.now().isoformat()
+        await self.save(job)
+        self.logs.close()
+
+    async def _loop(self):
+        await self._recover()
+        while True:
+            self._wakeup.clear()
+            queued = await self.queued()
+            if not queued:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._run_job(queued[0])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[VieNeu] Training supervisor error: {e}")
+                job = queued[0]
+                job.status = TrainingStatus.ERROR
+                job.error = str(e)
+                await self.save(job)
+                self.logs.close()
+            finally:
+                self.current = None
+
+    def start(self):
+        """Start processing the queue (called from the app lifespan of the leading worker)"""
+        if self._follow_task is not None:
+            self._follow_task.cancel()
+            self._follow_task = None
+            self.current = None
+        if self._task is None:
+            self._shutting_down = False
+            self._task = asyncio.create_task(self._loop())
+
+    def follow(self):
+        """Mirror the job the leading worker runs, so this worker can report it (app lifespan)"""
+        if self._task is None and self._follow_task is None:
+            self._follow_task = asyncio.create_task(self._follow())
+
+    def _read_journal(self, job_id: str, offset: int) -> int:
+        """Replay complete journal lines from byte `offset`; returns the new offset"""
+        try:
+            with open(job_dir(job_id) / JOURNAL, "rb") as f:
+                if os.fstat(f.fileno()).st_size < offset:
+                    # Rewritten because the leader restarted the job
+                    offset = 0
+                    self.logs.reset()
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return offset
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            self.logs.replay(LogEvent.model_validate_json(line))
+        return offset + end
+
+    async def _follow(self):
+        following, offset = None, 0
+        while True:
+            active = await run_db(_list, [s.value for s in ACTIVE_STATUSES], 1)
+            job = active[0] if active else None
+            if job is not None and job.id != following:
+                following, offset = job.id, 0
+                self.logs.reset()
+            if following is not None:
+                offset = self._read_journal(following, offset)
+                if job is None:
+                    # Finished; the journal ended with its "end" event
+                    following = None
+            self.current = job
+            await asyncio.sleep(POLL_SECONDS)
+
+    async def shutdown(self):
+        """Checkpoint and stop the running worker without marking its job stopped"""
+        self._shutting_down = True
+        process = self._process
+        if process is not None:
+            await self._signal_stop()
+            try:
+                await asyncio.wait_for(process.wait(), STOP_TIMEOUT)
+            except asyncio.TimeoutError:
+                pass
+        tasks = [t for t in (self._task, self._follow_task) if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._follow_task = None
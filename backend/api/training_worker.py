@@ -0,0 +1,320 @@
+"""
+Training Worker - Runs one fine-tuning job in its own process
+Started by the training supervisor as `python -m api.training_worker <job_dir>`.
+
+IPC: JSON lines on stdout (status, log, prep, features, metric, checkpoint, done) and
+"stop" on stdin. A stop (or SIGTERM) saves a checkpoint before exiting,
+and a restarted worker resumes from the newest checkpoint in the job dir.
+Fine-tuning trains a LoRA adapter on the engine's PyTorch backbone (torch + peft);
+the finished adapter is written to <job_dir>/adapter.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import threading
+from pathlib import Path
+
+import numpy as np
+
+# The worker imports the VieNeu SDK itself (feature encoding), like main.py does
+VIENEU_PATH = Path(__file__).parent.parent.parent.parent / "VieNeu-TTS"
+sys.path.insert(0, str(VIENEU_PATH))
+
+from api.training_data import prepare_dataset
+from api.feature_cache import FeatureStore, encode_dataset, load_encoder
+
+CHECKPOINT_EVERY = max(1, int(os.getenv("VIENEU_TRAINING_CHECKPOINT_STEPS", "500")))
+KEEP_CHECKPOINTS = 2
+METRIC_EVERY = 10
+LORA_RANK = int(os.getenv("VIENEU_TRAINING_LORA_RANK", "16"))
+LORA_TARGETS = ["q_proj", "k_proj", "v_proj", "o_proj", "gate_proj", "up_proj", "down_proj"]
+IGNORE_INDEX = -100
+
+# Lower priority so a fine-tune on the same machine does not starve the API's inference threads
+WORKER_NICE = int(os.getenv("VIENEU_TRAINING_NICE", "10"))
+
+_stop = threading.Event()
+
+
+def emit(event_type: str, **fields):
+    sys.stdout.write(json.dumps({"type": event_type, **fields}) + "\n")
+    sys.stdout.flush()
+
+
+def _watch_stdin():
+    for line in sys.stdin:
+        if line.strip() == "stop":
+            _stop.set()
+            return
+    # Supervisor went away: stop instead of training unattended
+    _stop.set()
+
+
+def checkpoint_dir(job_dir: Path) -> Path:
+    return job_dir / "checkpoints"
+
+
+def latest_checkpoint(job_dir: Path):
+    """(next step, state) of the newest complete checkpoint, or None"""
+    steps = []
+    for path in checkpoint_dir(job_dir).glob("step_*/state.json"):
+        try:
+            steps.append((int(path.parent.name[5:]), path))
+        except ValueError:
+            continue
+    for step, path in sorted(steps, reverse=True):
+        try:
+            return step, json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+    return None
+
+
+def save_checkpoint(job_dir: Path, step: int, state: dict, write=None):
+    """Write state.json (and whatever `write(directory)` adds) as checkpoint `step`, atomically"""
+    target = checkpoint_dir(job_dir) / f"step_{step:07d}"
+    tmp = target.with_name(target.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    if write is not None:
+        write(tmp)
+    # state.json last: latest_checkpoint only trusts directories that have it
+    (tmp / "state.json").write_text(json.dumps(state), encoding="utf-8")
+    shutil.rmtree(target, ignore_errors=True)
+    tmp.rename(target)
+
+    old = sorted(p for p in checkpoint_dir(job_dir).glob("step_*") if not p.name.endswith(".tmp"))
+    for path in old[:-KEEP_CHECKPOINTS]:
+        shutil.rmtree(path, ignore_errors=True)
+    emit("checkpoint", step=step, path=str(target))
+
+
+def prepare(job_dir: Path, config: dict) -> bool:
+    """Extract and preprocess the dataset; False if stopped part-way"""
+    emit("status", status="preparing")
+    emit("log", message="Preparing dataset...")
+    for name in ("dataset.zip", "metadata.csv"):
+        if not (job_dir / name).exists():
+            raise FileNotFoundError(f"{name} missing from {job_dir}")
+
+    summary = prepare_dataset(job_dir, lambda state: emit("prep", **state), _stop.is_set)
+    if summary is None:
+        emit("stopped", step=0)
+        return False
+    emit(
+        "log",
+        message=f"Dataset ready: {summary['kept']} clips ({summary['seconds'] / 60:.1f} min), {summary['rejected']} rejected",
+    )
+    for example in summary.get("rejected_examples", [])[:5]:
+        emit("log", message=f"Skipped {example['name']}: {example['reason']}")
+    return True
+
+
+def encode_features(job_dir: Path, encoder) -> bool:
+    """Encode clips missing from the shared feature cache; False if stopped part-way"""
+    if encoder is None:
+        emit("log", message="Feature cache skipped: VieNeu SDK cannot pre-encode audio")
+        return True
+    emit("log", message="Encoding features...")
+    summary = encode_dataset(job_dir, lambda state: emit("features", **state), _stop.is_set, encoder)
+    if summary is None:
+        emit("stopped", step=0)
+        return False
+    emit("log", message=f"Features ready: {summary['cached']} clips from cache, {summary['encoded']} newly encoded")
+    return True
+
+
+def _load_engine():
+    from vieneu import Vieneu
+
+    return Vieneu()
+
+
+def _trainable_backbone(engine):
+    """The engine's PyTorch backbone, or an error naming what is missing"""
+    import torch
+
+    backbone = getattr(engine, "backbone", None)
+    # torch.compile wraps the model; train the original module
+    backbone = getattr(backbone, "_orig_mod", backbone)
+    if not isinstance(backbone, torch.nn.Module) or getattr(engine, "tokenizer", None) is None:
+        raise RuntimeError("This engine backend cannot be fine-tuned (needs the PyTorch backbone, not GGUF/ONNX)")
+    return backbone
+
+
+def _token(tokenizer, token: str) -> int:
+    return tokenizer.convert_tokens_to_ids(token)
+
+
+def build_example(engine, phonemes: str, codes) -> tuple:
+    """(input ids, labels) in the prompt layout the SDK's infer uses; only speech tokens are learned"""
+    tokenizer = engine.tokenizer
+    text_ids = tokenizer.encode(phonemes, add_special_tokens=False)
+    code_ids = tokenizer.encode("".join(f"<|speech_{int(c)}|>" for c in codes), add_special_tokens=False)
+    start, end = _token(tokenizer, "<|TEXT_PROMPT_START|>"), _token(tokenizer, "<|TEXT_PROMPT_END|>")
+    generation = _token(tokenizer, "<|SPEECH_GENERATION_START|>")
+    if getattr(engine, "use_chat_format", False):
+        ids = tokenizer.encode("user: Convert the text to speech:<|TEXT_REPLACE|>\nassistant:<|SPEECH_REPLACE|>")
+        at = ids.index(_token(tokenizer, "<|TEXT_REPLACE|>"))
+        ids = ids[:at] + [start] + text_ids + [end] + ids[at + 1:]
+        prompt = ids[:ids.index(_token(tokenizer, "<|SPEECH_REPLACE|>"))] + [generation]
+    else:
+        prompt = [start] + text_ids + [end, generation]
+    target = code_ids + [_token(tokenizer, "<|SPEECH_GENERATION_END|>")]
+    return prompt + target, [IGNORE_INDEX] * len(prompt) + target
+
+
+def load_examples(job_dir: Path, engine) -> list:
+    """Training examples for every prepared clip, with codec tokens from the feature cache when present"""
+    from vieneu_utils.phonemize_text import phonemize_with_dict
+
+    clips = [json.loads(line) for line in open(job_dir / "prepared.jsonl", encoding="utf-8") if line.strip()]
+    cached = None
+    if (job_dir / "features.json").exists():
+        meta = json.loads((job_dir / "features.json").read_text(encoding="utf-8"))
+        cached = (FeatureStore(meta["encoder"]), np.load(job_dir / "features.npy"), meta["features"].index("codes"))
+
+    examples = []
+    for i, clip in enumerate(clips):
+        codes = None
+        if cached is not None:
+            store, index, column = cached
+            shard, offset, length = (int(v) for v in index[i, column])
+            if length >= 0:
+                codes = store.view("codes", shard, offset, length)
+        if codes is None:
+            codes = engine.encode_reference(str(job_dir / clip["audio"]))
+            codes = engine.to_list(codes) if hasattr(engine, "to_list") else np.asarray(codes).ravel().tolist()
+        examples.append(build_example(engine, phonemize_with_dict(clip["text"]), codes))
+    return examples
+
+
+def _batch(examples: list, step: int, batch_size: int, pad_id: int, device):
+    """Batch `step` of a fixed per-epoch shuffle, so a resumed run sees the same order"""
+    import torch
+
+    epoch, position = divmod(step * batch_size, len(examples))
+    order = np.random.default_rng(epoch).permutation(len(examples))
+    picked = [examples[order[(position + k) % len(examples)]] for k in range(batch_size)]
+    width = max(len(ids) for ids, _ in picked)
+    ids = torch.full((len(picked), width), pad_id, dtype=torch.long)
+    labels = torch.full((len(picked), width), IGNORE_INDEX, dtype=torch.long)
+    mask = torch.zeros((len(picked), width), dtype=torch.long)
+    for row, (example_ids, example_labels) in enumerate(picked):
+        ids[row, :len(example_ids)] = torch.tensor(example_ids)
+        labels[row, :len(example_labels)] = torch.tensor(example_labels)
+        mask[row, :len(example_ids)] = 1
+    return ids.to(device), labels.to(device), mask.to(device)
+
+
+def train(job_dir: Path, config: dict, start_step: int, engine) -> bool:
+    try:
+        import torch
+        from peft import LoraConfig, get_peft_model, get_peft_model_state_dict, set_peft_model_state_dict
+    except ImportError as e:
+        raise RuntimeError(f"Fine-tuning needs torch, transformers and peft installed ({e})")
+
+    max_steps = config["max_steps"]
+    lr = float(config["learning_rate"])
+    batch_size = max(1, int(config.get("batch_size", 4)))
+    emit("status", status="training")
+
+    backbone = _trainable_backbone(engine)
+    examples = load_examples(job_dir, engine)
+    if not examples:
+        raise ValueError("No usable clips in the dataset")
+    emit("log", message=f"Training a rank-{LORA_RANK} LoRA on {len(examples)} clips")
+
+    targets = [t for t in LORA_TARGETS if any(name.endswith(t) for name, _ in backbone.named_modules())]
+    model = get_peft_model(backbone, LoraConfig(r=LORA_RANK, lora_alpha=2 * LORA_RANK, lora_dropout=0.05, target_modules=targets, task_type="CAUSAL_LM"))
+    optimizer = torch.optim.AdamW([p for p in model.parameters() if p.requires_grad], lr=lr)
+    device = next(model.parameters()).device
+    tokenizer = engine.tokenizer
+    pad_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+
+    resumed = latest_checkpoint(job_dir)
+    if start_step and resumed is not None:
+        directory = checkpoint_dir(job_dir) / f"step_{resumed[0]:07d}"
+        if (directory / "adapter.pt").exists():
+            set_peft_model_state_dict(model, torch.load(directory / "adapter.pt", map_location=device))
+            optimizer.load_state_dict(torch.load(directory / "optimizer.pt", map_location=device))
+
+    def checkpoint(next_step: int):
+        def write(directory: Path):
+            torch.save(get_peft_model_state_dict(model), directory / "adapter.pt")
+            torch.save(optimizer.state_dict(), directory / "optimizer.pt")
+        # Checkpoints are named by the next step to run
+        save_checkpoint(job_dir, next_step, {"next_step": next_step}, write)
+
+    model.train()
+    last_step, last_time = start_step, time.monotonic()
+    for step in range(start_step, max_steps):
+        if _stop.is_set():
+            checkpoint(step)
+            emit("stopped", step=step)
+            return False
+
+        ids, labels, mask = _batch(examples, step, batch_size, pad_id, device)
+        loss = model(input_ids=ids, attention_mask=mask, labels=labels).loss
+        loss.backward()
+        torch.nn.utils.clip_grad_norm_(model.parameters(), 1.0)
+        optimizer.step()
+        optimizer.zero_grad(set_to_none=True)
+
+        if (step + 1) % METRIC_EVERY == 0 or step + 1 == max_steps:
+            now = time.monotonic()
+            emit(
+                "metric",
+                step=step + 1,
+                loss=round(float(loss.detach()), 4),
+                lr=lr,
+                throughput=round((step + 1 - last_step) / (now - last_time), 2) if now > last_time else 0.0,
+            )
+            last_step, last_time = step + 1, now
+        if (step + 1) % 500 == 0:
+            emit("log", message=f"Step {step + 1}/{max_steps}")
+        # Any interval works, not only multiples of the metric interval
+        if (step + 1) // CHECKPOINT_EVERY > step // CHECKPOINT_EVERY and step + 1 < max_steps:
+            checkpoint(step + 1)
+
+    output = job_dir / "adapter"
+    model.save_pretrained(str(output))
+    emit("log", message=f"Adapter saved to {output}")
+    return True
+
+
+def main():
+    job_dir = Path(sys.argv[1])
+    config = json.loads((job_dir / "config.json").read_text(encoding="utf-8"))
+
+    if WORKER_NICE and hasattr(os, "nice"):
+        os.nice(WORKER_NICE)
+    signal.signal(signal.SIGTERM, lambda *_: _stop.set())
+    threading.Thread(target=_watch_stdin, daemon=True).start()
+
+    try:
+        if not prepare(job_dir, config):
+            return
+        encoder = load_encoder()
+        if not encode_features(job_dir, encoder):
+            return
+        # The feature encoder already loaded the engine; training reuses it
+        engine = encoder.engine if encoder is not None else _load_engine()
+        start_step = 0
+        resumed = latest_checkpoint(job_dir)
+        if resumed is not None:
+            start_step = resumed[1].get("next_step", resumed[0])
+            emit("log", message=f"Resuming from checkpoint at step {start_step}")
+        if train(job_dir, config, start_step, engine):
+            emit("done")
+    except Exception as e:
+        emit("error", message=str(e))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
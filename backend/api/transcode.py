@@ -0,0 +1,275 @@
+"""
+Audio Transcoding - Opus/MP3/FLAC delivery of generated WAV files via ffmpeg
+Transcodes run in ffmpeg subprocesses (off the event loop) and are cached next to their source
+"""
+
+import os
+import time
+import shutil
+import asyncio
+from pathlib import Path
+from typing import AsyncIterator, Dict, NamedTuple, Optional
+
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+
+from api.http_cache import cached_file_response
+from api.metrics import STAGE_SECONDS
+from api.synthesis_cache import is_cache_key
+
+FFMPEG = os.getenv("VIENEU_FFMPEG", "ffmpeg")
+TRANSCODE_WORKERS = int(os.getenv("VIENEU_TRANSCODE_WORKERS", "2"))
+
+STREAM_READ_BYTES = 16 * 1024
+
+
+class AudioFormat(NamedTuple):
+    name: str
+    extension: str
+    media_type: str
+    muxer: str
+    codec: str
+    default_bitrate: Optional[int]  # kbps; None for lossless
+
+
+FORMATS: Dict[str, AudioFormat] = {
+    "wav": AudioFormat("wav", "wav", "audio/wav", "wav", "pcm_s16le", None),
+    "flac": AudioFormat("flac", "flac", "audio/flac", "flac", "flac", None),
+    "mp3": AudioFormat("mp3", "mp3", "audio/mpeg", "mp3", "libmp3lame", 64),
+    "opus": AudioFormat("opus", "opus", "audio/ogg; codecs=opus", "ogg", "libopus", 32),
+}
+
+# Accept header media types -> format
+MEDIA_TYPES = {
+    "audio/wav": "wav",
+    "audio/wave": "wav",
+    "audio/x-wav": "wav",
+    "audio/flac": "flac",
+    "audio/x-flac": "flac",
+    "audio/mpeg": "mp3",
+    "audio/mp3": "mp3",
+    "audio/ogg": "opus",
+    "audio/opus": "opus",
+}
+
+SAMPLE_RATES = (8000, 12000, 16000, 22050, 24000, 44100, 48000)
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+MIN_BITRATE, MAX_BITRATE = 6, 320
+
+_semaphore: Optional[asyncio.Semaphore] = None
+_inflight: Dict[Path, asyncio.Future] = {}
+
+
+def transcoder_available() -> bool:
+    return shutil.which(FFMPEG) is not None
+
+
+def _require_transcoder():
+    if not transcoder_available():
+        raise HTTPException(status_code=501, detail="Compressed audio requires ffmpeg on the server")
+
+
+def negotiate_format(requested: Optional[str], accept: Optional[str]) -> str:
+    """
+    Pick the delivery format: an explicit `format` wins, otherwise the
+    highest-quality Accept entry we can produce. Plain WAV is the fallback.
+    """
+    if requested:
+        name = requested.lower()
+        if name not in FORMATS:
+            raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(FORMATS)}")
+        return name
+
+    if not accept or not transcoder_available():
+        return "wav"
+
+    best, best_q = "wav", 0.0
+    for part in accept.split(","):
+        media_type, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        name = MEDIA_TYPES.get(media_type.lower())
+        # Earlier entries win ties, as listed by the client
+        if name and q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def check_options(fmt: str, bitrate: Optional[int], sample_rate: Optional[int]):
+    """Validate bitrate (kbps) / sample rate for a format; raises 400"""
+    if bitrate is not None:
+        if FORMATS[fmt].default_bitrate is None:
+            raise HTTPException(status_code=400, detail=f"bitrate does not apply to {fmt}")
+        if not MIN_BITRATE <= bitrate <= MAX_BITRATE:
+            raise HTTPException(status_code=400, detail=f"bitrate must be {MIN_BITRATE}-{MAX_BITRATE} kbps")
+    if sample_rate is not None:
+        allowed = OPUS_SAMPLE_RATES if fmt == "opus" else SAMPLE_RATES
+        if sample_rate not in allowed:
+            raise HTTPException(status_code=400, detail=f"sample_rate for {fmt} must be one of {allowed}")
+
+
+def needs_transcode(fmt: str, sample_rate: Optional[int]) -> bool:
+    return fmt != "wav" or sample_rate is not None
+
+
+def transcoded_path(source: Path, fmt: str, bitrate: Optional[int] = None, sample_rate: Optional[int] = None) -> Path:
+    """Cache location next to the source, e.g. VieNeuStudio-123.32k.opus"""
+    audio_format = FORMATS[fmt]
+    parts = [source.stem]
+    bitrate = bitrate or audio_format.default_bitrate
+    if bitrate:
+        parts.append(f"{bitrate}k")
+    if sample_rate:
+        parts.append(f"{sample_rate}hz")
+    return source.with_name(".".join(parts) + f".{audio_format.extension}")
+
+
+def _encoder_args(fmt: str, bitrate: Optional[int], sample_rate: Optional[int]) -> list:
+    audio_format = FORMATS[fmt]
+    args = ["-vn", "-ac", "1", "-c:a", audio_format.codec]
+    bitrate = bitrate or audio_format.default_bitrate
+    if bitrate:
+        args += ["-b:a", f"{bitrate}k"]
+    if sample_rate:
+        args += ["-ar", str(sample_rate)]
+    elif fmt == "opus":
+        # libopus only accepts its native rates; the engine's 24 kHz is one of them
+        args += ["-ar", "24000"]
+    return args + ["-f", audio_format.muxer]
+
+
+async def _run_ffmpeg(source: Path, target: Path, fmt: str, bitrate: Optional[int], sample_rate: Optional[int]):
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(TRANSCODE_WORKERS)
+
+    tmp = target.with_name(f".{target.name}.tmp")
+    async with _semaphore:
+        started = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(
+            FFMPEG, "-hide_banner", "-loglevel", "error", "-y", "-i", str(source),
+            *_encoder_args(fmt, bitrate, sample_rate), str(tmp),
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            _, stderr = await process.communicate()
+        except asyncio.CancelledError:
+            process.kill()
+            tmp.unlink(missing_ok=True)
+            raise
+        STAGE_SECONDS.observe(time.perf_counter() - started, "encode")
+    if process.returncode != 0:
+        tmp.unlink(missing_ok=True)
+        raise RuntimeError(f"ffmpeg failed ({process.returncode}): {stderr.decode(errors='replace').strip()}")
+    tmp.replace(target)
+
+
+async def transcode(source: Path, fmt: str, bitrate: Optional[int] = None, sample_rate: Optional[int] = None) -> Path:
+    """Return the source in `fmt`, transcoding once and reusing the file afterwards"""
+    if not needs_transcode(fmt, sample_rate):
+        return source
+    _require_transcoder()
+
+    target = transcoded_path(source, fmt, bitrate, sample_rate)
+    if target.exists() and target.stat().st_mtime >= source.stat().st_mtime:
+        return target
+
+    # Concurrent requests for the same rendition share one ffmpeg run
+    inflight = _inflight.get(target)
+    if inflight is not None:
+        return await asyncio.shield(inflight)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[target] = future
+    try:
+        await _run_ffmpeg(source, target, fmt, bitrate, sample_rate)
+        future.set_result(target)
+        return target
+    except BaseException as e:
+        future.set_exception(e if isinstance(e, Exception) else RuntimeError("Transcode cancelled"))
+        future.exception()
+        raise
+    finally:
+        _inflight.pop(target, None)
+
+
+async def encode_stream(
+    pcm_chunks: AsyncIterator[bytes],
+    input_rate: int,
+    fmt: str,
+    bitrate: Optional[int] = None,
+    sample_rate: Optional[int] = None,
+) -> AsyncIterator[bytes]:
+    """Pipe PCM16 mono chunks through ffmpeg and yield the encoded stream as it is produced"""
+    _require_transcoder()
+    process = await asyncio.create_subprocess_exec(
+        FFMPEG, "-hide_banner", "-loglevel", "error",
+        "-f", "s16le", "-ar", str(input_rate), "-ac", "1", "-i", "pipe:0",
+        *_encoder_args(fmt, bitrate, sample_rate), "-flush_packets", "1", "pipe:1",
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+
+    async def feed():
+        try:
+            async for chunk in pcm_chunks:
+                process.stdin.write(chunk)
+                await process.stdin.drain()
+        finally:
+            process.stdin.close()
+
+    feeder = asyncio.ensure_future(feed())
+    try:
+        while True:
+            data = await process.stdout.read(STREAM_READ_BYTES)
+            if not data:
+                break
+            yield data
+        await feeder
+        await process.wait()
+    finally:
+        if not feeder.done():
+            feeder.cancel()
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+
+
+async def audio_response(
+    request: Request,
+    source: Path,
+    download_name: str,
+    fmt: str,
+    bitrate: Optional[int] = None,
+    sample_rate: Optional[int] = None,
+    negotiated: bool = False,
+) -> Response:
+    """Cacheable file response for `source` in the requested format"""
+    check_options(fmt, bitrate, sample_rate)
+    try:
+        path = await transcode(source, fmt, bitrate, sample_rate)
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return await cached_file_response(
+        request,
+        path,
+        media_type=FORMATS[fmt].media_type,
+        filename=f"{download_name}.{FORMATS[fmt].extension}",
+        # Synthesis cache entries are content-addressed and never rewritten
+        immutable=is_cache_key(source.stem),
+        headers={"Vary": "Accept"} if negotiated else None,
+    )
+
+
+def remove_renditions(source: Path):
+    """Delete cached transcodes of a source file"""
+    for path in source.parent.glob(f"{source.stem}.*"):
+        if path != source and path.suffix[1:] in {f.extension for f in FORMATS.values()}:
+            path.unlink(missing_ok=True)
@@ -4,26 +4,94 @@ Supports both real VieNeu SDK and demo mode
 """
 
 import os
-import uuid
+import re
+import sys
+import json
+import time
+import importlib
+import functools
+import itertools
 import random
+import asyncio
+import threading
+from collections import deque
 from pathlib import Path
 from datetime import datetime
+from typing import Dict, Optional
 
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
+from api.db import run_db
+from api.inference import InferencePool, PoolSaturated, run_inference, inference_http_errors
+from api.inference_server import INFERENCE_SOCKETS, RemoteInferencePool
+from api.batching import MicroBatcher
+from api.audio import audio_seconds, to_pcm16, engine_sample_rate, wav_header, write_wav
+from api.metrics import STAGE_SECONDS, registry, stage_timer, observe_synthesis
+from api.segmenter import ClauseBuffer, split_clauses
+from api.text_frontend import text_frontend, list_lexicons, get_lexicon, save_lexicon, delete_lexicon, LEXICON_MAX_ENTRIES
+from api.synthesis_cache import MODEL_VERSION, SynthesisCache, cache_key, is_cache_key
+from api.shared_weights import MMAP_WEIGHTS, map_weights, shared_memory
+from api.engine_backends import backend_fingerprint, build_engine, configure_cpu, cpu_settings, get_backend
+from api.models import get_active_model_id, resolve_adapter, resolve_adapter_async
+from api.adapters import adapter_manager
+from api.history import HistoryItem, add_to_history
+from api.output_index import OutputIndex
+from api.transcode import (
+    FORMATS,
+    audio_response,
+    check_options,
+    encode_stream,
+    negotiate_format,
+    needs_transcode,
+    transcode,
+    transcoder_available,
+)
+from api.voices import (
+    reference_cache,
+    reference_infer_kwargs,
+    save_reference_upload,
+    register_voice,
+    get_voice,
+    list_registered_voices,
+    delete_voice,
+    voice_ref_path,
+)
+
 router = APIRouter()
 
 # Output folder - relative to project root
 PROJECT_ROOT = Path(__file__).parent.parent.parent
-OUTPUT_DIR = PROJECT_ROOT / "Output"
+OUTPUT_DIR = Path(os.getenv("VIENEU_OUTPUT_DIR", str(PROJECT_ROOT / "Output")))
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+output_index = OutputIndex(OUTPUT_DIR)
+
+# Clauses synthesized ahead of the one currently being streamed
+STREAM_LOOKAHEAD = int(os.getenv("VIENEU_STREAM_LOOKAHEAD", "2"))
+
+# Engine implementation; the benchmark swaps in bench.stand_in:Vieneu
+DEFAULT_ENGINE_CLASS = "vieneu:Vieneu"
+ENGINE_CLASS = os.getenv("VIENEU_ENGINE", DEFAULT_ENGINE_CLASS)
+
+# Syntheses run after loading so kernels and buffers are allocated before real traffic
+WARMUP_RUNS = int(os.getenv("VIENEU_WARMUP_RUNS", "2"))
+WARMUP_TEXT = "Xin chào, đây là câu khởi động hệ thống."
+
+LEXICON_NAME = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+# How often API workers refresh engine state from the inference servers
+SERVER_POLL_SECONDS = 2.0
 
 
 class TTSRequest(BaseModel):
     text: str
     voice_id: str = "ngoc-huyen"
+    streaming: bool = False
+    stream_format: str = "wav"  # "wav" (streaming header) or "pcm" (raw 16-bit frames)
+    format: str = "wav"  # delivery format: wav, flac, mp3 or opus
+    bitrate: Optional[int] = None  # kbps, mp3/opus only
+    sample_rate: Optional[int] = None
 
 
 class TTSResponse(BaseModel):
@@ -35,11 +103,41 @@ class TTSResponse(BaseModel):
     duration: float
     created_at: str
     demo_mode: bool = False
+    cached: bool = False
+
+
+class LexiconRequest(BaseModel):
+    entries: Dict[str, str]  # written form -> how to say it (plain Vietnamese spelling)
+
+
+class EngineUnavailable(Exception):
+    """Raised when the VieNeu engine could not produce audio"""
 
 
 # TTS engine singleton
 _tts_engine = None
+_tts_engine_lock = threading.Lock()
 _sdk_available = None
+_warmup_pending = False
+
+# Engine lifecycle: idle -> loading -> warming -> ready (or failed / unavailable)
+engine_status = {
+    "state": "idle",
+    "device": None,
+    "load_seconds": None,
+    "warmup_seconds": None,
+    "loaded_at": None,
+    "error": None,
+    "weights": None,  # memory-mapped weight files, with VIENEU_MMAP_WEIGHTS=1
+    "backend": None,  # VIENEU_ENGINE_BACKEND preset: precision and checkpoints
+    "cpu": None,  # core pinning and thread pool sizes
+}
+
+
+def engine_class():
+    """Engine class named by VIENEU_ENGINE (`module:Class`)"""
+    module, _, name = ENGINE_CLASS.partition(":")
+    return getattr(importlib.import_module(module), name or "Vieneu")
 
 
 def check_sdk_available():
@@ -47,10 +145,10 @@ def check_sdk_available():
     global _sdk_available
     if _sdk_available is None:
         try:
-            from vieneu import Vieneu
+            engine_class()
             _sdk_available = True
-            print("[VieNeu] SDK found!")
-        except ImportError as e:
+            print("[VieNeu] SDK found!" if ENGINE_CLASS == DEFAULT_ENGINE_CLASS else f"[VieNeu] Using engine {ENGINE_CLASS}")
+        except (ImportError, AttributeError) as e:
             _sdk_available = False
             print(f"[VieNeu] SDK not available: {e}")
     return _sdk_available
@@ -61,21 +159,787 @@ def get_tts_engine():
     global _tts_engine
     
     if not check_sdk_available():
+        engine_status["state"] = "unavailable"
         return None
     
-    if _tts_engine is None:
-        try:
-            from vieneu import Vieneu
-            print("[VieNeu] Initializing engine (this may take a while)...")
-            _tts_engine = Vieneu()
-            print("[VieNeu] Engine loaded successfully!")
-        except Exception as e:
-            print(f"[VieNeu] Error loading engine: {e}")
-            return None
+    # Inference workers may race here on the first requests
+    with _tts_engine_lock:
+        if _tts_engine is None:
+            try:
+                Vieneu = engine_class()
+                backend = get_backend()
+                if cpu_settings["group"] is None:
+                    configure_cpu()
+                print(f"[VieNeu] Initializing engine with the {backend.name} backend (this may take a while)...")
+                engine_status.update(state="loading", error=None, backend=backend.describe(), cpu=dict(cpu_settings))
+                started = time.monotonic()
+                _tts_engine = build_engine(Vieneu, backend)
+                if MMAP_WEIGHTS and backend.shares_weights:
+                    # Before any adapter loads, so only the base weights are shared
+                    engine_status["weights"] = map_weights(_tts_engine, "|".join(filter(None, (MODEL_VERSION, backend_fingerprint()))))
+                engine_status.update(
+                    state="warming" if _warmup_pending else "ready",
+                    device=engine_device(_tts_engine),
+                    load_seconds=round(time.monotonic() - started, 2),
+                    loaded_at=datetime.now().isoformat(),
+                )
+                print(f"[VieNeu] Engine loaded successfully! ({engine_status['load_seconds']}s)")
+            except Exception as e:
+                print(f"[VieNeu] Error loading engine: {e}")
+                engine_status.update(state="failed", error=str(e))
+                return None
     
     return _tts_engine
 
 
+def engine_device(tts) -> str:
+    """Best-effort name of the device the engine runs on"""
+    device = getattr(tts, "device", None)
+    if device is not None:
+        return str(device)
+    return "cuda" if gpu_available() else "cpu"
+
+
+def gpu_available() -> bool:
+    try:
+        import torch
+        return torch.cuda.is_available()
+    except ImportError:
+        return False
+
+
+def memory_usage() -> dict:
+    """Resident (and shared) memory of this process and, when present, GPU memory held by torch"""
+    usage = {"rss_bytes": None, **shared_memory(), "gpu_allocated_bytes": None}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    usage["rss_bytes"] = int(line.split()[1]) * 1024
+                    break
+    except OSError:
+        try:
+            import resource
+            usage["rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        except ImportError:
+            pass
+    
+    if engine_status["device"] and engine_status["device"].startswith("cuda"):
+        try:
+            import torch
+            usage["gpu_allocated_bytes"] = torch.cuda.memory_allocated()
+        except Exception:
+            pass
+    return usage
+
+
+def warm_up_engine(tts) -> bool:
+    """Run a few throwaway syntheses so the first real request is not slow (blocking)"""
+    if tts is None:
+        return False
+    
+    engine_status["state"] = "warming"
+    started = time.monotonic()
+    # Warming on the active adapter also makes it resident before traffic arrives
+    with adapter_manager.use(tts, get_active_model_id()):
+        for _ in range(WARMUP_RUNS):
+            tts.infer(text=WARMUP_TEXT)
+    engine_status.update(state="ready", warmup_seconds=round(time.monotonic() - started, 2))
+    print(f"[VieNeu] Engine warmed up ({engine_status['warmup_seconds']}s)")
+    return True
+
+
+async def start_engine():
+    """Load and warm the engine in the background (called from the app lifespan)"""
+    global _warmup_pending
+    if INFERENCE_SOCKETS:
+        await watch_inference_servers()
+        return
+    _warmup_pending = True
+    try:
+        await inference_pool.submit(warm_up_engine, timeout=3600)
+    except Exception as e:
+        print(f"[VieNeu] Warm-up failed: {e}")
+        engine_status.update(state="failed", error=str(e))
+    finally:
+        _warmup_pending = False
+
+
+def load_and_warm():
+    """start_engine for the inference server process, which has no event loop (blocking)"""
+    global _warmup_pending
+    _warmup_pending = True
+    try:
+        warm_up_engine(get_tts_engine())
+    except Exception as e:
+        print(f"[VieNeu] Warm-up failed: {e}")
+        engine_status.update(state="failed", error=str(e))
+    finally:
+        _warmup_pending = False
+
+
+async def watch_inference_servers():
+    """Mirror the inference servers' engine state into engine_status, for as long as the app runs"""
+    while True:
+        replies = await asyncio.to_thread(inference_pool.broadcast, ("status",))
+        inference_pool.servers = replies
+        engines = [r["engine"] for r in replies if r is not None]
+        ready = [e for e in engines if e["state"] == "ready"]
+        if ready or engines:
+            engine_status.update((ready or engines)[0])
+        else:
+            engine_status.update(state="unavailable", error="No inference server is reachable")
+        await asyncio.sleep(SERVER_POLL_SECONDS)
+
+
+def engine_ready() -> bool:
+    return engine_status["state"] == "ready"
+
+
+# All engine calls go through this pool so synthesis never blocks the event loop;
+# with inference servers configured the pool forwards them instead of loading the model here
+inference_pool = RemoteInferencePool(INFERENCE_SOCKETS) if INFERENCE_SOCKETS else InferencePool(get_tts_engine)
+
+
+def synthesize_to_file(tts, text: str, audio_path: Path, voice_id: str = None, **infer_kwargs) -> bool:
+    """Run inference and write the WAV (blocking, runs on an inference worker)"""
+    if tts is None:
+        return False
+    
+    with adapter_manager.use(tts, resolve_adapter(voice_id)):
+        with stage_timer("preprocess"):
+            kwargs = {**voice_infer_kwargs(tts, voice_id), **infer_kwargs} if voice_id else infer_kwargs
+            prepared = text_frontend.infer_kwargs(tts, text)
+        started = time.perf_counter()
+        audio = tts.infer(**prepared, **kwargs)
+        inference_seconds = time.perf_counter() - started
+    STAGE_SECONDS.observe(inference_seconds, "inference")
+    with stage_timer("file_write"):
+        tts.save(audio, str(audio_path))
+    observe_synthesis(voice_id, len(text), audio_seconds(audio, engine_sample_rate(tts)), inference_seconds)
+    return True
+
+
+def voice_infer_kwargs(tts, voice_id: str) -> dict:
+    """Extra engine kwargs for a voice; registered voices clone from their stored reference"""
+    voice = get_voice(voice_id)
+    if voice is None:
+        return {}
+    return reference_infer_kwargs(tts, voice_ref_path(voice), voice.ref_sha, voice.ref_text)
+
+
+def synthesize_batch_to_files(tts, voice_id: str, jobs: list) -> list:
+    """Batched synthesize_to_file for the micro-batcher; jobs are (text, audio_path)"""
+    if tts is None:
+        return [False] * len(jobs)
+    
+    texts = [text for text, _ in jobs]
+    with adapter_manager.use(tts, resolve_adapter(voice_id)):
+        with stage_timer("preprocess"):
+            kwargs = voice_infer_kwargs(tts, voice_id)
+            infer_batch = getattr(tts, "infer_batch", None)
+            if infer_batch is not None and len(texts) > 1:
+                prepared, extra = text_frontend.batch_kwargs(tts, texts)
+            else:
+                prepared = [text_frontend.infer_kwargs(tts, text) for text in texts]
+        started = time.perf_counter()
+        if infer_batch is not None and len(texts) > 1:
+            audios = infer_batch(prepared, **extra, **kwargs)
+        else:
+            audios = [tts.infer(**p, **kwargs) for p in prepared]
+        inference_seconds = time.perf_counter() - started
+    STAGE_SECONDS.observe(inference_seconds, "inference")
+    
+    sample_rate = engine_sample_rate(tts)
+    durations = [audio_seconds(audio, sample_rate) for audio in audios]
+    for audio, text, duration, (_, audio_path) in zip(audios, texts, durations, jobs):
+        with stage_timer("file_write"):
+            tts.save(audio, str(audio_path))
+        # A batch shares one inference call; each row is charged its share by audio length
+        share = inference_seconds * duration / sum(durations) if sum(durations) else 0.0
+        observe_synthesis(voice_id, len(text), duration, share)
+    return [True] * len(jobs)
+
+
+# Concurrent /generate requests for the same voice share one inference call
+generate_batcher = MicroBatcher(inference_pool, synthesize_batch_to_files)
+
+# Identical requests are served from here instead of re-running the model
+synthesis_cache = SynthesisCache(OUTPUT_DIR / "cache")
+
+
+def _torch_threads():
+    # Only report torch when the engine already imported it
+    torch = sys.modules.get("torch")
+    return torch.get_num_threads() if torch is not None else None
+
+
+registry.gauge(
+    "vieneu_cache_lookups_total", "Synthesis cache lookups by result",
+    lambda: [((k,), synthesis_cache.stats()[k]) for k in ("hits", "misses", "coalesced")],
+    ("result",), kind="counter",
+)
+registry.gauge("vieneu_cache_bytes", "Bytes held by the synthesis cache", lambda: [((), synthesis_cache.stats()["bytes"])])
+registry.gauge(
+    "vieneu_adapter_events_total", "LoRA adapter residency events",
+    lambda: [((k,), adapter_manager.stats()[k]) for k in ("swaps", "loads", "evictions", "hits")],
+    ("event",), kind="counter",
+)
+registry.gauge(
+    "vieneu_frontend_sentences_total", "Text frontend sentence lookups by result",
+    lambda: [((k,), text_frontend.stats()[k]) for k in ("hits", "misses")],
+    ("result",), kind="counter",
+)
+registry.gauge(
+    "vieneu_frontend_seconds_total", "Text frontend wall time spent normalizing cache misses",
+    lambda: [((), text_frontend.stats()["seconds_spent"])], kind="counter",
+)
+registry.gauge(
+    "vieneu_frontend_seconds_saved_total", "Text frontend wall time saved by cache hits (hits x mean miss cost)",
+    lambda: [((), text_frontend.stats()["seconds_saved"])], kind="counter",
+)
+registry.gauge(
+    "vieneu_frontend_saved_ms_per_request", "Text frontend wall time saved per request by cache hits",
+    lambda: [((), text_frontend.stats()["saved_ms_per_request"] or 0.0)],
+)
+registry.gauge(
+    "vieneu_inference_jobs", "Inference pool jobs by state",
+    lambda: [((k,), inference_pool.stats()[k]) for k in ("running", "queued")],
+    ("state",),
+)
+registry.gauge(
+    "vieneu_inference_jobs_total", "Finished inference pool jobs by outcome",
+    lambda: [((k,), inference_pool.stats()[k]) for k in ("completed", "failed", "rejected", "timed_out", "cancelled")],
+    ("outcome",), kind="counter",
+)
+registry.gauge(
+    "vieneu_memory_bytes", "Process resident memory and GPU memory held by torch",
+    lambda: [((k.rsplit("_bytes", 1)[0],), v) for k, v in memory_usage().items()],
+    ("kind",),
+)
+registry.gauge(
+    "vieneu_threads", "Python threads, inference workers and torch intra-op threads",
+    lambda: [(("python",), threading.active_count()), (("inference_workers",), inference_pool.workers), (("torch",), _torch_threads())],
+    ("kind",),
+)
+
+
+async def record_history(response: TTSResponse):
+    """Write a finished synthesis to the history store"""
+    await add_to_history(HistoryItem(
+        id=response.id,
+        text=response.text,
+        voice=response.voice,
+        duration=response.duration,
+        created_at=response.created_at,
+        audio_url=response.audio_url,
+    ))
+    await output_index.record(OUTPUT_DIR / f"{response.id}.wav", response.voice, response.text)
+
+
+def synthesize_pcm(tts, text: str, voice_id: str):
+    """Synthesize one clause to (PCM16 bytes, sample rate) (blocking, runs on an inference worker)"""
+    if tts is None:
+        return None
+    
+    with adapter_manager.use(tts, resolve_adapter(voice_id)):
+        with stage_timer("preprocess"):
+            kwargs = voice_infer_kwargs(tts, voice_id)
+            prepared = text_frontend.infer_kwargs(tts, text)
+        started = time.perf_counter()
+        audio = tts.infer(**prepared, **kwargs)
+        inference_seconds = time.perf_counter() - started
+    STAGE_SECONDS.observe(inference_seconds, "inference")
+    sample_rate = engine_sample_rate(tts)
+    observe_synthesis(voice_id, len(text), audio_seconds(audio, sample_rate), inference_seconds)
+    with stage_timer("encode"):
+        pcm = to_pcm16(audio)
+    return pcm, sample_rate
+
+
+def _bind_adapter(tts, adapter_id: str) -> bool:
+    if tts is None:
+        return False
+    with adapter_manager.use(tts, adapter_id):
+        return True
+
+
+def _unload_adapter(tts, adapter_id: str):
+    adapter_manager.evict(tts, adapter_id)
+
+
+async def preload_adapter(adapter_id: str) -> bool:
+    """Make an adapter resident and active without synthesizing anything"""
+    return await run_inference(inference_pool, _bind_adapter, adapter_id)
+
+
+async def release_adapter(adapter_id: str):
+    """Unload an adapter from the engine, if the engine is loaded at all"""
+    if INFERENCE_SOCKETS:
+        # Every server may have it resident
+        await asyncio.to_thread(inference_pool.broadcast, ("call", __name__, "_unload_adapter", (adapter_id,), {}))
+    elif _tts_engine is not None:
+        await run_inference(inference_pool, _unload_adapter, adapter_id)
+
+
+def _adapter_stats(tts) -> dict:
+    return adapter_manager.stats()
+
+
+async def adapter_stats():
+    """Adapter residency of this process's engine, or of each inference server"""
+    if INFERENCE_SOCKETS:
+        replies = await asyncio.to_thread(inference_pool.broadcast, ("call", __name__, "_adapter_stats", (), {}))
+        return {"servers": [dict(r, socket=s) if r else None for s, r in zip(INFERENCE_SOCKETS, replies)]}
+    return adapter_manager.stats()
+
+
+async def _submit_clause(text: str, voice_id: str, affinity: Optional[int] = None):
+    """Submit a streaming clause, waiting out brief queue saturation mid-stream"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + inference_pool.timeout
+    while True:
+        try:
+            return await inference_pool.submit(synthesize_pcm, text, voice_id, affinity=affinity)
+        except PoolSaturated as e:
+            if loop.time() >= deadline:
+                raise
+            await asyncio.sleep(min(e.retry_after, 0.5))
+
+
+async def stream_speech(request: TTSRequest, base_filename: str, key: str, http_request: Request):
+    """
+    Synthesize clause by clause and stream audio as each clause finishes.
+    
+    Returns None when the engine is unavailable so the caller can fall back
+    to demo mode. The complete WAV is written to Output/ once streaming ends.
+    """
+    with stage_timer("preprocess"):
+        clauses = split_clauses(request.text)
+    audio_path = OUTPUT_DIR / f"{base_filename}.wav"
+    
+    # Errors on the first clause can still become a proper HTTP status
+    pending = deque(
+        asyncio.ensure_future(_submit_clause(c, request.voice_id))
+        for c in clauses[1:1 + STREAM_LOOKAHEAD]
+    )
+    try:
+        with inference_http_errors():
+            first = await inference_pool.submit(synthesize_pcm, clauses[0], request.voice_id, request=http_request)
+    except BaseException:
+        for job in pending:
+            job.cancel()
+        raise
+    if first is None:
+        for job in pending:
+            job.cancel()
+        return None
+    
+    first_pcm, sample_rate = first
+    next_index = 1 + len(pending)
+    
+    async def pcm_body():
+        chunks = [first_pcm]
+        try:
+            yield first_pcm
+            
+            nonlocal next_index
+            while pending:
+                job = pending.popleft()
+                if next_index < len(clauses):
+                    pending.append(asyncio.ensure_future(_submit_clause(clauses[next_index], request.voice_id)))
+                    next_index += 1
+                try:
+                    result, error = await job, None
+                except Exception as e:
+                    result, error = None, e
+                if result is None:
+                    detail = (str(error) or type(error).__name__) if error is not None else "TTS engine unavailable"
+                    print(f"[VieNeu] Stream {base_filename} failed at clause {len(chunks) + 1}/{len(clauses)}: {detail}")
+                    # The status line is already sent: abort the connection so the client sees an
+                    # incomplete response instead of audio that silently ends early
+                    raise RuntimeError(f"Streaming stopped at clause {len(chunks) + 1}: {detail}") from error
+                pcm, _ = result
+                chunks.append(pcm)
+                yield pcm
+            
+            started = time.perf_counter()
+            await asyncio.to_thread(write_wav, audio_path, chunks, sample_rate)
+            STAGE_SECONDS.observe(time.perf_counter() - started, "file_write")
+            await synthesis_cache.put(key, audio_path)
+            await record_history(TTSResponse(
+                id=base_filename,
+                text=request.text,
+                voice=request.voice_id,
+                audio_url=f"/api/tts/audio/{base_filename}",
+                filename=audio_path.name,
+                duration=sum(len(c) for c in chunks) / 2 / sample_rate,
+                created_at=datetime.now().isoformat(),
+            ))
+        finally:
+            for job in pending:
+                job.cancel()
+    
+    async def wav_body():
+        yield wav_header(sample_rate)
+        async for pcm in pcm_body():
+            yield pcm
+    
+    if needs_transcode(request.format, request.sample_rate):
+        # Encoded on the fly; clients never see the WAV (it is still kept for the cache)
+        body = encode_stream(pcm_body(), sample_rate, request.format, request.bitrate, request.sample_rate)
+        media_type = FORMATS[request.format].media_type
+    elif request.stream_format == "wav":
+        body = wav_body()
+        media_type = "audio/wav"
+    else:
+        body = pcm_body()
+        media_type = f"audio/L16; rate={sample_rate}; channels=1"
+    
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={
+            "X-Audio-Id": base_filename,
+            "X-Audio-Url": f"/api/tts/audio/{base_filename}",
+            "X-Sample-Rate": str(sample_rate),
+            "X-Clause-Count": str(len(clauses)),
+        },
+    )
+
+
+# Incremental text sessions (WS /ws): concurrent sessions share the inference pool
+WS_MAX_SESSIONS = int(os.getenv("VIENEU_WS_MAX_SESSIONS", "256"))
+# Clauses a session may have waiting before further text is refused
+WS_MAX_PENDING_CLAUSES = 64
+# PCM is sent in frames this long, so a cancel cuts playback mid-clause
+WS_FRAME_SECONDS = 0.1
+WS_FORMATS = ("pcm", "opus", "mp3")
+
+_ws_sessions = 0
+_ws_affinity = itertools.count()
+
+
+def _pin_adapter(tts, adapter_id: str) -> bool:
+    if tts is None:
+        return False
+    adapter_manager.pin(tts, adapter_id)
+    return True
+
+
+def _unpin_adapter(tts, adapter_id: str):
+    adapter_manager.unpin(adapter_id)
+
+
+def _release_pin(adapter_id: str, affinity: int, pin: asyncio.Future):
+    """Done-callback of a session's pin job: undo a successful pin from a detached task"""
+    if pin.cancelled() or pin.exception() is not None or not pin.result():
+        return
+
+    async def unpin():
+        try:
+            await inference_pool.submit(_unpin_adapter, adapter_id, affinity=affinity)
+        except Exception as e:
+            print(f"[VieNeu] Could not unpin adapter {adapter_id}: {e}")
+
+    asyncio.ensure_future(unpin())
+
+
+class _Clause:
+    __slots__ = ("index", "text", "job")
+
+    def __init__(self, index: int, text: str):
+        self.index = index
+        self.text = text
+        self.job: Optional[asyncio.Future] = None
+
+
+class _TurnEncoder:
+    """One Ogg/Opus or MP3 stream per turn: clause PCM goes in, encoded bytes are sent as ffmpeg produces them"""
+
+    def __init__(self, session: "SpeechSession", input_rate: int):
+        self.pcm: asyncio.Queue = asyncio.Queue()
+
+        async def chunks():
+            while True:
+                chunk = await self.pcm.get()
+                if chunk is None:
+                    return
+                yield chunk
+
+        stream = encode_stream(chunks(), input_rate, session.fmt, session.bitrate, session.sample_rate)
+        self.task = asyncio.ensure_future(self._pump(stream, session))
+
+    @staticmethod
+    async def _pump(stream, session: "SpeechSession"):
+        try:
+            async for data in stream:
+                await session.send(data)
+        finally:
+            await stream.aclose()
+
+    def write(self, pcm: bytes):
+        self.pcm.put_nowait(pcm)
+
+    async def finish(self):
+        """End the stream and wait until its last bytes are sent"""
+        self.pcm.put_nowait(None)
+        await asyncio.wait({self.task})
+
+    async def abort(self):
+        self.task.cancel()
+        await asyncio.wait({self.task})
+
+
+class SpeechSession:
+    """
+    One WebSocket client speaking text as it arrives.
+
+    Fragments are buffered into clauses (segmenter.ClauseBuffer); each
+    clause is synthesized on the shared inference pool, at most
+    STREAM_LOOKAHEAD ahead of the one being sent, and its audio goes out
+    in order as binary frames. A turn ends with "flush". "cancel" drops the
+    buffered text, the queued clauses and any audio not yet sent. All jobs
+    of a session use one affinity, so with inference servers they run on
+    the engine that holds the session's pinned adapter.
+    """
+
+    FLUSH, CLOSE = "flush", "close"
+
+    def __init__(self, websocket: WebSocket, voice_id: str, fmt: str, bitrate: Optional[int], sample_rate: Optional[int]):
+        self.websocket = websocket
+        self.voice_id = voice_id
+        self.fmt = fmt
+        self.bitrate = bitrate
+        self.sample_rate = sample_rate
+        self.affinity = next(_ws_affinity)
+        self.buffer = ClauseBuffer()
+        self.queue: deque = deque()  # _Clause items and FLUSH/CLOSE markers, in send order
+        self.changed = asyncio.Event()
+        self.closed = asyncio.Event()
+        self.turn = 0  # bumped by cancel; audio of an older turn is dropped
+        self.clauses = 0
+        self.encoder: Optional[_TurnEncoder] = None
+        self.turn_started: Optional[float] = None  # first text of the turn, until its first audio
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, data):
+        async with self._send_lock:
+            if isinstance(data, bytes):
+                await self.websocket.send_bytes(data)
+            else:
+                await self.websocket.send_json(data)
+
+    def _pending(self) -> int:
+        return sum(1 for item in self.queue if isinstance(item, _Clause))
+
+    def _start_jobs(self):
+        started = 0
+        for item in self.queue:
+            if not isinstance(item, _Clause):
+                continue
+            if item.job is None:
+                item.job = asyncio.ensure_future(_submit_clause(item.text, self.voice_id, self.affinity))
+            started += 1
+            if started > STREAM_LOOKAHEAD:
+                return
+
+    def _enqueue(self, clauses: list):
+        for text in clauses:
+            self.queue.append(_Clause(self.clauses, text))
+            self.clauses += 1
+        self._start_jobs()
+        self.changed.set()
+
+    async def cancel(self):
+        self.turn += 1
+        self.buffer.clear()
+        for item in self.queue:
+            if isinstance(item, _Clause) and item.job is not None:
+                item.job.cancel()
+        self.queue.clear()
+        if self.encoder is not None:
+            await self.encoder.abort()
+            self.encoder = None
+        self.turn_started = None
+        self.changed.set()
+
+    async def _end_turn(self):
+        if self.encoder is not None:
+            await self.encoder.finish()
+            self.encoder = None
+        self.turn_started = None
+
+    async def _send_audio(self, pcm: bytes, rate: int, turn: int):
+        # Cancelled while the clause message was being sent; a new encoder would carry it into the next turn
+        if turn != self.turn:
+            return
+        if self.turn_started is not None:
+            STAGE_SECONDS.observe(time.monotonic() - self.turn_started, "time_to_first_audio")
+            self.turn_started = None
+        if self.fmt != "pcm":
+            if self.encoder is None:
+                self.encoder = _TurnEncoder(self, rate)
+            self.encoder.write(pcm)
+            return
+        frame = int(rate * WS_FRAME_SECONDS) * 2
+        for offset in range(0, len(pcm), frame):
+            if turn != self.turn:
+                return
+            await self.send(pcm[offset:offset + frame])
+
+    async def _sender(self):
+        while True:
+            if not self.queue:
+                self.changed.clear()
+                await self.changed.wait()
+                continue
+            item = self.queue[0]
+            if not isinstance(item, _Clause):
+                self.queue.popleft()
+                await self._end_turn()
+                await self.send({"type": "flushed"})
+                if item == self.CLOSE:
+                    self.closed.set()
+                    return
+                continue
+
+            self._start_jobs()
+            turn = self.turn
+            await asyncio.wait({item.job})
+            if turn != self.turn:
+                continue
+            self.queue.popleft()
+            self._start_jobs()
+            if item.job.cancelled():
+                continue
+            error = item.job.exception()
+            result = item.job.result() if error is None else None
+            if result is None:
+                detail = (str(error) or type(error).__name__) if error is not None else "TTS engine unavailable"
+                await self.send({"type": "error", "index": item.index, "detail": detail})
+                continue
+            pcm, rate = result
+            await self.send({
+                "type": "clause",
+                "index": item.index,
+                "text": item.text,
+                "sample_rate": rate,
+                "audio_seconds": round(len(pcm) / 2 / rate, 3),
+            })
+            await self._send_audio(pcm, rate, turn)
+
+    async def _receive(self):
+        while True:
+            try:
+                message = json.loads(await self.websocket.receive_text())
+                kind = message.get("type")
+            except (ValueError, AttributeError):
+                await self.send({"type": "error", "detail": "Messages are JSON objects with a type"})
+                continue
+
+            if kind == "text":
+                if self._pending() >= WS_MAX_PENDING_CLAUSES:
+                    await self.send({"type": "error", "detail": "Too much text queued; wait for audio or cancel"})
+                    continue
+                if self.turn_started is None and not self.queue:
+                    self.turn_started = time.monotonic()
+                self._enqueue(self.buffer.feed(str(message.get("text", ""))))
+            elif kind in (self.FLUSH, self.CLOSE):
+                self._enqueue(self.buffer.flush())
+                self.queue.append(kind)
+                self.changed.set()
+                if kind == self.CLOSE:
+                    await self.closed.wait()
+                    return
+            elif kind == "cancel":
+                await self.cancel()
+                await self.send({"type": "cancelled"})
+            else:
+                await self.send({"type": "error", "detail": f"Unknown message type {kind!r}"})
+
+    async def run(self):
+        adapter = await resolve_adapter_async(self.voice_id)
+        pin = sender = receiver = None
+        try:
+            if adapter is not None:
+                pin = asyncio.ensure_future(inference_pool.submit(_pin_adapter, adapter, affinity=self.affinity))
+                await asyncio.wait({pin})
+                if pin.exception() is not None:
+                    print(f"[VieNeu] Could not pin adapter {adapter} for a speech session: {pin.exception()}")
+            await self.send({"type": "ready", "voice_id": self.voice_id, "format": self.fmt})
+
+            sender = asyncio.ensure_future(self._sender())
+            receiver = asyncio.ensure_future(self._receive())
+            # The sender only stops on "close" or a dead socket; either way the session is over
+            await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            for task in (sender, receiver):
+                if task.done() and not task.cancelled() and task.exception() is not None:
+                    error = task.exception()
+                    if not isinstance(error, WebSocketDisconnect):
+                        print(f"[VieNeu] Speech session failed: {error}")
+        finally:
+            # Everything here must also happen when the handler itself is cancelled (client gone),
+            # so only the last step awaits
+            for task in (sender, receiver, self.encoder.task if self.encoder else None):
+                if task is not None:
+                    task.cancel()
+            if pin is not None:
+                pin.add_done_callback(functools.partial(_release_pin, adapter, self.affinity))
+            await self.cancel()
+
+
+@router.websocket("/ws")
+async def speech_socket(
+    websocket: WebSocket,
+    voice_id: str = "ngoc-huyen",
+    format: str = "pcm",
+    bitrate: Optional[int] = None,
+    sample_rate: Optional[int] = None,
+):
+    """
+    Speak text while it is still being written (e.g. streamed from an LLM).
+
+    Client messages (JSON): {"type": "text", "text": "..."} appends a
+    fragment; {"type": "flush"} speaks whatever is buffered and ends the
+    turn; {"type": "cancel"} stops immediately (barge-in); {"type": "close"}
+    flushes and ends the session. Audio is sent as binary frames: raw PCM16
+    mono, or one Ogg/Opus (MP3) stream per turn. Each clause is announced
+    first by a {"type": "clause"} message with its text and sample rate.
+    """
+    global _ws_sessions
+
+    if format not in WS_FORMATS:
+        await websocket.close(code=1008, reason=f"format must be one of {', '.join(WS_FORMATS)}")
+        return
+    try:
+        if format == "pcm":
+            if bitrate is not None or sample_rate is not None:
+                raise HTTPException(status_code=400, detail="bitrate and sample_rate apply to opus and mp3 only")
+        else:
+            check_options(format, bitrate, sample_rate)
+            if not transcoder_available():
+                raise HTTPException(status_code=400, detail=f"{format} needs ffmpeg; use format=pcm")
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=e.detail)
+        return
+    if _ws_sessions >= WS_MAX_SESSIONS:
+        await websocket.close(code=1013, reason="Too many speech sessions")
+        return
+
+    await websocket.accept()
+    _ws_sessions += 1
+    try:
+        await SpeechSession(websocket, voice_id, format, bitrate, sample_rate).run()
+    finally:
+        _ws_sessions -= 1
+    try:
+        await websocket.close()
+    except RuntimeError:
+        # Already closed by the client
+        pass
+
+
 def generate_filename():
     """Generate filename: VieNeuStudio-{random 8 digits}"""
     random_id = random.randint(10000000, 99999999)
@@ -84,20 +948,44 @@ def generate_filename():
 
 @router.get("/status")
 async def get_status():
-    """Get TTS engine status"""
-    sdk_ok = check_sdk_available()
-    engine = get_tts_engine() if sdk_ok else None
+    """Get TTS engine status (never triggers a model load)"""
     
     return {
-        "sdk_installed": sdk_ok,
-        "engine_ready": engine is not None,
+        "sdk_installed": _sdk_available,
+        "engine_ready": engine_ready(),
+        "engine": engine_status,
         "output_dir": str(OUTPUT_DIR),
-        "demo_mode": not sdk_ok or engine is None,
+        "demo_mode": engine_status["state"] in ("unavailable", "failed"),
+        "inference": inference_pool.stats(),
+        "batching": generate_batcher.stats(),
+        "cache": synthesis_cache.stats(),
+        "reference_cache": reference_cache.stats(),
+        "frontend": text_frontend.stats(),
+        "adapters": adapter_manager.stats(),
+        "output_index": output_index.stats(),
     }
 
 
+async def deliver(response: TTSResponse, path: Path, request: TTSRequest) -> TTSResponse:
+    """Point the response at the requested format, transcoding it up front"""
+    if not needs_transcode(request.format, request.sample_rate):
+        return response
+    try:
+        encoded = await transcode(path, request.format, request.bitrate, request.sample_rate)
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    params = f"format={request.format}"
+    if request.bitrate:
+        params += f"&bitrate={request.bitrate}"
+    if request.sample_rate:
+        params += f"&sample_rate={request.sample_rate}"
+    response.audio_url = f"{response.audio_url}?{params}"
+    response.filename = f"{response.id}.{encoded.suffix[1:]}"
+    return response
+
+
 @router.post("/generate", response_model=TTSResponse)
-async def generate_speech(request: TTSRequest):
+async def generate_speech(request: TTSRequest, http_request: Request):
     """Generate speech from text using selected voice"""
     
     if not request.text.strip():
@@ -106,33 +994,94 @@ async def generate_speech(request: TTSRequest):
     if len(request.text) > 500:
         raise HTTPException(status_code=400, detail="Text too long (max 500 chars)")
     
+    if request.stream_format not in ("wav", "pcm"):
+        raise HTTPException(status_code=400, detail="stream_format must be 'wav' or 'pcm'")
+    
+    request.format = negotiate_format(request.format, None)
+    check_options(request.format, request.bitrate, request.sample_rate)
+    compressed = needs_transcode(request.format, request.sample_rate)
+    if compressed and not transcoder_available():
+        raise HTTPException(status_code=501, detail="Compressed audio requires ffmpeg on the server")
+    
     base_filename = generate_filename()
     audio_filename = f"{base_filename}.wav"
     duration = len(request.text) / 10.0
+    key = cache_key(request.text, request.voice_id, await resolve_adapter_async(request.voice_id))
     
-    # Try to use real TTS engine
-    tts = get_tts_engine()
-    
-    if tts is not None:
-        try:
-            # Real TTS generation
-            audio = tts.infer(text=request.text)
-            audio_path = OUTPUT_DIR / audio_filename
-            tts.save(audio, str(audio_path))
-            
-            return TTSResponse(
-                id=base_filename,
+    cached_path = synthesis_cache.lookup(key)
+    if cached_path is not None:
+        if request.streaming and (compressed or request.stream_format == "wav"):
+            response = await audio_response(http_request, cached_path, key, request.format, request.bitrate, request.sample_rate)
+            response.headers["X-Audio-Id"] = key
+            response.headers["X-Audio-Url"] = f"/api/tts/audio/{key}"
+            return response
+        if not request.streaming:
+            response = TTSResponse(
+                id=key,
                 text=request.text,
                 voice=request.voice_id,
-                audio_url=f"/api/tts/audio/{base_filename}",
-                filename=audio_filename,
+                audio_url=f"/api/tts/audio/{key}",
+                filename=cached_path.name,
                 duration=duration,
                 created_at=datetime.now().isoformat(),
-                demo_mode=False,
+                cached=True,
             )
+            await record_history(response)
+            return await deliver(response, cached_path, request)
+    
+    if request.streaming:
+        try:
+            response = await stream_speech(request, base_filename, key, http_request)
+        except HTTPException:
+            raise
         except Exception as e:
-            print(f"[VieNeu] Generation error: {e}")
-            # Fall through to demo mode
+            print(f"[VieNeu] Streaming error: {e}")
+            response = None
+        if response is not None:
+            return response
+    
+    # Try to use real TTS engine
+    audio_path = OUTPUT_DIR / audio_filename
+    
+    async def produce() -> Path:
+        generated = await generate_batcher.submit(
+            request.voice_id,
+            (request.text, audio_path),
+            cost=len(request.text),
+            request=http_request,
+        )
+        if not generated:
+            raise EngineUnavailable()
+        return audio_path
+    
+    try:
+        # Translated out here: waiters on this key retry when the leader's client leaves
+        with inference_http_errors():
+            path, cached = await synthesis_cache.get_or_create(key, produce)
+    except HTTPException:
+        raise
+    except EngineUnavailable:
+        path = None
+    except Exception as e:
+        print(f"[VieNeu] Generation error: {e}")
+        path = None
+    
+    if path is not None:
+        # Requests that joined another request's generation get the shared cache entry
+        audio_id = key if cached else base_filename
+        response = TTSResponse(
+            id=audio_id,
+            text=request.text,
+            voice=request.voice_id,
+            audio_url=f"/api/tts/audio/{audio_id}",
+            filename=f"{audio_id}.wav",
+            duration=duration,
+            created_at=datetime.now().isoformat(),
+            demo_mode=False,
+            cached=cached,
+        )
+        await record_history(response)
+        return await deliver(response, path, request)
     
     # Demo mode - return info without actual audio
     return TTSResponse(
@@ -147,8 +1096,24 @@ async def generate_speech(request: TTSRequest):
     )
 
 
+def synthesize_cloned(tts, text: str, audio_path: Path, ref_path: Path, ref_sha: str, ref_text: str) -> bool:
+    """Clone from a stored reference clip, reusing its cached encoding (blocking)"""
+    if tts is None:
+        return False
+    return synthesize_to_file(tts, text, audio_path, **reference_infer_kwargs(tts, ref_path, ref_sha, ref_text))
+
+
+def encode_voice(tts, ref_path: Path, ref_sha: str, ref_text: str) -> bool:
+    """Pre-encode a registered voice so its first use skips reference encoding (blocking)"""
+    if tts is None:
+        return False
+    reference_infer_kwargs(tts, ref_path, ref_sha, ref_text)
+    return True
+
+
 @router.post("/clone")
 async def clone_voice(
+    http_request: Request,
     text: str = Form(...),
     ref_text: str = Form(...),
     ref_audio: UploadFile = File(...),
@@ -158,37 +1123,35 @@ async def clone_voice(
     if not text.strip():
         raise HTTPException(status_code=400, detail="Text cannot be empty")
     
-    tts = get_tts_engine()
-    if tts is None:
+    if not check_sdk_available():
         raise HTTPException(
             status_code=503,
             detail="VieNeu SDK not ready. Please install with 'pip install vieneu'"
         )
     
     try:
-        # Save uploaded reference audio temporarily
-        temp_ref_path = OUTPUT_DIR / f"temp_ref_{uuid.uuid4()}.wav"
-        with open(temp_ref_path, "wb") as f:
-            content = await ref_audio.read()
-            f.write(content)
+        # Stream the reference to content-addressed storage; repeat clips are reused
+        ref_path, ref_sha = await save_reference_upload(ref_audio)
         
         # Generate with voice cloning
-        audio = tts.infer(
-            text=text,
-            ref_audio=str(temp_ref_path),
-            ref_text=ref_text,
-        )
-        
-        # Save output
         base_filename = generate_filename()
         audio_filename = f"{base_filename}.wav"
         audio_path = OUTPUT_DIR / audio_filename
-        tts.save(audio, str(audio_path))
+        generated = await run_inference(
+            inference_pool,
+            synthesize_cloned,
+            text,
+            audio_path,
+            ref_path,
+            ref_sha,
+            ref_text,
+            request=http_request,
+        )
         
-        # Cleanup temp file
-        temp_ref_path.unlink(missing_ok=True)
+        if not generated:
+            raise HTTPException(status_code=503, detail="VieNeu engine failed to load")
         
-        return TTSResponse(
+        response = TTSResponse(
             id=base_filename,
             text=text,
             voice="cloned",
@@ -198,30 +1161,48 @@ async def clone_voice(
             created_at=datetime.now().isoformat(),
             demo_mode=False,
         )
+        await record_history(response)
+        return response
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/audio/{audio_id}")
-async def get_audio(audio_id: str):
-    """Get generated audio file"""
-    
+def resolve_audio_path(audio_id: str):
+    """Output/ file or shared cache entry for an audio id, or None"""
+    if "/" in audio_id or "\\" in audio_id or audio_id.startswith("."):
+        return None
     audio_path = OUTPUT_DIR / f"{audio_id}.wav"
-    if not audio_path.exists():
+    if not audio_path.exists() and is_cache_key(audio_id):
+        audio_path = synthesis_cache.path(audio_id)
+    return audio_path if audio_path.exists() else None
+
+
+@router.api_route("/audio/{audio_id}", methods=["GET", "HEAD"])
+async def get_audio(
+    audio_id: str,
+    request: Request,
+    format: Optional[str] = None,
+    bitrate: Optional[int] = None,
+    sample_rate: Optional[int] = None,
+):
+    """Get generated audio file (WAV, or FLAC/MP3/Opus via `format` or the Accept header)"""
+    
+    audio_path = resolve_audio_path(audio_id)
+    if audio_path is None:
         raise HTTPException(status_code=404, detail="Audio not found")
     
-    return FileResponse(
-        audio_path,
-        media_type="audio/wav",
-        filename=f"{audio_id}.wav",
-    )
+    fmt = negotiate_format(format, request.headers.get("accept"))
+    return await audio_response(request, audio_path, audio_id, fmt, bitrate, sample_rate, negotiated=format is None)
 
 
 @router.get("/voices")
 async def list_voices():
     """List available voices including presets and LoRA adapters"""
     
+    registered = await run_db(list_registered_voices)
     return {
         "voices": [
             {
@@ -236,20 +1217,139 @@ async def list_voices():
                 "description": "Giọng mặc định VieNeu-TTS",
                 "type": "preset",
             },
+            *(
+                {
+                    "id": voice.id,
+                    "name": voice.name,
+                    "description": voice.description,
+                    "type": "custom",
+                }
+                for voice in registered
+            ),
         ]
     }
 
 
+@router.post("/voices")
+async def create_voice(
+    http_request: Request,
+    name: str = Form(...),
+    ref_text: str = Form(...),
+    ref_audio: UploadFile = File(...),
+    description: str = Form(""),
+):
+    """Register a reference clip once; use the returned voice id with /generate"""
+    
+    if not name.strip() or not ref_text.strip():
+        raise HTTPException(status_code=400, detail="Name and reference text are required")
+    
+    ref_path, ref_sha = await save_reference_upload(ref_audio)
+    voice = await run_db(register_voice, name.strip(), description, ref_sha, ref_text)
+    
+    # Encode now so the first generation with this voice is as fast as later ones
+    try:
+        await run_inference(inference_pool, encode_voice, ref_path, ref_sha, ref_text, request=http_request)
+    except HTTPException:
+        pass
+    except Exception as e:
+        print(f"[VieNeu] Reference encoding failed for {voice.id}: {e}")
+    
+    return {"status": "success", "voice": voice}
+
+
+@router.delete("/voices/{voice_id}")
+async def remove_voice(voice_id: str):
+    """Delete a registered voice"""
+    
+    if not await run_db(delete_voice, voice_id):
+        raise HTTPException(status_code=404, detail="Voice not found")
+    return {"status": "success"}
+
+
+def _frontend_stats(tts) -> dict:
+    return text_frontend.stats()
+
+
+async def frontend_stats():
+    """Text frontend cache of this process, or of each inference server"""
+    if INFERENCE_SOCKETS:
+        replies = await asyncio.to_thread(inference_pool.broadcast, ("call", __name__, "_frontend_stats", (), {}))
+        return {"servers": [dict(r, socket=s) if r else None for s, r in zip(INFERENCE_SOCKETS, replies)]}
+    return text_frontend.stats()
+
+
+@router.get("/frontend")
+async def get_frontend():
+    """Text frontend cache hit rate and normalization time, plus the installed lexicons"""
+    
+    return {"frontend": await frontend_stats(), "lexicons": await run_db(list_lexicons)}
+
+
+@router.get("/lexicons/{name}")
+async def read_lexicon(name: str):
+    """Entries of a pronunciation lexicon"""
+    
+    entries = await run_db(get_lexicon, name)
+    if entries is None:
+        raise HTTPException(status_code=404, detail="Lexicon not found")
+    return {"name": name, "entries": entries}
+
+
+@router.put("/lexicons/{name}")
+async def put_lexicon(name: str, request: LexiconRequest):
+    """Create or replace a pronunciation lexicon; lexicons apply in name order, later ones win"""
+    
+    if not LEXICON_NAME.fullmatch(name):
+        raise HTTPException(status_code=400, detail="Lexicon names use letters, digits, '-' and '_' (max 64)")
+    if len(request.entries) > LEXICON_MAX_ENTRIES:
+        raise HTTPException(status_code=413, detail=f"At most {LEXICON_MAX_ENTRIES} entries per lexicon")
+    entries = {term.strip(): spoken.strip() for term, spoken in request.entries.items()}
+    if any(not term or not spoken for term, spoken in entries.items()):
+        raise HTTPException(status_code=400, detail="Terms and pronunciations must not be empty")
+    await run_db(save_lexicon, name, entries)
+    # Recompiling up to LEXICON_MAX_ENTRIES terms is too slow for the event loop
+    await asyncio.to_thread(text_frontend.refresh, True)
+    return {"status": "success", "name": name, "entries": len(entries)}
+
+
+@router.delete("/lexicons/{name}")
+async def remove_lexicon(name: str):
+    """Delete a pronunciation lexicon"""
+    
+    if not await run_db(delete_lexicon, name):
+        raise HTTPException(status_code=404, detail="Lexicon not found")
+    await asyncio.to_thread(text_frontend.refresh, True)
+    return {"status": "success"}
+
+
 @router.get("/output-files")
-async def list_output_files():
-    """List all generated audio files in Output folder"""
-    
-    files = []
-    for f in OUTPUT_DIR.glob("VieNeuStudio-*.wav"):
-        files.append({
-            "filename": f.name,
-            "size": f.stat().st_size,
-            "created": datetime.fromtimestamp(f.stat().st_ctime).isoformat(),
-        })
-    
-    return {"files": sorted(files, key=lambda x: x["created"], reverse=True)}
+async def list_output_files(
+    response: Response,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    voice: Optional[str] = None,
+    text: Optional[str] = None,
+    since: Optional[str] = None,
+):
+    """
+    List generated audio files in Output folder, newest first.
+
+    Served from the output index; pass `next_cursor` back as `cursor` for the
+    next page. `text` matches files generated from that exact (normalized) text.
+    """
+    limit = max(1, min(limit, 1000))
+    rows, total, next_cursor = await output_index.page(limit, cursor, voice, text, since)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    files = [
+        {
+            "filename": row["filename"],
+            "size": row["size"],
+            "created": row["created"],
+            "duration": row["duration"],
+            "voice": row["voice"],
+            "text_hash": row["text_hash"],
+        }
+        for row in rows
+    ]
+    return {"files": files, "total": total, "next_cursor": next_cursor}
@@ -0,0 +1,225 @@
+"""
+Voice References - Streamed reference uploads, encoded-reference cache and registered voices
+"""
+
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiofiles
+import numpy as np
+from fastapi import HTTPException, UploadFile
+from pydantic import BaseModel
+
+from api.db import STORAGE_DIR, connect, init_schema
+from api.synthesis_cache import normalize_text
+
+VOICES_DIR = STORAGE_DIR / "voices"
+REFS_DIR = VOICES_DIR / "refs"
+CODES_DIR = VOICES_DIR / "codes"
+REGISTRY_PATH = VOICES_DIR / "voices.json"
+REFS_DIR.mkdir(parents=True, exist_ok=True)
+CODES_DIR.mkdir(parents=True, exist_ok=True)
+
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+MAX_REF_BYTES = int(os.getenv("VIENEU_MAX_REF_BYTES", str(20 * 1024 * 1024)))
+REF_CACHE_ENTRIES = int(os.getenv("VIENEU_REF_CACHE_ENTRIES", "64"))
+
+
+class RegisteredVoice(BaseModel):
+    id: str
+    name: str
+    description: str = ""
+    ref_sha: str
+    ref_text: str
+    created_at: str
+
+
+async def save_reference_upload(upload: UploadFile) -> Tuple[Path, str]:
+    """
+    Stream an uploaded reference clip to disk in chunks, hashing as it goes.
+
+    Clips are stored content-addressed under storage/voices/refs/, so the
+    same clip uploaded twice is kept once and nothing temporary is left behind.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    tmp_path = REFS_DIR / f".upload-{uuid.uuid4().hex}"
+    try:
+        async with aiofiles.open(tmp_path, "wb") as f:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_REF_BYTES:
+                    raise HTTPException(status_code=413, detail="Reference audio too large")
+                digest.update(chunk)
+                await f.write(chunk)
+
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Reference audio is empty")
+
+        sha = digest.hexdigest()
+        ref_path = REFS_DIR / f"{sha}.wav"
+        if ref_path.exists():
+            tmp_path.unlink()
+        else:
+            tmp_path.replace(ref_path)
+        return ref_path, sha
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def reference_key(ref_sha: str, ref_text: str) -> str:
+    return hashlib.sha256(f"{ref_sha}\n{normalize_text(ref_text)}".encode("utf-8")).hexdigest()
+
+
+class ReferenceCache:
+    """
+    Encoded references (codec tokens / speaker conditioning) keyed by
+    clip hash + ref_text. Hot entries stay in memory; every entry is also
+    written to storage/voices/codes/ so restarts skip re-encoding.
+    Safe to call from several inference worker threads.
+    """
+
+    def __init__(self, directory: Path = CODES_DIR, max_entries: int = REF_CACHE_ENTRIES):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "encodes": 0, "encode_seconds": 0.0}
+
+    def _remember(self, key: str, codes: Any):
+        with self._lock:
+            self._memory[key] = codes
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def get_or_encode(self, tts, key: str, ref_path: Path) -> Optional[Any]:
+        """Encoded reference for the clip, or None if the engine cannot pre-encode (blocking)"""
+        encoder = getattr(tts, "encode_reference", None)
+        if encoder is None:
+            return None
+
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return self._memory[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Only one worker encodes a given clip; the others wait and reuse it
+        with key_lock:
+            with self._lock:
+                if key in self._memory:
+                    self._stats["memory_hits"] += 1
+                    return self._memory[key]
+
+            disk_path = self.directory / f"{key}.npy"
+            if disk_path.exists():
+                codes = np.load(disk_path, allow_pickle=False)
+                with self._lock:
+                    self._stats["disk_hits"] += 1
+            else:
+                started = time.monotonic()
+                codes = encoder(str(ref_path))
+                elapsed = time.monotonic() - started
+                tmp = disk_path.with_suffix(".tmp.npy")
+                np.save(tmp, np.asarray(codes.cpu() if hasattr(codes, "cpu") else codes))
+                tmp.replace(disk_path)
+                with self._lock:
+                    self._stats["encodes"] += 1
+                    self._stats["encode_seconds"] += elapsed
+
+            self._remember(key, codes)
+            with self._lock:
+                self._key_locks.pop(key, None)
+            return codes
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"memory_entries": len(self._memory), **self._stats}
+
+
+reference_cache = ReferenceCache()
+
+
+def reference_infer_kwargs(tts, ref_path: Path, ref_sha: str, ref_text: str) -> dict:
+    """Engine kwargs for cloning from a stored clip, preferring cached codes (blocking)"""
+    codes = reference_cache.get_or_encode(tts, reference_key(ref_sha, ref_text), ref_path)
+    if codes is not None:
+        return {"ref_codes": codes, "ref_text": ref_text}
+    return {"ref_audio": str(ref_path), "ref_text": ref_text}
+
+
+# Registered voices, shared by every API worker through the database
+init_schema([
+    """
+    CREATE TABLE IF NOT EXISTS voices (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        id TEXT NOT NULL UNIQUE,
+        data TEXT NOT NULL
+    )
+    """,
+])
+
+
+def _import_legacy_registry():
+    """Move voices.json (the registry before it lived in the database) into the voices table"""
+    try:
+        items = json.loads(REGISTRY_PATH.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return
+    conn = connect()
+    with conn:
+        for item in items:
+            voice = RegisteredVoice(**item)
+            conn.execute("INSERT OR IGNORE INTO voices (id, data) VALUES (?, ?)", (voice.id, voice.model_dump_json()))
+    try:
+        REGISTRY_PATH.replace(REGISTRY_PATH.with_suffix(".json.imported"))
+    except FileNotFoundError:
+        pass  # another worker imported it at the same time
+
+
+def register_voice(conn, name: str, description: str, ref_sha: str, ref_text: str) -> RegisteredVoice:
+    voice = RegisteredVoice(
+        id=f"custom-{uuid.uuid4().hex[:8]}",
+        name=name,
+        description=description,
+        ref_sha=ref_sha,
+        ref_text=ref_text,
+        created_at=datetime.now().isoformat(),
+    )
+    conn.execute("INSERT INTO voices (id, data) VALUES (?, ?)", (voice.id, voice.model_dump_json()))
+    return voice
+
+
+def get_voice(voice_id: str) -> Optional[RegisteredVoice]:
+    """Blocking lookup for inference workers; handlers use run_db with the functions below"""
+    row = connect().execute("SELECT data FROM voices WHERE id = ?", (voice_id,)).fetchone()
+    return RegisteredVoice.model_validate_json(row["data"]) if row else None
+
+
+def list_registered_voices(conn) -> List[RegisteredVoice]:
+    return [RegisteredVoice.model_validate_json(row["data"]) for row in conn.execute("SELECT data FROM voices ORDER BY seq")]
+
+
+def delete_voice(conn, voice_id: str) -> bool:
+    return conn.execute("DELETE FROM voices WHERE id = ?", (voice_id,)).rowcount > 0
+
+
+def voice_ref_path(voice: RegisteredVoice) -> Path:
+    return REFS_DIR / f"{voice.ref_sha}.wav"
+
+
+_import_legacy_registry()
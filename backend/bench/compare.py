@@ -0,0 +1,240 @@
+"""
+Backend Comparison - Real-time factor and quality deltas between engine backends
+Each backend loads in its own process and reads a fixed sentence set; audio is scored against the first backend
+
+    cd backend
+    python -m bench.compare --backends cpu,cpu-int8,gguf-q8,gguf-q4 --out backends.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+from pathlib import Path
+from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
+
+from bench.run import BACKEND_DIR, git_revision
+
+# Fixed set so runs on different machines and commits are comparable; spans short to long inputs
+SENTENCES = (
+    "Xin chào.",
+    "Hôm nay trời đẹp, chúng ta cùng nhau đi dạo.",
+    "Tổng đài viên sẽ trả lời quý khách trong giây lát, vui lòng giữ máy.",
+    "Giá vé là 125.000 đồng, khởi hành lúc 7 giờ 30 sáng thứ Hai.",
+    "Thành phố Hồ Chí Minh là trung tâm kinh tế lớn nhất Việt Nam, với hơn chín triệu dân.",
+    "Cảm ơn bạn đã lắng nghe bài học hôm nay. Hẹn gặp lại các bạn vào tuần sau với nhiều chủ đề thú vị hơn nữa về văn hóa và ẩm thực.",
+    "Để đảm bảo an toàn, hành khách vui lòng thắt dây an toàn, tắt các thiết bị điện tử và làm theo hướng dẫn của tiếp viên trong suốt chuyến bay.",
+    "Nghiên cứu cho thấy việc đọc sách mỗi ngày giúp cải thiện trí nhớ, giảm căng thẳng và mở rộng vốn từ vựng, đặc biệt là ở trẻ em trong độ tuổi đến trường.",
+)
+
+N_FFT = 1024
+HOP_SECONDS = 0.02
+N_MELS = 80
+# Bins more than this far below the reference's peak count as silence, so noise floors do not dominate
+TOP_DB = 80.0
+
+
+def run_backend(args):
+    """Worker: load one backend in this process, synthesize SENTENCES and write timings plus audio"""
+    workdir = Path(args.workdir)
+    os.environ["VIENEU_ENGINE_BACKEND"] = args.worker
+    os.environ["VIENEU_OUTPUT_DIR"] = str(workdir / "Output")
+    os.environ["VIENEU_DB_PATH"] = str(workdir / "studio.db")
+    if args.engine:
+        os.environ["VIENEU_ENGINE"] = args.engine
+    sys.path.insert(0, str(BACKEND_DIR))
+
+    from api.audio import audio_seconds, engine_sample_rate
+    from api.tts import engine_status, get_tts_engine, memory_usage, WARMUP_TEXT
+
+    tts = get_tts_engine()
+    if tts is None:
+        result = {"error": engine_status["error"] or "engine unavailable"}
+    else:
+        for _ in range(args.warmup):
+            tts.infer(text=WARMUP_TEXT)
+        sample_rate = engine_sample_rate(tts)
+        sentences, audio = [], []
+        for text in SENTENCES:
+            timings = []
+            for _ in range(args.repeats):
+                started = time.perf_counter()
+                waveform = tts.infer(text=text)
+                timings.append(time.perf_counter() - started)
+            seconds = audio_seconds(waveform, sample_rate)
+            sentences.append({
+                "chars": len(text),
+                "inference_seconds": round(float(np.median(timings)), 4),
+                "audio_seconds": round(seconds, 3),
+                "rtf": round(float(np.median(timings)) / seconds, 4) if seconds else None,
+            })
+            audio.append(np.asarray(waveform, dtype=np.float32).reshape(-1))
+        np.savez(workdir / "audio.npz", *audio)
+        result = {
+            "sample_rate": sample_rate,
+            "engine": {k: engine_status[k] for k in ("device", "load_seconds", "backend", "cpu", "weights")},
+            "memory": memory_usage(),
+            "sentences": sentences,
+        }
+    (workdir / "result.json").write_text(json.dumps(result, ensure_ascii=False), encoding="utf-8")
+
+
+def log_mel(audio: np.ndarray, sample_rate: int) -> np.ndarray:
+    """(frames, N_MELS) log-mel spectrogram in dB"""
+    hop = int(sample_rate * HOP_SECONDS)
+    if len(audio) < N_FFT:
+        audio = np.pad(audio, (0, N_FFT - len(audio)))
+    frames = np.lib.stride_tricks.sliding_window_view(audio, N_FFT)[::hop] * np.hanning(N_FFT)
+    power = np.abs(np.fft.rfft(frames, axis=1)) ** 2
+
+    # HTK mel filterbank from 0 Hz to Nyquist
+    to_mel = lambda hz: 2595.0 * np.log10(1.0 + hz / 700.0)
+    to_hz = lambda mel: 700.0 * (10.0 ** (mel / 2595.0) - 1.0)
+    edges = to_hz(np.linspace(0.0, to_mel(sample_rate / 2), N_MELS + 2))
+    bins = np.fft.rfftfreq(N_FFT, 1.0 / sample_rate)
+    rising = (bins[None, :] - edges[:-2, None]) / (edges[1:-1, None] - edges[:-2, None])
+    falling = (edges[2:, None] - bins[None, :]) / (edges[2:, None] - edges[1:-1, None])
+    filters = np.maximum(0.0, np.minimum(rising, falling))
+    return 10.0 * np.log10(power @ filters.T + 1e-10)
+
+
+def mel_distance(reference: np.ndarray, candidate: np.ndarray, sample_rate: int) -> float:
+    """
+    Mean RMS log-mel difference (dB) along the DTW alignment of the two
+    spectrograms, so small timing differences between backends are not
+    counted as spectral error. 0 means identical.
+    """
+    a, b = log_mel(reference, sample_rate), log_mel(candidate, sample_rate)
+    floor = a.max() - TOP_DB
+    a, b = np.maximum(a, floor), np.maximum(b, floor)
+    squared = (a ** 2).sum(axis=1)[:, None] + (b ** 2).sum(axis=1)[None, :] - 2.0 * a @ b.T
+    cost = np.sqrt(np.maximum(squared, 0.0) / N_MELS)
+    n, m = cost.shape
+    total = np.full((n + 1, m + 1), np.inf)
+    steps = np.zeros((n + 1, m + 1))
+    total[0, 0] = 0.0
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            prev = min((total[i - 1, j - 1], i - 1, j - 1), (total[i - 1, j], i - 1, j), (total[i, j - 1], i, j - 1))
+            total[i, j] = cost[i - 1, j - 1] + prev[0]
+            steps[i, j] = steps[prev[1], prev[2]] + 1
+    return float(total[n, m] / steps[n, m])
+
+
+def score(reference: dict, candidate: dict, ref_audio, cand_audio) -> dict:
+    """Per-backend summary with deltas against the reference backend"""
+    rtfs = [s["rtf"] for s in candidate["sentences"] if s["rtf"] is not None]
+    ref_rtf = float(np.mean([s["rtf"] for s in reference["sentences"] if s["rtf"] is not None]))
+    summary = {
+        "rtf_mean": round(float(np.mean(rtfs)), 4),
+        "rtf_p90": round(float(np.percentile(rtfs, 90)), 4),
+        "speedup": round(ref_rtf / float(np.mean(rtfs)), 3) if np.mean(rtfs) else None,
+        "load_seconds": candidate["engine"]["load_seconds"],
+        "rss_bytes": candidate["memory"].get("rss_bytes"),
+    }
+    if candidate["sample_rate"] != reference["sample_rate"]:
+        summary["quality"] = None
+        return summary
+    distances, durations = [], []
+    for ref_s, cand_s, ref_a, cand_a in zip(reference["sentences"], candidate["sentences"], ref_audio, cand_audio):
+        distances.append(mel_distance(ref_a, cand_a, candidate["sample_rate"]))
+        if ref_s["audio_seconds"]:
+            durations.append((cand_s["audio_seconds"] - ref_s["audio_seconds"]) / ref_s["audio_seconds"] * 100)
+    summary["quality"] = {
+        "mel_distance_db_mean": round(float(np.mean(distances)), 3),
+        "mel_distance_db_max": round(float(np.max(distances)), 3),
+        "duration_delta_pct_mean": round(float(np.mean(durations)), 2) if durations else None,
+        "per_sentence_mel_distance_db": [round(d, 3) for d in distances],
+    }
+    return summary
+
+
+def report(backends: dict, reference: str) -> List[str]:
+    lines = [f"reference: {reference}"]
+    for name, entry in backends.items():
+        if "error" in entry:
+            lines.append(f"  {name}: failed - {entry['error']}")
+            continue
+        s = entry["summary"]
+        quality = s.get("quality") or {}
+        lines.append(
+            f"  {name}: rtf {s['rtf_mean']} (p90 {s['rtf_p90']}, x{s['speedup']} vs reference)"
+            f", mel distance {quality.get('mel_distance_db_mean', 'n/a')} dB"
+            f", duration {quality.get('duration_delta_pct_mean', 'n/a')}%"
+        )
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare engine backends on a fixed sentence set")
+    parser.add_argument("--backends", default="cpu,cpu-int8", help="Comma-separated VIENEU_ENGINE_BACKEND presets; the first is the reference")
+    parser.add_argument("--engine", help="VIENEU_ENGINE override (e.g. bench.stand_in:Vieneu to test the harness)")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per sentence (the median is reported)")
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=3600.0, help="Seconds allowed per backend, including the model load")
+    parser.add_argument("--out", help="Write JSON results here")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_backend(args)
+        return
+
+    names = [n.strip() for n in args.backends.split(",") if n.strip()]
+    backends, audio = {}, {}
+    with tempfile.TemporaryDirectory(prefix="vieneu-compare-") as tmp:
+        for name in names:
+            workdir = Path(tmp) / name
+            workdir.mkdir()
+            command = [sys.executable, "-m", "bench.compare", "--worker", name, "--workdir", str(workdir),
+                       "--repeats", str(args.repeats), "--warmup", str(args.warmup)]
+            if args.engine:
+                command += ["--engine", args.engine]
+            print(f"[compare] {name} ...", file=sys.stderr)
+            # A fresh process per backend: thread pools, quantized weights and runtimes do not leak between runs
+            proc = subprocess.run(command, cwd=BACKEND_DIR, timeout=args.timeout)
+            result_path = workdir / "result.json"
+            if proc.returncode != 0 or not result_path.exists():
+                backends[name] = {"error": f"worker exited with status {proc.returncode}"}
+                continue
+            backends[name] = json.loads(result_path.read_text(encoding="utf-8"))
+            if "error" not in backends[name]:
+                with np.load(workdir / "audio.npz") as npz:
+                    audio[name] = [npz[f"arr_{i}"] for i in range(len(SENTENCES))]
+
+    reference: Optional[str] = next((n for n in names if n in audio), None)
+    if reference is None:
+        raise SystemExit("no backend produced audio")
+    for name in audio:
+        backends[name]["summary"] = score(backends[reference], backends[name], audio[reference], audio[name])
+
+    output = {
+        "meta": {
+            **git_revision(),
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("out", "worker", "workdir")},
+            "sentences": list(SENTENCES),
+        },
+        "reference": reference,
+        "backends": backends,
+    }
+    text = json.dumps(output, indent=2, sort_keys=True, ensure_ascii=False)
+    if args.out:
+        Path(args.out).write_text(text + "\n", encoding="utf-8")
+    print(text)
+    print("\n".join(report(backends, reference)))
+
+
+if __name__ == "__main__":
+    main()
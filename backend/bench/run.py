@@ -0,0 +1,375 @@
+"""
+Benchmark Runner - Load and latency harness for the TTS backend
+Serves main.app on the stand-in engine (or targets --url) and writes machine-readable JSON results
+
+    cd backend
+    python -m bench.run --concurrency 8 --requests 300 --out bench.json
+    python -m bench.run --concurrency 8 --requests 300 --out new.json --compare bench.json
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import wave
+import random
+import socket
+import argparse
+import asyncio
+import platform
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).parent.parent
+
+SCENARIOS = ("generate", "stream", "clone", "audio", "history")
+# Character ranges per length class (the /generate limit is 500)
+LENGTHS = {"short": (20, 60), "medium": (100, 250), "long": (300, 500)}
+WORDS = (
+    "xin chào hôm nay trời đẹp chúng ta cùng nhau học tiếng việt một hai ba bốn năm sáu bảy tám "
+    "chín mười tổng đài viên sẽ trả lời quý khách trong giây lát vui lòng nhấn phím để gặp bộ phận "
+    "chăm sóc khách hàng cảm ơn bạn đã lắng nghe bài học hôm nay"
+).split()
+
+
+def parse_mix(spec: str, names) -> Dict[str, float]:
+    """`a=3,b=1` -> normalized weights; unknown names are an error"""
+    weights = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in names:
+            raise SystemExit(f"unknown mix entry {name!r} (choose from {', '.join(names)})")
+        weights[name] = float(weight or 1)
+    total = sum(weights.values())
+    if total <= 0:
+        raise SystemExit(f"mix {spec!r} has no weight")
+    return {name: w / total for name, w in weights.items()}
+
+
+def make_text(rng: random.Random, length_class: str) -> str:
+    low, high = LENGTHS[length_class]
+    target = rng.randint(low, high)
+    words = []
+    while sum(len(w) + 1 for w in words) < target:
+        words.append(rng.choice(WORDS))
+    text = " ".join(words)[:high - 1].rstrip()
+    return text[0].upper() + text[1:] + "."
+
+
+def build_plan(args) -> List[tuple]:
+    """Deterministic (scenario, length class, text) list for the whole run"""
+    rng = random.Random(args.seed)
+    scenarios = parse_mix(args.mix, SCENARIOS)
+    lengths = parse_mix(args.lengths, tuple(LENGTHS))
+    seen: Dict[str, List[str]] = {name: [] for name in LENGTHS}
+    plan = []
+    for _ in range(args.requests):
+        scenario = rng.choices(list(scenarios), weights=list(scenarios.values()))[0]
+        length_class = rng.choices(list(lengths), weights=list(lengths.values()))[0]
+        if seen[length_class] and rng.random() < args.repeat:
+            text = rng.choice(seen[length_class])
+        else:
+            text = make_text(rng, length_class)
+            seen[length_class].append(text)
+        plan.append((scenario, length_class, text))
+    return plan
+
+
+def reference_wav(seconds: float = 3.0, sample_rate: int = 24000) -> bytes:
+    t = np.arange(int(seconds * sample_rate), dtype=np.float32) / sample_rate
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes((0.3 * np.sin(2 * np.pi * 180 * t) * 32767).astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+def summarize(values: List[float]) -> Optional[dict]:
+    """Latency percentiles in milliseconds"""
+    if not values:
+        return None
+    ms = np.asarray(values) * 1000.0
+    return {
+        "p50": round(float(np.percentile(ms, 50)), 2),
+        "p95": round(float(np.percentile(ms, 95)), 2),
+        "p99": round(float(np.percentile(ms, 99)), 2),
+        "mean": round(float(ms.mean()), 2),
+        "max": round(float(ms.max()), 2),
+    }
+
+
+class LoopLagProbe:
+    """Runs on the server's event loop and records how late each timer fires"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self.running = True
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while self.running:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(args, workdir: Path):
+    """Serve main.app from a thread with its own event loop; returns (server, thread, loop, base url)"""
+    os.environ["VIENEU_ENGINE"] = args.engine
+    # Nothing is read from or left in backend/storage, so every run starts cold
+    os.environ["VIENEU_STORAGE_DIR"] = str(workdir / "storage")
+    os.environ["VIENEU_OUTPUT_DIR"] = str(workdir / "Output")
+    os.environ["VIENEU_DB_PATH"] = str(workdir / "studio.db")
+    os.environ["VIENEU_EAGER_LOAD"] = "1"
+    os.environ["VIENEU_BENCH_BASE_MS"] = str(args.base_ms)
+    os.environ["VIENEU_BENCH_MS_PER_CHAR"] = str(args.ms_per_char)
+    os.environ["VIENEU_BENCH_AUDIO_PER_CHAR"] = str(args.audio_per_char)
+    os.environ["VIENEU_BENCH_FRONTEND_MS_PER_CHAR"] = str(args.frontend_ms_per_char)
+    os.environ["VIENEU_BENCH_HOLD_GIL"] = "1" if args.hold_gil else "0"
+    sys.path.insert(0, str(BACKEND_DIR))
+
+    import uvicorn
+    import main
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_until_complete, args=(server.serve(),), daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 30
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise SystemExit("server did not start")
+        time.sleep(0.05)
+    return server, thread, loop, f"http://127.0.0.1:{port}"
+
+
+async def wait_ready(client, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health/ready")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.2)
+    raise SystemExit("engine never became ready (GET /health/ready)")
+
+
+async def timed_request(client, method: str, url: str, **kwargs) -> tuple:
+    """(status, total seconds, time to first body byte, body)"""
+    started = time.perf_counter()
+    first = None
+    chunks = []
+    async with client.stream(method, url, **kwargs) as response:
+        async for chunk in response.aiter_bytes():
+            if first is None:
+                first = time.perf_counter() - started
+            chunks.append(chunk)
+    total = time.perf_counter() - started
+    return response.status_code, total, first if first is not None else total, b"".join(chunks)
+
+
+async def run_scenario(client, scenario: str, text: str, args, state: dict) -> tuple:
+    if scenario in ("generate", "stream"):
+        payload = {"text": text, "voice_id": args.voice, "streaming": scenario == "stream"}
+        status, total, ttfb, body = await timed_request(client, "POST", "/api/tts/generate", json=payload)
+        if scenario == "generate" and status == 200:
+            audio_id = json.loads(body).get("id")
+            if audio_id:
+                state["audio_ids"].append(audio_id)
+        return status, total, ttfb
+    if scenario == "clone":
+        files = {"ref_audio": ("ref.wav", state["reference"], "audio/wav")}
+        data = {"text": text, "ref_text": "Đây là giọng mẫu."}
+        status, total, ttfb, _ = await timed_request(client, "POST", "/api/tts/clone", data=data, files=files)
+        return status, total, ttfb
+    if scenario == "audio":
+        if not state["audio_ids"]:
+            return await run_scenario(client, "generate", text, args, state)
+        audio_id = state["rng"].choice(state["audio_ids"])
+        status, total, ttfb, _ = await timed_request(client, "GET", f"/api/tts/audio/{audio_id}")
+        return status, total, ttfb
+    status, total, ttfb, _ = await timed_request(client, "GET", "/api/history/", params={"limit": 50})
+    return status, total, ttfb
+
+
+async def drive(args, base_url: str) -> dict:
+    import httpx
+
+    plan = build_plan(args)
+    state = {"audio_ids": [], "reference": reference_wav(), "rng": random.Random(args.seed + 1)}
+    records = {name: {"latency": [], "ttfb": [], "status": {}, "errors": 0} for name in SCENARIOS}
+    queue = list(reversed(plan))
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        await wait_ready(client, args.timeout)
+
+        # Warm-up requests are not recorded
+        for scenario, _, text in plan[:args.warmup]:
+            try:
+                await run_scenario(client, scenario, text, args, state)
+            except Exception:
+                pass
+
+        async def worker():
+            while queue:
+                scenario, length_class, text = queue.pop()
+                record = records[scenario]
+                try:
+                    status, total, ttfb = await run_scenario(client, scenario, text, args, state)
+                except Exception as e:
+                    record["errors"] += 1
+                    record["status"][type(e).__name__] = record["status"].get(type(e).__name__, 0) + 1
+                    continue
+                record["status"][str(status)] = record["status"].get(str(status), 0) + 1
+                if status < 400:
+                    record["latency"].append(total)
+                    record["ttfb"].append(ttfb)
+                else:
+                    record["errors"] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    scenarios = {}
+    for name, record in records.items():
+        count = len(record["latency"]) + record["errors"]
+        if count == 0:
+            continue
+        scenarios[name] = {
+            "requests": count,
+            "errors": record["errors"],
+            "status": dict(sorted(record["status"].items())),
+            "throughput_rps": round(len(record["latency"]) / elapsed, 2),
+            "latency_ms": summarize(record["latency"]),
+            "ttfb_ms": summarize(record["ttfb"]),
+        }
+    ok = sum(len(r["latency"]) for r in records.values())
+    return {
+        "summary": {
+            "requests": len(plan),
+            "succeeded": ok,
+            "errors": len(plan) - ok,
+            "duration_s": round(elapsed, 3),
+            "throughput_rps": round(ok / elapsed, 2),
+        },
+        "scenarios": scenarios,
+    }
+
+
+def git_revision() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BACKEND_DIR, capture_output=True, text=True).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+def compare(baseline: dict, current: dict) -> List[str]:
+    """Human-readable deltas of p50/p95/p99 latency and throughput per scenario"""
+    def delta(old, new):
+        if old in (None, 0) or new is None:
+            return f"{old} -> {new}"
+        return f"{old} -> {new} ({(new - old) / old * 100:+.1f}%)"
+
+    lines = [f"baseline {baseline['meta'].get('commit')} vs current {current['meta'].get('commit')}"]
+    for name, now in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            lines.append(f"  {name}: new scenario")
+            continue
+        lines.append(f"  {name}: throughput {delta(before['throughput_rps'], now['throughput_rps'])} rps")
+        for metric in ("latency_ms", "ttfb_ms"):
+            for p in ("p50", "p95", "p99"):
+                old = (before.get(metric) or {}).get(p)
+                new = (now.get(metric) or {}).get(p)
+                lines.append(f"    {metric[:-3]} {p}: {delta(old, new)} ms")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load and latency benchmark for the VieNeu backend")
+    parser.add_argument("--url", help="Benchmark a running server instead of starting one in-process")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--mix", default="generate=6,stream=1,clone=1,audio=1,history=1", help="Scenario weights")
+    parser.add_argument("--lengths", default="short=5,medium=3,long=2", help="Text length class weights")
+    parser.add_argument("--repeat", type=float, default=0.0, help="Share of requests reusing an earlier text (cache hits)")
+    parser.add_argument("--voice", default="ngoc-huyen")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--engine", default="bench.stand_in:Vieneu", help="VIENEU_ENGINE for the in-process server")
+    parser.add_argument("--base-ms", type=float, default=40.0, help="Stand-in engine fixed latency per call")
+    parser.add_argument("--ms-per-char", type=float, default=1.5, help="Stand-in engine latency per character")
+    parser.add_argument("--audio-per-char", type=float, default=0.06, help="Stand-in audio seconds per character")
+    parser.add_argument("--frontend-ms-per-char", type=float, default=0.0, help="Stand-in engine normalization cost per character (skipped when the frontend already normalized)")
+    parser.add_argument("--hold-gil", action="store_true", help="Stand-in engine busy-waits instead of sleeping")
+    parser.add_argument("--out", help="Write JSON results here")
+    parser.add_argument("--compare", help="Baseline JSON results to diff against")
+    args = parser.parse_args()
+
+    probe = None
+    with tempfile.TemporaryDirectory(prefix="vieneu-bench-") as workdir:
+        if args.url:
+            base_url = args.url.rstrip("/")
+        else:
+            server, thread, loop, base_url = start_server(args, Path(workdir))
+            probe = LoopLagProbe()
+            asyncio.run_coroutine_threadsafe(probe.run(), loop)
+
+        results = asyncio.run(drive(args, base_url))
+
+        if probe is not None:
+            probe.running = False
+            server.should_exit = True
+            thread.join(timeout=30)
+
+    config = {k: v for k, v in vars(args).items() if k not in ("out", "compare")}
+    if args.url:
+        for key in ("engine", "base_ms", "ms_per_char", "audio_per_char", "frontend_ms_per_char", "hold_gil"):
+            config.pop(key)
+    output = {
+        "meta": {
+            **git_revision(),
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "config": config,
+        },
+        **results,
+        "event_loop_lag_ms": summarize(probe.samples) if probe is not None else None,
+    }
+
+    text = json.dumps(output, indent=2, sort_keys=True, ensure_ascii=False)
+    if args.out:
+        Path(args.out).write_text(text + "\n", encoding="utf-8")
+    print(text)
+    if args.compare:
+        print("\n".join(compare(json.loads(Path(args.compare).read_text(encoding="utf-8")), output)))
+
+
+if __name__ == "__main__":
+    main()
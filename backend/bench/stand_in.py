@@ -0,0 +1,90 @@
+"""
+Stand-in Engine - Deterministic `Vieneu` replacement for benchmarks
+Latency and audio length scale with text length; select it with VIENEU_ENGINE=bench.stand_in:Vieneu
+"""
+
+import os
+import time
+import wave
+import zlib
+import hashlib
+
+import numpy as np
+
+BASE_MS = float(os.getenv("VIENEU_BENCH_BASE_MS", "40"))
+MS_PER_CHAR = float(os.getenv("VIENEU_BENCH_MS_PER_CHAR", "1.5"))
+AUDIO_SECONDS_PER_CHAR = float(os.getenv("VIENEU_BENCH_AUDIO_PER_CHAR", "0.06"))
+# Extra cost of each additional batch item, relative to running it alone
+BATCH_ITEM_COST = float(os.getenv("VIENEU_BENCH_BATCH_ITEM_COST", "0.3"))
+# Text normalization cost, paid inside infer() unless skip_normalize is passed (as in the SDK)
+FRONTEND_MS_PER_CHAR = float(os.getenv("VIENEU_BENCH_FRONTEND_MS_PER_CHAR", "0"))
+ENCODE_REFERENCE_MS = float(os.getenv("VIENEU_BENCH_ENCODE_MS", "150"))
+# Busy-wait instead of sleeping, to model an engine that holds the GIL
+HOLD_GIL = os.getenv("VIENEU_BENCH_HOLD_GIL", "0") == "1"
+# Read-only array standing in for model weights, to measure memory sharing between processes
+WEIGHTS_MB = float(os.getenv("VIENEU_BENCH_WEIGHTS_MB", "0"))
+SAMPLE_RATE = 24000
+
+
+def _work(seconds: float):
+    if HOLD_GIL:
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            pass
+    else:
+        time.sleep(seconds)
+
+
+class Vieneu:
+    """Same surface the backend uses from the real SDK, without a model"""
+
+    sample_rate = SAMPLE_RATE
+    device = "cpu"
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.weights = np.ones(int(WEIGHTS_MB * 1024 * 1024 / 4), dtype=np.float32)
+
+    @staticmethod
+    def _seconds(text: str) -> float:
+        return (BASE_MS + MS_PER_CHAR * len(text)) / 1000.0
+
+    @staticmethod
+    def _waveform(text: str) -> np.ndarray:
+        # Tone pitch derived from the text, so equal inputs give equal audio
+        samples = max(1, int(len(text) * AUDIO_SECONDS_PER_CHAR * SAMPLE_RATE))
+        freq = 120 + zlib.crc32(text.encode("utf-8")) % 240
+        t = np.arange(samples, dtype=np.float32) / SAMPLE_RATE
+        return (0.3 * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+
+    @staticmethod
+    def _normalize(text: str):
+        _work(FRONTEND_MS_PER_CHAR * len(text) / 1000.0)
+
+    def infer(self, text: str, skip_normalize: bool = False, **kwargs) -> np.ndarray:
+        if not skip_normalize:
+            self._normalize(text)
+        _work(self._seconds(text))
+        return self._waveform(text)
+
+    def infer_batch(self, texts, skip_normalize: bool = False, **kwargs):
+        if not skip_normalize:
+            for text in texts:
+                self._normalize(text)
+        costs = [self._seconds(t) for t in texts]
+        longest = max(costs)
+        _work(longest + BATCH_ITEM_COST * (sum(costs) - longest))
+        return [self._waveform(t) for t in texts]
+
+    def encode_reference(self, path: str) -> np.ndarray:
+        _work(ENCODE_REFERENCE_MS / 1000.0)
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).digest()
+        return np.frombuffer(digest, dtype=np.int32).copy()
+
+    def save(self, audio: np.ndarray, path: str):
+        with wave.open(path, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(SAMPLE_RATE)
+            f.writeframes((np.clip(audio, -1.0, 1.0) * 32767.0).astype("<i2").tobytes())
@@ -5,9 +5,12 @@ Provides REST API for TTS generation, voice cloning, and training management.
 
 import os
 import sys
+import asyncio
 from pathlib import Path
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from dotenv import load_dotenv
 
 # Add VieNeu-TTS to path
@@ -16,10 +19,55 @@ sys.path.insert(0, str(VIENEU_PATH))
 
 load_dotenv()
 
+# Load the model at startup instead of on the first request
+EAGER_LOAD = os.getenv("VIENEU_EAGER_LOAD", "1") == "1"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from api.tts import start_engine, inference_pool, output_index
+    from api.inference_server import INFERENCE_SOCKETS
+    from api.training import training_supervisor
+    from api import batch, longform
+    from api.models import import_manager
+    from api.leader import leadership
+    
+    # With inference servers, this only tracks their state; the servers load the model
+    warmup = asyncio.create_task(start_engine()) if EAGER_LOAD or INFERENCE_SOCKETS else None
+    
+    async def run_background_work():
+        # Exactly one API worker resumes and runs queued work
+        output_index.start()
+        training_supervisor.start()
+        batch.resume_unfinished()
+        await longform.resume_unfinished()
+        await import_manager.start()
+    
+    election = None
+    if leadership.try_acquire():
+        await run_background_work()
+    else:
+        training_supervisor.follow()
+        election = asyncio.create_task(leadership.wait(run_background_work))
+    yield
+    if election is not None:
+        election.cancel()
+    await import_manager.shutdown()
+    await batch.shutdown()
+    await longform.shutdown()
+    await training_supervisor.shutdown()
+    output_index.stop()
+    leadership.release()
+    if warmup is not None:
+        warmup.cancel()
+    inference_pool.shutdown()
+
+
 app = FastAPI(
     title="VieNeu TTS Studio API",
     description="API for Vietnamese Text-to-Speech with voice cloning",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # CORS configuration
@@ -31,16 +79,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route latency for /metrics
+from api.metrics import MetricsMiddleware, registry
+
+app.add_middleware(MetricsMiddleware)
+
 # Import routers
 from api.tts import router as tts_router
 from api.models import router as models_router
 from api.training import router as training_router
 from api.history import router as history_router
+from api.longform import router as longform_router
+from api.batch import router as batch_router
 
 app.include_router(tts_router, prefix="/api/tts", tags=["TTS"])
 app.include_router(models_router, prefix="/api/models", tags=["Models"])
 app.include_router(training_router, prefix="/api/training", tags=["Training"])
 app.include_router(history_router, prefix="/api/history", tags=["History"])
+app.include_router(longform_router, prefix="/api/longform", tags=["Long-form"])
+app.include_router(batch_router, prefix="/api/batch", tags=["Batch"])
 
 
 @app.get("/")
@@ -50,13 +107,45 @@ async def root():
 
 @app.get("/health")
 async def health():
+    from api.tts import engine_status, engine_ready, gpu_available, memory_usage, inference_pool
+    
     return {
         "status": "healthy",
-        "gpu_available": True,  # TODO: Check actual GPU status
-        "model_loaded": False,  # TODO: Check model status
+        "gpu_available": gpu_available(),
+        "model_loaded": engine_status["state"] in ("warming", "ready"),
+        "ready": engine_ready(),
+        "engine": engine_status,
+        "memory": memory_usage(),
+        "inference": inference_pool.stats(),
     }
 
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of pipeline stage latencies, throughput and resource usage"""
+    # Engine, cache and adapter gauges are registered when api.tts is imported for its router above
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/health/live")
+async def liveness():
+    """Process is up and the event loop is responsive"""
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+async def readiness():
+    """503 until the engine is loaded and warmed, so load balancers hold traffic back"""
+    from api.tts import engine_status, engine_ready
+    
+    if not engine_ready():
+        return JSONResponse(
+            status_code=503,
+            content={"status": "not_ready", "state": engine_status["state"], "error": engine_status["error"]},
+        )
+    return {"status": "ready", "state": engine_status["state"]}
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,21 @@
+"""
+Shared test setup: an isolated database and output directory, and the stand-in engine
+Set before any api module is imported, since they read their paths at import time
+
+    cd backend
+    python -m pytest tests
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+_root = Path(tempfile.mkdtemp(prefix="vieneu-tests-"))
+os.environ.setdefault("VIENEU_STORAGE_DIR", str(_root / "storage"))
+os.environ.setdefault("VIENEU_DB_PATH", str(_root / "studio.db"))
+os.environ.setdefault("VIENEU_OUTPUT_DIR", str(_root / "Output"))
+os.environ.setdefault("VIENEU_ENGINE", "bench.stand_in:Vieneu")
+os.environ.setdefault("VIENEU_EAGER_LOAD", "0")
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
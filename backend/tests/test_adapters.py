@@ -0,0 +1,157 @@
+import time
+import threading
+
+import pytest
+
+from api import adapters
+from api.adapters import AdapterManager
+
+
+class SingleSlotEngine:
+    """VieNeu SDK style: one LoRA at a time; records calls and the inference running during each"""
+
+    def __init__(self):
+        self.events = []
+        self.running = 0
+
+    def load_lora_adapter(self, source):
+        self.events.append(("load", source.rsplit("/", 1)[-1], self.running))
+
+    def unload_lora_adapter(self):
+        self.events.append(("unload", None, self.running))
+
+
+class MultiSlotEngine:
+    """PEFT style: several adapters resident at once"""
+
+    def __init__(self):
+        self.loaded = set()
+
+    def load_adapter(self, source, adapter_name):
+        self.loaded.add(adapter_name)
+
+    def set_adapter(self, name):
+        assert name in self.loaded
+
+    def delete_adapter(self, name):
+        self.loaded.discard(name)
+
+
+@pytest.fixture(autouse=True)
+def models_dir(tmp_path, monkeypatch):
+    for name in ("a", "b", "c", "d"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "adapter.safetensors").write_bytes(b"\0" * 10)
+    monkeypatch.setattr(adapters, "MODELS_DIR", tmp_path)
+
+
+def _infer(manager, engine, adapter_id, started, release):
+    with manager.use(engine, adapter_id):
+        engine.running += 1
+        started.set()
+        release.wait(5)
+        engine.running -= 1
+
+
+def test_switch_waits_for_inflight_calls_to_drain():
+    manager, engine = AdapterManager(), SingleSlotEngine()
+    started, release = threading.Event(), threading.Event()
+    first = threading.Thread(target=_infer, args=(manager, engine, "a", started, release))
+    first.start()
+    assert started.wait(5)
+
+    second_started = threading.Event()
+    done = threading.Event()
+    done.set()
+    second = threading.Thread(target=_infer, args=(manager, engine, "b", second_started, done))
+    second.start()
+    time.sleep(0.1)
+    # "b" must not replace "a" under a running call
+    assert not second_started.is_set()
+    assert [e[:2] for e in engine.events] == [("load", "a")]
+
+    release.set()
+    first.join(5)
+    assert second_started.wait(5)
+    second.join(5)
+    assert [e[:2] for e in engine.events] == [("load", "a"), ("unload", None), ("load", "b")]
+    assert all(running == 0 for _, _, running in engine.events)
+
+
+def test_calls_on_the_active_adapter_run_together():
+    manager, engine = AdapterManager(), SingleSlotEngine()
+    release = threading.Event()
+    starts = [threading.Event() for _ in range(3)]
+    threads = [threading.Thread(target=_infer, args=(manager, engine, "a", s, release)) for s in starts]
+    for t in threads:
+        t.start()
+    assert all(s.wait(5) for s in starts)
+    assert engine.running == 3
+    release.set()
+    for t in threads:
+        t.join(5)
+    assert [e[:2] for e in engine.events] == [("load", "a")]
+    assert manager.stats()["hits"] == 2
+
+
+def test_pinned_adapter_is_not_evicted():
+    manager, engine = AdapterManager(max_slots=2), MultiSlotEngine()
+    manager.pin(engine, "a")
+    for adapter_id in ("b", "c"):
+        with manager.use(engine, adapter_id):
+            pass
+    # "a" is the least recently used, but pinned
+    assert "a" in engine.loaded
+    manager.unpin("a")
+    with manager.use(engine, "d"):
+        pass
+    assert "a" not in engine.loaded
+
+
+def test_stats_do_not_wait_for_a_load():
+    loading, finish = threading.Event(), threading.Event()
+
+    class SlowEngine(MultiSlotEngine):
+        def load_adapter(self, source, adapter_name):
+            loading.set()
+            finish.wait(5)
+            super().load_adapter(source, adapter_name)
+
+    manager, engine = AdapterManager(), SlowEngine()
+    worker = threading.Thread(target=lambda: manager.use(engine, "a").__enter__())
+    worker.start()
+    assert loading.wait(5)
+    started = time.monotonic()
+    assert manager.stats()["resident"] == []
+    assert time.monotonic() - started < 0.5
+    finish.set()
+    worker.join(5)
+    assert [r["id"] for r in manager.stats()["resident"]] == ["a"]
+
+
+def test_waiting_switch_holds_back_new_calls_on_the_active_adapter():
+    manager, engine = AdapterManager(), SingleSlotEngine()
+    done = threading.Event()
+    done.set()
+    started, release = threading.Event(), threading.Event()
+    first = threading.Thread(target=_infer, args=(manager, engine, "a", started, release))
+    first.start()
+    assert started.wait(5)
+
+    switch_started = threading.Event()
+    switch = threading.Thread(target=_infer, args=(manager, engine, "b", switch_started, done))
+    switch.start()
+    time.sleep(0.1)
+    late_started = threading.Event()
+    late = threading.Thread(target=_infer, args=(manager, engine, "a", late_started, done))
+    late.start()
+    time.sleep(0.1)
+    # Without the bound this call would join "a" and keep "b" waiting
+    assert not late_started.is_set()
+
+    release.set()
+    for t in (first, switch, late):
+        t.join(5)
+    assert [e[:2] for e in engine.events] == [
+        ("load", "a"), ("unload", None), ("load", "b"), ("unload", None), ("load", "a"),
+    ]
@@ -0,0 +1,73 @@
+import json
+import asyncio
+from datetime import datetime
+
+from api import batch
+from api.batch import BatchJob, BatchRow, BatchStatus, plan_batches, _job_dir, _load_results, _row_path
+from api.batching import MAX_BATCH_CHARS, MAX_BATCH_SIZE
+
+
+def _rows():
+    rows = [BatchRow(id=f"a{i}", text="x" * (10 + i * 7), voice_id="ngoc-huyen") for i in range(20)]
+    rows += [BatchRow(id=f"b{i}", text="y" * (5 + i), voice_id="default") for i in range(5)]
+    rows.append(BatchRow(id="long", text="z" * (MAX_BATCH_CHARS + 1), voice_id="default"))
+    return rows
+
+
+def test_plan_batches_groups_by_voice_within_limits():
+    rows = _rows()
+    batches = plan_batches(rows)
+
+    assert sorted(r.id for b in batches for r in b) == sorted(r.id for r in rows)
+    for b in batches:
+        assert len({r.voice_id for r in b}) == 1
+        assert len(b) <= MAX_BATCH_SIZE
+        assert len(b) == 1 or sum(len(r.text) for r in b) <= MAX_BATCH_CHARS
+        lengths = [len(r.text) for r in b]
+        assert lengths == sorted(lengths)
+
+
+def _make_job(job_id: str, rows, manifest_lines):
+    directory = _job_dir(job_id)
+    (directory / "audio").mkdir(parents=True, exist_ok=True)
+    with open(directory / "rows.jsonl", "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(row.model_dump_json() + "\n")
+    (directory / "manifest.jsonl").write_text("".join(manifest_lines), encoding="utf-8")
+    return BatchJob(
+        id=job_id, filename="script.csv", voice_id="default", status=BatchStatus.QUEUED,
+        total=len(rows), created_at=datetime.now().isoformat(),
+    )
+
+
+def test_load_results_keeps_the_latest_entry_and_skips_a_torn_line():
+    _make_job("0000000000000001", [], [
+        json.dumps({"id": "r1", "status": "error", "error": "busy"}) + "\n",
+        json.dumps({"id": "r2", "status": "done"}) + "\n",
+        json.dumps({"id": "r1", "status": "done"}) + "\n",
+        '{"id": "r3", "sta',
+    ])
+    results = _load_results("0000000000000001")
+    assert set(results) == {"r1", "r2"}
+    assert results["r1"]["status"] == "done"
+
+
+def test_resume_renders_only_missing_rows():
+    job_id = "0000000000000002"
+    rows = [BatchRow(id=f"r{i}", text=f"Dòng số {i} của kịch bản.", voice_id="default") for i in range(4)]
+    job = _make_job(job_id, rows, [
+        json.dumps({"id": "r0", "status": "done"}) + "\n",
+        json.dumps({"id": "r1", "status": "error", "error": "busy"}) + "\n",
+        # Listed as done, but its file is gone: rendered again
+        json.dumps({"id": "r2", "status": "done"}) + "\n",
+    ])
+    kept = _row_path(job_id, "r0")
+    kept.write_bytes(b"kept")
+
+    asyncio.run(batch.render_job(job))
+
+    assert job.status == BatchStatus.COMPLETED, job.error
+    assert job.done == 4 and job.failed == 0
+    assert kept.read_bytes() == b"kept"
+    rendered = [json.loads(line)["id"] for line in (_job_dir(job_id) / "manifest.jsonl").read_text().splitlines()[3:]]
+    assert sorted(rendered) == ["r1", "r2", "r3"]
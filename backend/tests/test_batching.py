@@ -0,0 +1,45 @@
+import asyncio
+
+from api.batching import MicroBatcher
+from api.inference import InferencePool
+
+
+def _batcher(calls, **limits):
+    def batch_fn(engine, key, payloads):
+        calls.append((key, list(payloads)))
+        return [f"{key}:{payload}" for payload in payloads]
+
+    return MicroBatcher(InferencePool(lambda: "engine", workers=2, queue_size=8), batch_fn, **limits)
+
+
+def test_requests_sharing_a_key_run_as_one_batch():
+    calls = []
+    batcher = _batcher(calls, window_ms=50, max_batch_size=8, max_batch_chars=1000)
+
+    async def run():
+        jobs = [batcher.submit("voice-a", i, cost=1) for i in range(3)] + [batcher.submit("voice-b", 9, cost=1)]
+        return await asyncio.gather(*jobs)
+
+    try:
+        assert asyncio.run(run()) == ["voice-a:0", "voice-a:1", "voice-a:2", "voice-b:9"]
+        assert sorted(calls) == [("voice-a", [0, 1, 2]), ("voice-b", [9])]
+        assert batcher.stats()["batch_size_distribution"] == {"1": 1, "3": 1}
+    finally:
+        batcher.pool.shutdown()
+
+
+def test_full_groups_flush_before_the_window():
+    calls = []
+    batcher = _batcher(calls, window_ms=10_000, max_batch_size=2, max_batch_chars=5)
+
+    async def run():
+        by_size = await asyncio.wait_for(asyncio.gather(*(batcher.submit("v", i, cost=1) for i in range(4))), 2)
+        # A request that would push the group past the character limit starts a new group
+        by_chars = await asyncio.wait_for(asyncio.gather(batcher.submit("w", "long", cost=4), batcher.submit("w", "more", cost=5)), 2)
+        return by_size + by_chars
+
+    try:
+        assert asyncio.run(run()) == ["v:0", "v:1", "v:2", "v:3", "w:long", "w:more"]
+        assert sorted(calls) == [("v", [0, 1]), ("v", [2, 3]), ("w", ["long"]), ("w", ["more"])]
+    finally:
+        batcher.pool.shutdown()
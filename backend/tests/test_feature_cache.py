@@ -0,0 +1,63 @@
+import json
+
+import numpy as np
+import pytest
+
+from api import feature_cache
+from api.feature_cache import FeatureStore, encode_dataset
+
+
+class CountingEncoder:
+    version = "test-encoder"
+
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, feature, audio_path, text):
+        self.calls.append((feature, audio_path.name))
+        if feature == "codes":
+            return np.arange(6, dtype=np.int32)
+        return np.frombuffer(text.encode("utf-32-le"), dtype="<u4")
+
+
+@pytest.fixture(autouse=True)
+def features_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(feature_cache, "FEATURES_DIR", tmp_path / "features")
+
+
+def _job(tmp_path, name, clips):
+    job_dir = tmp_path / name
+    job_dir.mkdir()
+    with open(job_dir / "prepared.jsonl", "w", encoding="utf-8") as f:
+        for clip in clips:
+            f.write(json.dumps(clip, ensure_ascii=False) + "\n")
+    return job_dir
+
+
+def _text(job_dir, i):
+    meta = json.loads((job_dir / "features.json").read_text(encoding="utf-8"))
+    store = FeatureStore(meta["encoder"])
+    shard, offset, length = (int(v) for v in np.load(job_dir / "features.npy")[i, meta["features"].index("text")])
+    return store.view("text", shard, offset, length).astype("<u4").tobytes().decode("utf-32-le")
+
+
+def test_corrected_transcript_reencodes_only_the_text(tmp_path):
+    encoder = CountingEncoder()
+    first = _job(tmp_path, "first", [
+        {"audio": "a.wav", "sha": "1" * 64, "text": "xin chao"},
+        {"audio": "b.wav", "sha": "2" * 64, "text": "tam biet"},
+        {"audio": "a2.wav", "sha": "1" * 64, "text": "xin chao"},
+    ])
+    assert encode_dataset(first, lambda state: None, encoder=encoder) == {"total": 3, "cached": 0, "encoded": 3}
+    # The duplicate clip is encoded once
+    assert sorted(encoder.calls) == [("codes", "a.wav"), ("codes", "b.wav"), ("text", "a.wav"), ("text", "b.wav")]
+
+    encoder.calls.clear()
+    second = _job(tmp_path, "second", [
+        {"audio": "a.wav", "sha": "1" * 64, "text": "xin chào"},
+        {"audio": "b.wav", "sha": "2" * 64, "text": "tam biet"},
+    ])
+    assert encode_dataset(second, lambda state: None, encoder=encoder) == {"total": 2, "cached": 1, "encoded": 1}
+    assert encoder.calls == [("text", "a.wav")]
+    assert _text(second, 0) == "xin chào"
+    assert _text(first, 0) == "xin chao"
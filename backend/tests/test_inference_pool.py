@@ -0,0 +1,49 @@
+import asyncio
+import threading
+
+import pytest
+
+from api.inference import DeadlineExceeded, InferencePool, PoolSaturated
+
+
+def test_jobs_beyond_capacity_are_rejected():
+    pool = InferencePool(lambda: "engine", workers=1, queue_size=1)
+    release = threading.Event()
+
+    def job(engine, value):
+        release.wait(5)
+        return engine, value
+
+    async def run():
+        admitted = [asyncio.ensure_future(pool.submit(job, i)) for i in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(PoolSaturated) as rejected:
+            await pool.submit(job, 2)
+        assert rejected.value.retry_after >= 1
+        release.set()
+        return await asyncio.gather(*admitted)
+
+    try:
+        assert asyncio.run(run()) == [("engine", 0), ("engine", 1)]
+        stats = pool.stats()
+        assert stats["admitted"] == 0 and stats["rejected"] == 1 and stats["completed"] == 2
+    finally:
+        pool.shutdown()
+
+
+def test_slow_job_times_out_and_frees_its_slot():
+    pool = InferencePool(lambda: "engine", workers=1, queue_size=0)
+    release = threading.Event()
+
+    async def run():
+        with pytest.raises(DeadlineExceeded):
+            await pool.submit(lambda engine: release.wait(5), timeout=0.05)
+        release.set()
+        await asyncio.sleep(0.05)
+        return await pool.submit(lambda engine: engine)
+
+    try:
+        assert asyncio.run(run()) == "engine"
+        assert pool.stats()["timed_out"] == 1
+    finally:
+        pool.shutdown()
@@ -0,0 +1,50 @@
+import asyncio
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from api import tts
+from api.inference import EngineUnreachable
+from api.inference_server import InferenceServer, RemoteInferencePool
+from api.leader import Leadership
+
+
+@pytest.fixture(scope="module")
+def server_socket():
+    socket = str(Path(tempfile.mkdtemp(prefix="vieneu-sock-")) / "inference-0.sock")
+    threading.Thread(target=InferenceServer(socket, workers=2).serve_forever, daemon=True).start()
+    deadline = time.monotonic() + 10
+    while not Path(socket).exists():
+        assert time.monotonic() < deadline, "inference server did not start"
+        time.sleep(0.05)
+    return socket
+
+
+def test_jobs_round_trip_through_an_inference_server(server_socket):
+    pool = RemoteInferencePool([server_socket], workers=2, queue_size=2)
+    pcm, rate = asyncio.run(pool.submit(tts.synthesize_pcm, "Xin chào các bạn.", "default"))
+    assert rate > 0 and len(pcm) > 0 and len(pcm) % 2 == 0
+    assert pool.broadcast(("status",))[0]["workers"] == 2
+
+
+def test_job_errors_are_not_taken_for_an_unreachable_server(server_socket):
+    pool = RemoteInferencePool(["/nonexistent/inference.sock", server_socket], workers=1, queue_size=1)
+    # The dead socket is skipped; the job's own FileNotFoundError comes back unchanged
+    with pytest.raises(FileNotFoundError):
+        asyncio.run(pool.submit(tts.encode_voice, Path("/nonexistent/ref.wav"), "0" * 64, "xin chào"))
+
+    unreachable = RemoteInferencePool(["/nonexistent/inference.sock"], workers=1, queue_size=1)
+    with pytest.raises(EngineUnreachable):
+        asyncio.run(unreachable.submit(tts.synthesize_pcm, "Xin chào.", "default"))
+
+
+def test_one_leader_at_a_time_and_a_follower_takes_over(tmp_path):
+    first, second = Leadership(tmp_path / "studio.db.leader"), Leadership(tmp_path / "studio.db.leader")
+    assert first.try_acquire() and first.is_leader
+    assert not second.try_acquire()
+    first.release()
+    assert second.try_acquire() and not first.is_leader
+    second.release()
@@ -0,0 +1,92 @@
+import asyncio
+import hashlib
+import threading
+
+from api.model_import import BlobStore, ImportManager, ImportSource, ImportStatus, RemoteFile, register_source
+
+WEIGHTS = b"w" * 3000
+CONFIG = b'{"r": 8}'
+
+
+class MemorySource(ImportSource):
+    """Repos held in memory; serves 1000-byte chunks and can stall after the first one"""
+
+    def __init__(self, repos):
+        self.repos = repos
+        self.offsets = []
+        self.stall = None
+
+    def list_files(self, repo_id, revision):
+        return [RemoteFile(path, len(data), hashlib.sha256(data).hexdigest()) for path, data in self.repos[repo_id].items()]
+
+    def open(self, repo_id, revision, remote, offset):
+        self.offsets.append((remote.path, offset))
+        data, stall = self.repos[repo_id][remote.path], self.stall
+
+        def chunks():
+            for start in range(offset, len(data), 1000):
+                yield data[start:start + 1000]
+                if stall is not None:
+                    stall.wait(5)
+
+        return chunks(), offset
+
+
+def _manager(tmp_path, registered):
+    return ImportManager(tmp_path / "models", lambda conn, job: registered.append(job.model_id), BlobStore(tmp_path / "blobs"))
+
+
+def test_identical_files_are_stored_once(tmp_path):
+    source = MemorySource({
+        "org/a": {"adapter.safetensors": WEIGHTS, "adapter_config.json": CONFIG},
+        "org/b": {"adapter.safetensors": WEIGHTS, "adapter_config.json": b'{"r": 16}'},
+    })
+    register_source("memory-dedupe", source)
+    registered = []
+
+    async def run():
+        manager = _manager(tmp_path, registered)
+        first = await manager.submit("org/a", "a", "memory-dedupe")
+        await manager._tasks[first.id]
+        second = await manager.submit("org/b", "b", "memory-dedupe")
+        await manager._tasks[second.id]
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert (first.status, second.status) == (ImportStatus.COMPLETED, ImportStatus.COMPLETED)
+    assert registered == ["a", "b"]
+    assert second.reused_bytes == len(WEIGHTS)
+    assert [path for path, _ in source.offsets].count("adapter.safetensors") == 1
+    weights = tmp_path / "models" / "b" / "adapter.safetensors"
+    assert weights.read_bytes() == WEIGHTS and weights.stat().st_nlink == 3
+    assert len(list((tmp_path / "blobs").glob("??/*"))) == 3
+
+
+def test_cancelled_import_resumes_from_its_partial_file(tmp_path):
+    source = MemorySource({"org/c": {"adapter.safetensors": WEIGHTS}})
+    register_source("memory-resume", source)
+    source.stall = threading.Event()
+    registered = []
+    part = tmp_path / "blobs" / "partial"
+
+    async def run():
+        manager = _manager(tmp_path, registered)
+        job = await manager.submit("org/c", "c", "memory-resume")
+        while not job.done_bytes:
+            await asyncio.sleep(0.01)
+        cancelling = asyncio.ensure_future(manager.cancel(job.id))
+        await asyncio.sleep(0.05)
+        source.stall.set()
+        await cancelling
+        status = job.status
+        source.stall = None
+        await manager.resume(job)
+        await manager._tasks[job.id]
+        return status, job
+
+    cancelled, job = asyncio.run(run())
+    assert cancelled == ImportStatus.CANCELLED
+    assert job.status == ImportStatus.COMPLETED and job.done_bytes == len(WEIGHTS)
+    assert source.offsets == [("adapter.safetensors", 0), ("adapter.safetensors", 1000)]
+    assert (tmp_path / "models" / "c" / "adapter.safetensors").read_bytes() == WEIGHTS
+    assert registered == ["c"] and not (part / job.id).exists()
@@ -0,0 +1,63 @@
+from api.segmenter import ClauseBuffer, split_clauses
+
+
+LONG = (
+    "Thành phố Hồ Chí Minh là trung tâm kinh tế lớn nhất Việt Nam, với hơn chín triệu dân, "
+    "nhiều khu công nghiệp, cảng biển và sân bay quốc tế; đây cũng là nơi tập trung nhiều "
+    "trường đại học và bệnh viện lớn của cả nước. Hôm nay trời đẹp."
+)
+
+
+def test_split_clauses_respects_limits():
+    clauses = split_clauses(LONG, max_chars=80, first_max_chars=40)
+    assert len(clauses[0]) <= 40
+    assert all(len(c) <= 80 for c in clauses)
+    assert " ".join(clauses).split() == LONG.split()
+
+
+def test_split_clauses_keeps_short_text_whole():
+    assert split_clauses("Xin chào các bạn.") == ["Xin chào các bạn."]
+    assert split_clauses("   ") == []
+
+
+def test_split_clauses_keeps_abbreviations():
+    assert split_clauses("Tôi sống ở TP. Hồ Chí Minh từ năm ngoái.") == ["Tôi sống ở TP. Hồ Chí Minh từ năm ngoái."]
+
+
+def test_clause_buffer_emits_at_boundaries():
+    buffer = ClauseBuffer()
+    assert buffer.feed("Xin chào, tôi là trợ") == []
+    assert buffer.feed(" lý ảo. Hôm nay") == ["Xin chào, tôi là trợ lý ảo."]
+    assert buffer.feed(" trời đẹp quá") == []
+    assert buffer.flush() == ["Hôm nay trời đẹp quá"]
+    assert buffer.flush() == []
+
+
+def test_clause_buffer_waits_for_whitespace_after_a_dot():
+    buffer = ClauseBuffer()
+    # "125." may continue as "125.000" and "TP." as an abbreviation
+    assert buffer.feed("Giá vé hôm nay là 125.") == []
+    assert buffer.feed("000 đồng. Tôi ở TP. HCM") == ["Giá vé hôm nay là 125.000 đồng."]
+    assert buffer.flush() == ["Tôi ở TP. HCM"]
+
+
+def test_clause_buffer_cuts_text_without_boundaries():
+    buffer = ClauseBuffer(max_chars=40, first_max_chars=20)
+    clauses = buffer.feed("một hai ba bốn năm sáu bảy tám chín mười ")
+    assert clauses and len(clauses[0]) <= 20
+    clauses += buffer.feed("một hai ba bốn năm sáu bảy tám chín mười một hai ba bốn ")
+    clauses += buffer.flush()
+    assert all(len(c) <= 40 for c in clauses)
+    assert " ".join(clauses).split() == ("một hai ba bốn năm sáu bảy tám chín mười " * 2 + "một hai ba bốn").split()
+
+
+def test_clause_buffer_first_cap_applies_per_turn():
+    buffer = ClauseBuffer(max_chars=80, first_max_chars=20)
+    text = "một hai ba bốn năm sáu bảy tám chín mười một hai"
+    clauses = buffer.feed(text + ", ")
+    assert len(clauses[0]) <= 20 and len(clauses) > 1
+    buffer.flush()
+    buffer.feed("Câu mới")
+    buffer.clear()
+    assert buffer.flush() == []
+    assert len(buffer.feed(text + ", ")[0]) <= 20
@@ -0,0 +1,44 @@
+import asyncio
+
+from api import tts
+
+
+class BlockingSocket:
+    """Holds the first clause message until released, and records what was sent"""
+
+    def __init__(self):
+        self.sent = []
+        self.sending = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def send_json(self, data):
+        if data.get("type") == "clause" and not self.release.is_set():
+            self.sending.set()
+            await self.release.wait()
+        self.sent.append(data)
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+
+def test_cancel_during_a_clause_message_drops_its_audio():
+    async def run():
+        socket = BlockingSocket()
+        session = tts.SpeechSession(socket, "ngoc-huyen", "opus", None, None)
+        clause = tts._Clause(0, "Xin chào các bạn,")
+        clause.job = asyncio.get_running_loop().create_future()
+        clause.job.set_result((b"\0\0" * 2400, 24000))
+        session.queue.append(clause)
+        session.changed.set()
+        sender = asyncio.ensure_future(session._sender())
+
+        await asyncio.wait_for(socket.sending.wait(), 5)
+        await session.cancel()
+        socket.release.set()
+        await asyncio.sleep(0.05)
+        sender.cancel()
+        return session, socket
+
+    session, socket = asyncio.run(run())
+    assert session.encoder is None
+    assert not any(isinstance(data, bytes) for data in socket.sent)
@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+
+from api.synthesis_cache import SynthesisCache
+
+KEY = "a" * 64
+
+
+def _producer(tmp_path, calls, delay=0.05, fail=False):
+    async def produce():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        if fail:
+            raise RuntimeError("engine failed")
+        path = tmp_path / f"out-{len(calls)}.wav"
+        path.write_bytes(b"RIFF" + b"\0" * 40)
+        return path
+    return produce
+
+
+def test_concurrent_misses_generate_once(tmp_path):
+    cache = SynthesisCache(tmp_path / "cache")
+    calls = []
+
+    async def run():
+        produce = _producer(tmp_path, calls)
+        return await asyncio.gather(*(cache.get_or_create(KEY, produce) for _ in range(8)))
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert {path for path, _ in results} == {cache.path(KEY)}
+    assert sorted(cached for _, cached in results) == [False] + [True] * 7
+    assert cache.stats()["coalesced"] == 7 and cache.stats()["inflight"] == 0
+
+
+def test_hit_after_generation(tmp_path):
+    cache = SynthesisCache(tmp_path / "cache")
+    calls = []
+
+    async def run():
+        produce = _producer(tmp_path, calls)
+        await cache.get_or_create(KEY, produce)
+        return await cache.get_or_create(KEY, produce)
+
+    assert asyncio.run(run()) == (cache.path(KEY), True)
+    assert len(calls) == 1
+
+
+def test_failure_reaches_every_waiter_and_is_not_cached(tmp_path):
+    cache = SynthesisCache(tmp_path / "cache")
+    calls = []
+
+    async def run():
+        produce = _producer(tmp_path, calls, fail=True)
+        return await asyncio.gather(*(cache.get_or_create(KEY, produce) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert cache.lookup(KEY) is None and cache.stats()["inflight"] == 0
+
+
+def test_waiter_takes_over_when_the_leader_disconnects(tmp_path):
+    cache = SynthesisCache(tmp_path / "cache")
+    calls = []
+
+    async def run():
+        produce = _producer(tmp_path, calls, delay=0.1)
+        leader = asyncio.ensure_future(cache.get_or_create(KEY, produce))
+        await asyncio.sleep(0.01)
+        follower = asyncio.ensure_future(cache.get_or_create(KEY, produce))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(run()) == (cache.path(KEY), False)
+    assert len(calls) == 2
+
+
+def test_generate_waiter_survives_the_leader_client_leaving(monkeypatch):
+    import wave
+    from fastapi import HTTPException
+    from api import tts
+    from api.inference import ClientDisconnected
+
+    calls = []
+
+    async def submit(voice_id, item, cost, request):
+        text, path = item
+        calls.append(request)
+        await asyncio.sleep(0.05)
+        if request == "leader":
+            raise ClientDisconnected()
+        with wave.open(str(path), "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(24000)
+            f.writeframes(b"\0\0" * 240)
+        return True
+
+    monkeypatch.setattr(tts.generate_batcher, "submit", submit)
+
+    async def run():
+        request = lambda: tts.TTSRequest(text="Người đến trước đã rời đi.")
+        leader = asyncio.ensure_future(tts.generate_speech(request(), "leader"))
+        await asyncio.sleep(0.01)
+        follower = asyncio.ensure_future(tts.generate_speech(request(), "follower"))
+        return await asyncio.gather(leader, follower, return_exceptions=True)
+
+    leader, follower = asyncio.run(run())
+    assert isinstance(leader, HTTPException) and leader.status_code == 499
+    assert isinstance(follower, tts.TTSResponse) and not follower.demo_mode
+    assert calls == ["leader", "follower"]
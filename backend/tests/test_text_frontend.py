@@ -0,0 +1,46 @@
+import pytest
+
+from api.text_frontend import Lexicon, TextFrontend, expand_numbers
+
+
+def test_hits_report_the_time_they_saved():
+    frontend = TextFrontend()
+    for _ in range(3):
+        frontend.normalize("Giá 15.000đ. Còn 20% nữa.")
+    stats = frontend.stats()
+    assert (stats["requests"], stats["hits"], stats["misses"]) == (3, 4, 2)
+    # Two hits per repeat, each worth one mean miss
+    assert stats["seconds_saved"] == pytest.approx(2 * stats["seconds_spent"], abs=2e-6)
+    assert stats["saved_ms_per_request"] == pytest.approx(stats["seconds_saved"] / 3 * 1000, abs=1e-3)
+
+
+@pytest.mark.parametrize("text, spoken", [
+    ("1001", "một nghìn không trăm linh một"),
+    ("21", "hai mươi mốt"),
+    ("25", "hai mươi lăm"),
+    ("0912", "không chín một hai"),
+    ("2.000.000.000", "hai tỷ"),
+    ("3,5%", "ba phẩy năm phần trăm"),
+    ("1.250.000đ", "một triệu hai trăm năm mươi nghìn đồng"),
+    ("15/4/2024", "ngày mười lăm tháng tư năm hai nghìn không trăm hai mươi tư"),
+    ("15-4-2024", "ngày mười lăm tháng tư năm hai nghìn không trăm hai mươi tư"),
+    ("ngày 15-4", "ngày mười lăm tháng tư"),
+    ("hạn chót 15-4", "hạn chót mười lăm tháng tư"),
+    ("5-10 người", "năm đến mười người"),
+    ("7h30", "bảy giờ ba mươi phút"),
+    ("thứ 4", "thứ tư"),
+    ("10 km", "mười ki lô mét"),
+])
+def test_expand_numbers(text, spoken):
+    assert expand_numbers(text) == spoken
+
+
+@pytest.mark.parametrize("text, spoken", [
+    ("Ở TP.HCM hôm nay", "Ở thành phố Hồ Chí Minh hôm nay"),
+    ("ở tp. hcm", "ở thành phố Hồ Chí Minh"),
+    ("COVID-19 và COVID", "cô vít mười chín và cô vít"),
+    ("HCMC", "HCMC"),
+])
+def test_lexicon_matches_whole_tokens_longest_first(text, spoken):
+    lexicon = Lexicon({"TP. HCM": "thành phố Hồ Chí Minh", "COVID": "cô vít", "COVID-19": "cô vít mười chín"})
+    assert lexicon.apply(text) == spoken
@@ -5,10 +5,15 @@
 
 const API_BASE = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
 
+type AudioFormat = "wav" | "flac" | "mp3" | "opus";
+
 interface TTSGenerateRequest {
     text: string;
     voice_id?: string;
     streaming?: boolean;
+    format?: AudioFormat;
+    bitrate?: number;
+    sample_rate?: number;
 }
 
 interface TTSResponse {
@@ -36,6 +41,30 @@ interface LoraModel {
     is_active: boolean;
 }
 
+interface ModelImport {
+    id: string;
+    model_id: string;
+    repo_id: string;
+    source: string;
+    revision?: string;
+    status: "queued" | "downloading" | "completed" | "cancelled" | "error";
+    files_total: number;
+    files_done: number;
+    total_bytes: number;
+    done_bytes: number;
+    reused_bytes: number;
+    current_file?: string;
+    created_at: string;
+    completed_at?: string;
+    error?: string;
+}
+
+interface Lexicon {
+    name: string;
+    entries: number;
+    updated_at: string;
+}
+
 interface HistoryItem {
     id: string;
     text: string;
@@ -48,7 +77,7 @@ interface HistoryItem {
 interface TrainingStatus {
     job: {
         id: string;
-        status: "idle" | "preparing" | "training" | "completed" | "error" | "stopped";
+        status: "idle" | "queued" | "preparing" | "training" | "completed" | "error" | "stopped";
         progress: number;
         current_step: number;
         config: {
@@ -104,6 +133,33 @@ class APIClient {
         });
     }
 
+    // Streaming TTS: resolves as soon as the first clause is ready; read audio from response.body
+    async streamSpeech(request: TTSGenerateRequest): Promise<Response> {
+        const response = await fetch(`${this.baseUrl}/api/tts/generate`, {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({ ...request, streaming: true }),
+        });
+
+        if (!response.ok) {
+            const error = await response.json().catch(() => ({ detail: "Unknown error" }));
+            throw new Error(error.detail || `HTTP ${response.status}`);
+        }
+
+        return response;
+    }
+
+    // Incremental TTS session: send {type: "text" | "flush" | "cancel" | "close"} messages, receive audio frames
+    openSpeechSession(voiceId: string, format: "pcm" | "opus" | "mp3" = "pcm"): WebSocket {
+        const url = new URL("/api/tts/ws", this.baseUrl);
+        url.protocol = url.protocol === "https:" ? "wss:" : "ws:";
+        url.searchParams.set("voice_id", voiceId);
+        url.searchParams.set("format", format);
+        const socket = new WebSocket(url);
+        socket.binaryType = "arraybuffer";
+        return socket;
+    }
+
     async cloneVoice(text: string, refText: string, refAudio: File): Promise<TTSResponse> {
         const formData = new FormData();
         formData.append("text", text);
@@ -123,12 +179,51 @@ class APIClient {
         return response.json();
     }
 
+    async registerVoice(name: string, refText: string, refAudio: File): Promise<{ status: string; voice: { id: string; name: string } }> {
+        const formData = new FormData();
+        formData.append("name", name);
+        formData.append("ref_text", refText);
+        formData.append("ref_audio", refAudio);
+
+        const response = await fetch(`${this.baseUrl}/api/tts/voices`, {
+            method: "POST",
+            body: formData,
+        });
+
+        if (!response.ok) {
+            const error = await response.json().catch(() => ({ detail: "Unknown error" }));
+            throw new Error(error.detail);
+        }
+
+        return response.json();
+    }
+
     async getVoices(): Promise<{ voices: Voice[] }> {
         return this.fetch<{ voices: Voice[] }>("/api/tts/voices");
     }
 
-    getAudioUrl(audioId: string): string {
-        return `${this.baseUrl}/api/tts/audio/${audioId}`;
+    // Pronunciation lexicons (written form -> how to say it)
+    async getLexicons(): Promise<Lexicon[]> {
+        const result = await this.fetch<{ lexicons: Lexicon[] }>("/api/tts/frontend");
+        return result.lexicons;
+    }
+
+    async putLexicon(name: string, entries: Record<string, string>): Promise<{ status: string; entries: number }> {
+        return this.fetch<{ status: string; entries: number }>(`/api/tts/lexicons/${encodeURIComponent(name)}`, {
+            method: "PUT",
+            body: JSON.stringify({ entries }),
+        });
+    }
+
+    async deleteLexicon(name: string): Promise<{ status: string }> {
+        return this.fetch<{ status: string }>(`/api/tts/lexicons/${encodeURIComponent(name)}`, {
+            method: "DELETE",
+        });
+    }
+
+    getAudioUrl(audioId: string, format?: AudioFormat): string {
+        const query = format ? `?format=${format}` : "";
+        return `${this.baseUrl}/api/tts/audio/${audioId}${query}`;
     }
 
     // Models
@@ -136,10 +231,26 @@ class APIClient {
         return this.fetch<LoraModel[]>("/api/models/");
     }
 
-    async importModel(repoId: string): Promise<{ status: string; model: LoraModel }> {
-        return this.fetch<{ status: string; model: LoraModel }>("/api/models/import", {
+    async importModel(repoId: string, source = "huggingface"): Promise<ModelImport> {
+        return this.fetch<ModelImport>("/api/models/import", {
+            method: "POST",
+            body: JSON.stringify({ repo_id: repoId, source }),
+        });
+    }
+
+    async getImport(importId: string): Promise<ModelImport> {
+        return this.fetch<ModelImport>(`/api/models/imports/${importId}`);
+    }
+
+    async cancelImport(importId: string): Promise<ModelImport> {
+        return this.fetch<ModelImport>(`/api/models/imports/${importId}/cancel`, {
+            method: "POST",
+        });
+    }
+
+    async resumeImport(importId: string): Promise<ModelImport> {
+        return this.fetch<ModelImport>(`/api/models/imports/${importId}/resume`, {
             method: "POST",
-            body: JSON.stringify({ repo_id: repoId }),
         });
     }
 
@@ -215,4 +326,4 @@ class APIClient {
 }
 
 export const api = new APIClient();
-export type { TTSResponse, Voice, LoraModel, HistoryItem, TrainingStatus };
+export type { TTSResponse, Voice, LoraModel, ModelImport, Lexicon, HistoryItem, TrainingStatus };